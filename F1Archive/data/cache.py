@@ -0,0 +1,196 @@
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+import zlib
+
+
+class CacheMiss(LookupError):
+    """
+    Raised in offline mode when a page has never been cached.
+    """
+
+
+class ResponseCache():
+    """
+    Persistent, content-addressed on-disk cache for downloaded pages.
+
+    Layout under 'directory':
+        objects/<ab>/<sha256 of body>   - zlib-compressed page bodies, shared by identical pages
+        index/<sha256 of url>.json      - url -> body digest, size, fetch/access times, validators
+
+    Parameters
+    ----------------
+    :param: directory (str) - cache location, created if missing
+    :param: ttl (float or None) - seconds before an entry is stale. None means entries never
+                                  expire, which suits historical seasons.
+    :param: max_bytes (int or None) - once the stored bodies exceed this size, least recently
+                                      used entries are evicted
+    :param: offline (bool) - serve from the cache only; a miss raises CacheMiss instead of
+                             touching the network
+    """
+    def __init__(self, directory, ttl=None, max_bytes=None, offline=False):
+        self.directory = os.path.expanduser(directory)
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.offline = offline
+        self._lock = threading.Lock()
+        self._size = None
+
+        os.makedirs(os.path.join(self.directory, 'objects'), exist_ok=True)
+        os.makedirs(os.path.join(self.directory, 'index'), exist_ok=True)
+
+    def __getstate__(self):
+        # locks cannot be pickled; a copy sent to a worker process gets its own
+        state = self.__dict__.copy()
+        del state['_lock']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _digest(data):
+        return hashlib.sha256(data).hexdigest()
+
+    def _index_path(self, url):
+        return os.path.join(self.directory, 'index', f"{self._digest(url.encode())}.json")
+
+    def _object_path(self, digest):
+        return os.path.join(self.directory, 'objects', digest[:2], digest)
+
+    def _write_atomic(self, path, data):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), prefix='.tmp')
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        os.replace(tmp, path)
+
+    def lookup(self, url):
+        """
+        Return the index entry (dict) for 'url', or None if it is not cached.
+        """
+        try:
+            with open(self._index_path(url)) as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if not os.path.exists(self._object_path(entry['digest'])):
+            return None
+        return entry
+
+    def is_fresh(self, entry):
+        return self.ttl is None or time.time() - entry['fetched'] < self.ttl
+
+    def read(self, entry):
+        """
+        Return the page body for a cache entry and mark it as recently used.
+        """
+        with open(self._object_path(entry['digest']), 'rb') as f:
+            body = zlib.decompress(f.read())
+        entry['accessed'] = time.time()
+        try:
+            self._write_atomic(self._index_path(entry['url']), json.dumps(entry).encode())
+        except OSError:
+            pass # read-only cache, e.g. a checked-in replay directory
+        return body
+
+    def validators(self, entry):
+        """
+        Conditional request headers for revalidating a stale entry.
+        """
+        headers = dict()
+        if entry.get('etag'):
+            headers['If-None-Match'] = entry['etag']
+        if entry.get('last_modified'):
+            headers['If-Modified-Since'] = entry['last_modified']
+        return headers
+
+    def refresh(self, entry):
+        """
+        Mark an entry as fresh again after a '304 Not Modified' response.
+        """
+        entry['fetched'] = time.time()
+        return self.read(entry)
+
+    def store(self, url, body, headers=None):
+        """
+        Add the body of 'url' to the cache, then evict old entries if over 'max_bytes'.
+        """
+        headers = headers or dict()
+        digest = self._digest(body)
+        path = self._object_path(digest)
+        compressed = zlib.compress(body)
+
+        with self._lock:
+            if not os.path.exists(path):
+                self._write_atomic(path, compressed)
+                if self._size is not None:
+                    self._size += len(compressed)
+
+        now = time.time()
+        entry = dict(url=url, digest=digest, size=len(compressed), fetched=now, accessed=now,
+                     etag=headers.get('ETag'), last_modified=headers.get('Last-Modified'))
+        self._write_atomic(self._index_path(url), json.dumps(entry).encode())
+
+        if self.max_bytes is not None:
+            self.evict()
+        return entry
+
+    def _entries(self):
+        index_dir = os.path.join(self.directory, 'index')
+        for name in os.listdir(index_dir):
+            if not name.endswith('.json'):
+                continue
+            path = os.path.join(index_dir, name)
+            try:
+                with open(path) as f:
+                    yield path, json.load(f)
+            except (OSError, ValueError):
+                continue
+
+    def size(self):
+        """
+        Total bytes of stored (compressed) page bodies.
+        """
+        with self._lock:
+            if self._size is None:
+                total = 0
+                for root, _, files in os.walk(os.path.join(self.directory, 'objects')):
+                    total += sum(os.path.getsize(os.path.join(root, f)) for f in files)
+                self._size = total
+            return self._size
+
+    def evict(self, max_bytes=None):
+        """
+        Remove least recently used entries until the cache fits within 'max_bytes'.
+        """
+        max_bytes = self.max_bytes if max_bytes is None else max_bytes
+        if max_bytes is None or self.size() <= max_bytes:
+            return
+
+        with self._lock:
+            entries = sorted(self._entries(), key=lambda e: e[1].get('accessed', 0))
+            referenced = dict()
+            for _, entry in entries:
+                referenced[entry['digest']] = referenced.get(entry['digest'], 0) + 1
+
+            for path, entry in entries:
+                if self._size <= max_bytes:
+                    break
+                os.remove(path)
+                referenced[entry['digest']] -= 1
+                if not referenced[entry['digest']]:
+                    obj = self._object_path(entry['digest'])
+                    if os.path.exists(obj):
+                        self._size -= os.path.getsize(obj)
+                        os.remove(obj)
+
+    def clear(self):
+        """
+        Remove every cached page.
+        """
+        self.evict(max_bytes=0)
@@ -0,0 +1,237 @@
+from F1Archive.utils import LazyModule
+from F1Archive.data_transforms.transformations import times_to_seconds
+
+np = LazyModule('numpy')
+pd = LazyModule('pandas')
+
+# int8 position codes: 1, 2, ... are finishing positions
+MISSING = -1 # 0 placeholder: driver did not take part in the race
+NA = -128    # empty (NaN) cell
+STATUS_CODES = dict(NC=-2, DQ=-3, EX=-4, DNS=-5, DNQ=-6, DNPQ=-7, DNF=-8)
+
+_OFFSET = 128 # int8 code -> lookup table index
+
+
+class PositionCodes():
+    """
+    Two-way mapping between result cells (1, '1', 0, 'NC', NaN, ...) and int8 codes.
+    Status strings not in STATUS_CODES get their own codes below -8, so that any table
+    converts back exactly.
+    """
+    def __init__(self, labels=None):
+        self.labels = dict(STATUS_CODES) if labels is None else dict(labels) # status -> code
+
+    def _code(self, label):
+        if label not in self.labels:
+            self.labels[label] = min(min(self.labels.values()), -8) - 1
+            assert self.labels[label] > NA, "too many distinct status codes for int8"
+        return self.labels[label]
+
+    def encode(self, values):
+        """
+        Object array of cells -> (int8 codes, bool array marking positions stored as text).
+        """
+        values = np.asarray(values, dtype=object)
+        flat = pd.Series(values.ravel())
+        numbers = pd.to_numeric(flat, errors='coerce').to_numpy(dtype=float)
+        is_text = flat.map(lambda v: isinstance(v, str)).to_numpy(dtype=bool)
+        is_na = flat.isna().to_numpy()
+
+        codes = np.where(numbers > 0, numbers, MISSING)
+        codes[is_na] = NA
+        status = np.isnan(numbers) & ~is_na
+        if status.any():
+            codes[status] = flat[status].map(self._code).to_numpy(dtype=float)
+        return codes.astype(np.int8).reshape(values.shape), (is_text & (numbers > 0)).reshape(values.shape)
+
+    def tables(self):
+        """
+        Lookup tables code -> cell, for positions stored as numbers and as text.
+        """
+        as_int = np.empty(256, dtype=object)
+        as_int[:] = [code for code in range(-_OFFSET, _OFFSET)]
+        as_str = np.array([str(code) for code in range(-_OFFSET, _OFFSET)], dtype=object)
+        for table in (as_int, as_str):
+            table[MISSING + _OFFSET] = 0
+            table[NA + _OFFSET] = np.nan
+            for label, code in self.labels.items():
+                table[code + _OFFSET] = label
+        return as_int, as_str
+
+    def decode(self, codes, text_columns):
+        """
+        int8 codes -> object array of cells; 'text_columns' (one bool per column) marks the
+        columns whose positions were strings.
+        """
+        as_int, as_str = self.tables()
+        index = codes.astype(np.int64) + _OFFSET
+        return np.where(np.asarray(text_columns)[None, :], as_str[index], as_int[index])
+
+
+def _categorical(values):
+    return pd.Categorical(np.asarray(values, dtype=object))
+
+
+class CompactResults():
+    """
+    Integer-coded form of a season results table (DataExtractor.year_results[yr]).
+
+    keys, drivers, teams - pd.Categorical, one entry per row
+    races - race names
+    positions - int8 drivers x races (see PositionCodes)
+    points - float32 drivers x races
+
+    'from_frame' and 'to_frame' convert from and back to the DataFrame layout.
+    """
+    def __init__(self, keys, drivers, teams, races, positions, points, text_columns, codes=None):
+        self.keys = keys
+        self.drivers = drivers
+        self.teams = teams
+        self.races = list(races)
+        self.positions = positions
+        self.points = points
+        self.text_columns = np.asarray(text_columns, dtype=bool)
+        self.codes = codes or PositionCodes()
+
+    @classmethod
+    def from_frame(cls, df, codes=None):
+        codes = codes or PositionCodes()
+        positions, is_text = codes.encode(df['Position'].to_numpy(dtype=object))
+        return cls(keys=_categorical(df['Driver'].values.ravel()),
+                   drivers=_categorical(df['Details', 'Driver'].values),
+                   teams=_categorical(df['Details', 'Car'].values),
+                   races=df['Position'].columns,
+                   positions=positions,
+                   points=df['Points'].to_numpy(dtype=np.float32),
+                   text_columns=is_text.any(axis=0),
+                   codes=codes)
+
+    def to_frame(self):
+        positions = self.codes.decode(self.positions, self.text_columns)
+        data = {('Driver', ''): np.asarray(self.keys, dtype=object),
+                ('Details', 'Driver'): np.asarray(self.drivers, dtype=object),
+                ('Details', 'Car'): np.asarray(self.teams, dtype=object)}
+        data.update({('Position', race): positions[:, n] for n, race in enumerate(self.races)})
+        data.update({('Points', race): self.points[:, n].astype(float) for n, race in enumerate(self.races)})
+        df = pd.DataFrame(data)
+        df.columns = pd.MultiIndex.from_tuples(df.columns)
+        return df
+
+    @property
+    def nbytes(self):
+        categorical = sum(c.codes.nbytes + c.categories.memory_usage(deep=True)
+                          for c in (self.keys, self.drivers, self.teams))
+        return categorical + self.positions.nbytes + self.points.nbytes
+
+
+class CompactQualy():
+    """
+    Integer-coded form of a season qualifying table (QualyExtractor.qualy_results[yr]).
+
+    labels - row labels (car numbers); drivers, teams - pd.Categorical; numbers - int16 car numbers
+    races - session names; positions - int8 rows x races (see PositionCodes)
+    times - float32 lap times in seconds; 0 and NaN are kept as they are, and any time that is
+            not plain 'M:SS.fff' text is kept verbatim in 'time_text' ((row, race) -> text)
+    fields - other per-race columns (e.g. 'Team-mate', 'to_mean') as float32 rows x races
+    """
+    def __init__(self, labels, drivers, teams, numbers, races, positions, text_columns, times,
+                 time_text, fields, columns=None, codes=None):
+        self.labels = labels
+        self.drivers = drivers
+        self.teams = teams
+        self.numbers = numbers
+        self.races = list(races)
+        self.positions = positions
+        self.text_columns = np.asarray(text_columns, dtype=bool)
+        self.times = times
+        self.time_text = time_text
+        self.fields = fields
+        self.columns = columns # original column order
+        self.codes = codes or PositionCodes()
+
+    @staticmethod
+    def format_time(seconds):
+        if seconds >= 60:
+            minutes, seconds = divmod(seconds, 60)
+            return f"{int(minutes)}:{seconds:06.3f}"
+        return f"{seconds:.3f}"
+
+    @classmethod
+    def from_frame(cls, df, codes=None):
+        codes = codes or PositionCodes()
+        races = [race for race in dict.fromkeys(df.columns.get_level_values(0)) if race != 'Details']
+        fields = [field for field in dict.fromkeys(df[races[0]].columns)] if races else []
+
+        positions, is_text = codes.encode(df.loc[:, [(race, 'Position') for race in races]].to_numpy(dtype=object))
+
+        raw = df.loc[:, [(race, 'Time') for race in races]].to_numpy(dtype=object)
+        times = times_to_seconds(raw)
+        is_zero = np.array([not isinstance(v, str) and v == 0 for v in raw.ravel()], dtype=bool).reshape(raw.shape)
+        times[is_zero] = 0
+        time_text = dict()
+        for i, j in zip(*np.nonzero(pd.notna(raw) & ~is_zero)):
+            if np.isnan(times[i, j]) or cls.format_time(float(np.float32(times[i, j]))) != raw[i, j]:
+                time_text[(i, j)] = raw[i, j]
+
+        other = dict()
+        for field in fields:
+            if field not in ('Position', 'Time'):
+                block = df.loc[:, [(race, field) for race in races]]
+                other[field] = block.apply(pd.to_numeric, errors='coerce').to_numpy(dtype=np.float32)
+
+        return cls(labels=df.index.to_numpy(), drivers=_categorical(df['Details', 'Driver'].values),
+                   teams=_categorical(df['Details', 'Car'].values),
+                   numbers=df['Details', 'Driver No'].to_numpy(dtype=np.int16), races=races,
+                   positions=positions, text_columns=is_text.any(axis=0), times=times.astype(np.float32),
+                   time_text=time_text, fields=other, columns=list(df.columns), codes=codes)
+
+    def to_frame(self):
+        positions = self.codes.decode(self.positions, self.text_columns)
+        times = np.empty(self.times.shape, dtype=object)
+        for (i, j), seconds in np.ndenumerate(self.times):
+            if np.isnan(seconds):
+                times[i, j] = np.nan
+            elif seconds == 0:
+                times[i, j] = 0
+            else:
+                times[i, j] = self.format_time(float(seconds))
+        for (i, j), text in self.time_text.items():
+            times[i, j] = text
+
+        data = {('Details', 'Driver'): np.asarray(self.drivers, dtype=object),
+                ('Details', 'Car'): np.asarray(self.teams, dtype=object),
+                ('Details', 'Driver No'): self.numbers.astype(np.int64)}
+        for n, race in enumerate(self.races):
+            data[race, 'Position'] = positions[:, n]
+            data[race, 'Time'] = times[:, n]
+            for field, values in self.fields.items():
+                data[race, field] = values[:, n].astype(float)
+        df = pd.DataFrame(data, index=pd.Index(self.labels, name='No'))
+        df.columns = pd.MultiIndex.from_tuples(df.columns)
+        if self.columns is not None:
+            df = df[pd.MultiIndex.from_tuples(self.columns)]
+        return df
+
+    @property
+    def nbytes(self):
+        categorical = sum(c.codes.nbytes + c.categories.memory_usage(deep=True) for c in (self.drivers, self.teams))
+        fields = sum(values.nbytes for values in self.fields.values())
+        return (categorical + self.labels.nbytes + self.numbers.nbytes + self.positions.nbytes
+                + self.times.nbytes + fields)
+
+
+def compact_seasons(frames, kind='results'):
+    """
+    Convert a dict year -> DataFrame (year_results or qualy_results) to compact form.
+    All seasons share one PositionCodes table.
+    """
+    cls = CompactResults if kind == 'results' else CompactQualy
+    codes = PositionCodes()
+    return {year: cls.from_frame(df, codes) for year, df in frames.items()}
+
+
+def expand_seasons(compact):
+    """
+    Inverse of 'compact_seasons'.
+    """
+    return {year: season.to_frame() for year, season in compact.items()}
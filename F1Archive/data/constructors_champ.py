@@ -1,22 +1,68 @@
-import pandas as pd 
-import bs4 as bs 
-import urllib.request
-import logging
+import functools
+from F1Archive.utils import LazyModule, quiet_chained_assignment
 from F1Archive.data_transforms.points_map import MapPoints
 from F1Archive.data.data_extraction import DataExtractor
+from F1Archive.data.fetch import urlopen_read
+from F1Archive.data.html_tables import parse_results_table
+
+pd = LazyModule('pandas')
+
+# Teams that raced under several names: (generic name, name prefix, first season, last season).
+# A season team name belongs to the lineage if it is the prefix or starts with it
+# ('Scuderia Toro Rosso Honda'); None means no bound.
+TEAM_LINEAGE = [
+    ('Toro Rosso', 'Toro Rosso', 2006, 2019),
+    ('Toro Rosso', 'Scuderia Toro Rosso', 2006, 2019),
+    ('Toro Rosso', 'STR', 2006, 2019),
+    ('Toro Rosso', 'AlphaTauri', 2020, 2023),
+    ('Sauber/Alfa', 'Sauber', 1993, None),
+    ('Sauber/Alfa', 'BMW Sauber', 2006, 2010),
+    ('Sauber/Alfa', 'Alfa Romeo', 2019, 2023),
+    ('Force India/RP', 'Force India', 2008, 2018),
+    ('Force India/RP', 'Racing Point', 2018, 2020),
+]
+
+# longest prefix first, so 'BMW Sauber' is matched before any shorter name
+_LINEAGE = sorted(TEAM_LINEAGE, key=lambda entry: len(entry[1]), reverse=True)
+
+
+@functools.lru_cache(maxsize=None)
+def canonical_team(name, year=None):
+    """
+    Generic name of a season team name: its lineage from TEAM_LINEAGE if listed, otherwise
+    the first word of a two-word name ('Haas Ferrari' -> 'Haas') or the first two words of a
+    longer one ('Red Bull Racing Honda' -> 'Red Bull').
+    """
+    for generic, prefix, first, last in _LINEAGE:
+        if name != prefix and not name.startswith(prefix + ' '):
+            continue
+        if year is None or ((first is None or year >= first) and (last is None or year <= last)):
+            return generic
+
+    split_t = name.split(" ")
+    if len(split_t) == 1:
+        return name
+    elif len(split_t) == 2:
+        return split_t[0]
+    return split_t[0] + ' ' + split_t[1]
+
 
 class TeamsExtractor(DataExtractor):
     
-    def __init__(self, logging=False):
-        super(TeamsExtractor, self).__init__()
+    def __init__(self, logging=False, max_workers=1, cache=None, fetcher=None):
+        super(TeamsExtractor, self).__init__(max_workers=max_workers, cache=cache, fetcher=fetcher)
         self.logging = logging
         self.champ_tables = dict()
         self.seasons_df = pd.DataFrame(columns=['Team'])
 
+    def settings(self):
+        return dict(super(TeamsExtractor, self).settings(), logging=self.logging)
 
-    def champ_standings(self, YEARS, max_percentage=True, total_percentage=True):
+    def champ_standings(self, YEARS, max_percentage=True, total_percentage=True, processes=1):
         """
         Add to 'self.champ_tables' dict a pd.Dataframe for each of the years in YEARS argument. 
+        processes (int) - with more than 1 (or None for one per core), seasons are extracted in
+                          parallel worker processes; see 'map_years'.
         """
 
         if type(YEARS) != list:
@@ -25,18 +71,30 @@ class TeamsExtractor(DataExtractor):
 
         fcn = lambda y: str(y) if type(y) == int else y # covert to string if integer
 
-        for year in YEARS:
+        if processes != 1:
+            jobs = {fcn(year): (dict(HOMEPAGE=self.HOMEPAGE),
+                                dict(YEARS=[year], max_percentage=max_percentage, total_percentage=total_percentage))
+                    for year in YEARS}
+            self.map_years('champ_standings', jobs, ['champ_tables', 'year_urls'], processes)
+            return
+
+        def table(url):
+            page = self.fetcher.get(url)
+            with self.stage('parse', url=url):
+                return self.scores_2_df(url, fetch=lambda url: page)
+
+        urls = [f"{self.HOMEPAGE}en/results.html/{year}/team.html" for year in YEARS]
+        tables = self.fetcher.map(table, urls)
 
-            url = f"{self.HOMEPAGE}en/results.html/{year}/team.html"
+        if max_percentage:
+            self.get_race_urls(list(YEARS))
 
-            df = self.scores_2_df(url)
+        for year, df in zip(YEARS, tables):
 
             if total_percentage:
                 df = self.percentage_of_total(df)
             
             if max_percentage:
-                self.get_race_urls(year)
-                
                 N_RACES = len(self.year_urls[str(year)])
                 
                 df = self.percentage_of_max(df, N_RACES, year)
@@ -44,27 +102,22 @@ class TeamsExtractor(DataExtractor):
             self.champ_tables[str(year)] = df
 
     @staticmethod
-    def scores_2_df(url):
+    def scores_2_df(url, fetch=None):
         """
         Return a pd.DataFrame champtionship stadings for years contained within 
         the 'url' argument provided
+        fetch (callable) - url -> page bytes. Defaults to a plain urllib request.
         """
-        results_page = urllib.request.urlopen(url).read()
-        race_results = bs.BeautifulSoup(results_page,'lxml')
-        
-        table = race_results.find_all('table')[0]
-        
-        df = pd.read_html(str(table), flavor='bs4', header=[0])[0]
-       
-        try:
-            df.drop(["Unnamed: 0","Unnamed: 4"], axis=1, inplace=True)
-        except Exception:
-            pass
+        if fetch is None:
+            fetch = urlopen_read
+        results_page = fetch(url)
+        df = parse_results_table(results_page)
         df.set_index('Pos', inplace=True)
 
         return df
 
     @staticmethod
+    @quiet_chained_assignment
     def percentage_of_total(df):
         """
         Add column to df showing each team's percentage of the total points scores for that season.
@@ -73,6 +126,7 @@ class TeamsExtractor(DataExtractor):
         return df
 
     @staticmethod
+    @quiet_chained_assignment
     def percentage_of_max(df, n_races, year):
         """
         Add column to df showing each team's percentage of the total points scores for that season.
@@ -91,41 +145,36 @@ class TeamsExtractor(DataExtractor):
         pass
 
     @staticmethod
-    def generic_team_names(t):
+    def generic_team_names(t, year=None):
         """
-        Function for extracting generic team names from more specific season team names
-        Too hardcoded - needs improvement
+        Function for extracting generic team names from more specific season team names,
+        e.g. 'Red Bull Racing TAG Heuer' -> 'Red Bull', 'AlphaTauri Honda' -> 'Toro Rosso'.
+        Renamed teams are looked up in TEAM_LINEAGE; 'year' restricts the lookup to the
+        seasons in which each name belonged to that lineage.
         """
-        split_t = t.split(" ")
-        
-        if (len(split_t) == 1):
-            return t
-        elif (len(split_t) == 2) and (split_t[0] not in ['AlphaTauri', 'Toro', 'Sauber']):
-            return split_t[0]
-        elif (len(split_t) > 2) and ((t != 'Alfa Romeo Racing Ferrari') and (t != 'Scuderia Toro Rosso Honda') and (t != 'Force India Mercedes') and (t != 'Force India Sahara') and (t != 'Racing Point BWT Mercedes')):
-            name = split_t[0] + ' ' + split_t[1]
-            return name
-        elif ('Toro Rosso' in t) or ('AlphaTauri' in t):
-            return 'Toro Rosso'
-        elif ('Force India' in t) or ('Racing Point') in t:
-            return 'Force India/RP'
-        elif ('Sauber' in t) or ('Alfa') in t:
-            return 'Sauber/Alfa'
-        else:
-            return t
-
-    def get_seasons_df(self, metric='PTS'):
+        return canonical_team(t, None if year is None else int(year))
+
+    def get_seasons_df(self, metric='PTS', aggfunc='first'):
         """
         Returns a DataFrame with columns:
         Team | Year 1 | Year 2 | ... | Year N
+
+        Teams are listed in order of first appearance. Where two entries of a season map to
+        the same generic name, 'aggfunc' combines them (default: the higher placed entry).
         """
         assert self.champ_tables != dict(), f"championship tables must be computed first!"
-        self.seasons_df.set_index('Team', inplace=True)
-        for year, points in self.champ_tables.items():
-            for name in points['Team'].apply(self.generic_team_names):
-                self.seasons_df.loc[name,year] = points.loc[points['Team'].apply(self.generic_team_names) == name, metric].iloc[0]
-                
-        self.seasons_df.fillna(value=0, inplace=True) 
+        with self.stage('merge'):
+            years = list(self.champ_tables)
+            long_df = pd.concat([pd.DataFrame({'Team': points['Team'].values, 'Year': year, 'Value': points[metric].values})
+                                 for year, points in self.champ_tables.items()], ignore_index=True)
+            names = {(t, y): self.generic_team_names(t, y) for t, y in zip(long_df['Team'], long_df['Year'])}
+            long_df['Team'] = [names[key] for key in zip(long_df['Team'], long_df['Year'])]
+
+            seasons_df = long_df.pivot_table(index='Team', columns='Year', values='Value', aggfunc=aggfunc)
+            seasons_df = seasons_df.reindex(index=pd.unique(long_df['Team']), columns=years).astype(float)
+            seasons_df.columns.name = None
+            seasons_df.index.name = 'Team'
+            self.seasons_df = seasons_df.fillna(value=0)
      
 if __name__ == '__main__':
 
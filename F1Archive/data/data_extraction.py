@@ -1,37 +1,128 @@
-import pandas as pd 
-import numpy as np 
-import bs4 as bs 
-import urllib.request
+import contextlib
 import logging
-from F1Archive.utils import get_col_list, multi_index_df
 import os
-import random
+from F1Archive.utils import LazyModule, get_col_list, multi_index_df
+from F1Archive.data.fetch import PageFetcher, urlopen_read
+from F1Archive.data.cache import ResponseCache
+from F1Archive.data.html_tables import parse_page, results_table, parse_results_table
+from F1Archive.data.parallel import run_years
+from F1Archive.data.stats import ExtractionStats, NULL_TIMER
 
-os.environ['NUMEXPR_MAX_THREADS'] = '4'
+pd = LazyModule('pandas')
+np = LazyModule('numpy')
+bs = LazyModule('bs4')
 
-    
-logger = logging.getLogger()
-logger.setLevel(logging.INFO)
-console_handler = logging.StreamHandler()
-log_format = '%(asctime)s | %(levelname)s: %(message)s'
-console_handler.setFormatter(logging.Formatter(log_format))
-logger.addHandler(console_handler)
+logger = logging.getLogger(__name__)
 
 
 class DataExtractor():
 
-    def __init__(self):
+    def __init__(self, max_workers=1, cache=None, fetcher=None):
+        """
+        max_workers (int) - number of pages fetched concurrently. 1 keeps the original
+                            one-request-at-a-time behaviour.
+        cache (ResponseCache or str) - on-disk page cache, or a directory to keep one in.
+                                       Defaults to $F1ARCHIVE_CACHE_DIR when set; with
+                                       $F1ARCHIVE_OFFLINE=1 pages are only read from the cache.
+        fetcher (PageFetcher) - where pages come from, by default a PageFetcher over 'cache'.
+                                A ReplayFetcher serves saved pages without any network access.
+        """
         self.HOMEPAGE = 'https://www.formula1.com/'
         self.year_urls = dict()
         self.year_results = dict()
+        self.race_links = dict() # race url -> links to the other session pages of that race
+        self.year_errors = dict() # year -> exception raised while extracting it in parallel mode
+        self.extracted_urls = dict() # year -> race urls whose results are in 'year_results'
+        self.max_workers = max_workers
+
+        if cache is None and os.environ.get('F1ARCHIVE_CACHE_DIR'):
+            cache = os.environ['F1ARCHIVE_CACHE_DIR']
+        if isinstance(cache, str):
+            cache = ResponseCache(cache, offline=os.environ.get('F1ARCHIVE_OFFLINE') == '1')
+        self.cache = cache
+        self.fetcher = fetcher if fetcher is not None else PageFetcher(max_workers=max_workers, cache=cache)
         # put years/YEARS into constructor
 
     def change_homepage(self, homepage):
         self.HOMEPAGE = homepage
 
-    def get_race_urls(self, YEARS, return_urls=False):
+    @property
+    def stats(self):
+        """
+        ExtractionStats collecting fetch / parse / merge timings and request, byte, cache hit
+        and row counts, or None (the default) to collect nothing. Kept on the fetcher, so
+        that downloads are counted wherever they happen.
+        """
+        return self.fetcher.stats
+
+    @stats.setter
+    def stats(self, stats):
+        self.fetcher.stats = stats
+
+    @contextlib.contextmanager
+    def profile(self, callbacks=()):
+        """
+        Collect ExtractionStats for the steps run inside the block:
+
+            with extractor.profile() as stats:
+                extractor.seasons_results()
+            print(stats.as_dict())
+
+        callbacks - called as callback(name, value, info) for every timing and count, see ExtractionStats.
+        Stats being collected before the block also receive its numbers.
+        """
+        previous = self.stats
+        self.stats = stats = ExtractionStats(callbacks)
+        try:
+            yield stats
+        finally:
+            self.stats = previous
+            if previous is not None:
+                previous.update(stats)
+
+    def stage(self, name, **info):
+        """
+        Timer for one extraction stage ('parse', 'merge'); does nothing when no stats are collected.
+        """
+        stats = self.fetcher.stats
+        return NULL_TIMER if stats is None else stats.timer(name, **info)
+
+    def _count(self, info, **counts):
+        if self.fetcher.stats is not None:
+            self.fetcher.stats.count(info, **counts)
+
+    def settings(self):
+        """
+        Constructor arguments that rebuild an equivalent extractor, e.g. in a worker process.
+        """
+        return dict(max_workers=self.max_workers, cache=self.cache, fetcher=self.fetcher)
+
+    def map_years(self, method, jobs, attrs, processes=None):
+        """
+        Run 'method' for every season in 'jobs' (year -> (state, kwargs)) in a pool of
+        'processes' worker processes and merge the returned 'attrs' dicts into this extractor.
+
+        Results are merged in the order of 'jobs', whatever order the workers finish in.
+        A season that fails is logged and its exception kept in 'self.year_errors';
+        the other seasons are still merged. Stats collected by the workers are added to 'self.stats'.
+        """
+        if self.stats is not None:
+            jobs = {year: (dict(state, stats=ExtractionStats()), kwargs) for year, (state, kwargs) in jobs.items()}
+            attrs = list(attrs) + ['stats']
+        for year, result, error in run_years(self, method, jobs, attrs, processes):
+            if error is not None:
+                logger.error(f"Extraction failed for {year} season: {error!r}")
+                self.year_errors[year] = error
+                continue
+            self.year_errors.pop(year, None)
+            for attr, values in result.items():
+                getattr(self, attr).update(values)
+
+    def get_race_urls(self, YEARS, return_urls=False, refresh=False):
         """
         Input: YEAR: str OR int
+               refresh (bool) - re-download the season pages even if a cached copy is fresh,
+                                e.g. to pick up newly run races
         Output: race_urls: list of urls containing race results for specific year
         """
         all_urls = []
@@ -40,17 +131,20 @@ class DataExtractor():
                 YEARS = [YEARS]
 
         fcn = lambda y: str(y) if type(y) == int else y # covert to string if integer
-   
-        for year in YEARS:
+        YEARS = [fcn(year) for year in YEARS]
+
+        sources = self.fetcher.get_many([f"https://www.formula1.com/en/results.html/{year}/races.html" for year in YEARS],
+                                        refresh=refresh)
+
+        for year, source in zip(YEARS, sources):
 
-            year = fcn(year)
             race_urls = []
-            source = urllib.request.urlopen(f"https://www.formula1.com/en/results.html/{year}/races.html").read()
-            soup = bs.BeautifulSoup(source,'lxml')
+            with self.stage('parse', year=year):
+                soup = bs.BeautifulSoup(source,'lxml')
       
-            for url in soup.find_all('a'):
-                if year in str(url.get('href')) and 'race-result' in str(url.get('href')) and url.get('href') not in race_urls:
-                    race_urls.append(url.get('href'))
+                for url in soup.find_all('a'):
+                    if year in str(url.get('href')) and 'race-result' in str(url.get('href')) and url.get('href') not in race_urls:
+                        race_urls.append(url.get('href'))
             self.year_urls[year] =  race_urls
             all_urls.append(race_urls)
         
@@ -72,97 +166,254 @@ class DataExtractor():
             self.year_results[yr] = multi_index_df([], race_pos_pts)
 
     @staticmethod
-    def data_to_table(url, logging=False):
-
+    def data_to_table(url, logging=False, fetch=None):
+        """
+        Download a results page and return its results table as a pd.DataFrame indexed by 'No'.
+        fetch (callable) - url -> page bytes. Defaults to a plain urllib request.
+        """
         race_name = url.split('/')[9]
 
         if logging:
             logger.info(f"Race: {race_name}")
 
-        results_page = urllib.request.urlopen(url).read()
-        race_results = bs.BeautifulSoup(results_page,'lxml')
-
-        table = race_results.find_all('table')[0]
-        df = pd.read_html(str(table), flavor='bs4', header=[0])[0]
-      
+        if fetch is None:
+            fetch = urlopen_read
+        results_page = fetch(url)
+        df = parse_results_table(results_page)
         df.set_index('No', inplace=True)
-        try:
-            df.drop(["Unnamed: 0","Unnamed: 8"], axis=1, inplace=True)
-        except:
-            try:
-                df.drop(["Unnamed: 0","Unnamed: 6"], axis=1, inplace=True)
-            except:
-                pass
 
         return df
 
+    @staticmethod
+    def session_url(race_url, page):
+        """
+        Swap the page name at the end of a race url, e.g. 'race-result.html' -> 'qualifying.html'.
+        """
+        return f"{race_url.rsplit('/', 1)[0]}/{page}"
+
+    def record_links(self, url, doc):
+        """
+        Keep the links from a fetched race page that point to other sessions of the same race,
+        so they can be reused (e.g. by 'get_qualy_urls') without downloading the page again.
+        """
+        race_dir = url.rsplit('/', 1)[0] + '/'
+        links = []
+        for href in doc.xpath('//a/@href'):
+            href = str(href)
+            if href.startswith(race_dir) and href not in links:
+                links.append(href)
+        self.race_links[url] = links
+
+    def race_table(self, url, logging=False):
+        """
+        Fetch and parse the results table of one race page ('url' relative to HOMEPAGE),
+        keeping the session links found on the page in 'self.race_links'.
+        """
+        if logging:
+            logger.info(f"Race: {url.split('/')[6]}")
+        page = self.fetcher.get(f"{self.HOMEPAGE}{url}")
+        with self.stage('parse', url=url):
+            doc = parse_page(page)
+            self.record_links(url, doc)
+            df = results_table(doc)
+            df.set_index('No', inplace=True)
+        return df
+
+    def race_tables(self, urls, logging=False):
+        """
+        Fetch and parse the results tables for 'urls' (relative to HOMEPAGE), using up to
+        'max_workers' concurrent requests. Tables are returned in the same order as 'urls'.
+        Session links found on each page are kept in 'self.race_links'.
+        """
+        return self.fetcher.map(lambda url: self.race_table(url, logging), urls)
+
+    def iter_race_tables(self, urls, logging=False):
+        """
+        Generator version of 'race_tables': yields each table, in order, as soon as it is parsed,
+        with at most 'max_workers' pages fetched ahead.
+        """
+        return self.fetcher.imap(lambda url: self.race_table(url, logging), urls)
+
+    @staticmethod
+    def race_records(df, race, race_no=0):
+        """
+        Long-format records for a single race table from 'data_to_table':
+        Key | Race | Race No | Driver | Car | Pos | PTS
+
+        'Key' identifies the driver across races (name without the 3-letter abbreviation).
+        Drivers listed twice in one race (shared drives) get a numbered key for the extra entry.
+        """
+        key = df['Driver'].str[:-3]
+        if key.duplicated().any():
+            dup = key.groupby(key).cumcount()
+            key = key.where(dup == 0, key + dup.astype(str))
+
+        return pd.DataFrame({'Key': key.values, 'Race': race, 'Race No': race_no,
+                             'Driver': df['Driver'].values, 'Car': df['Car'].values,
+                             'Pos': df['Pos'].values, 'PTS': df['PTS'].values})
+
+    @staticmethod
+    def season_table(records, race_names):
+        """
+        Pivot the long-format race records of one season into the wide results table:
+        Driver | Details (Driver, Car) | Position (race 1 ... race N) | Points (race 1 ... race N)
+
+        Drivers appear in the order of the first race, then in order of their first appearance
+        (alphabetically within a race). Races a driver did not enter are filled with 0.
+        """
+        if isinstance(records, list):
+            records = pd.concat(records, ignore_index=True)
+
+        first = records.drop_duplicates('Key')
+        order = pd.concat([first[first['Race No'] == 0],
+                           first[first['Race No'] > 0].sort_values(['Race No', 'Key'], kind='stable')])
+        keys = pd.Index(order['Key'], name='Driver')
+
+        races = range(len(race_names))
+        positions = records.astype({'Pos': object}).pivot(index='Key', columns='Race No', values='Pos')
+        positions = positions.reindex(index=keys, columns=races).fillna(0)
+        points = records.pivot(index='Key', columns='Race No', values='PTS')
+        points = points.reindex(index=keys, columns=races).astype(float).fillna(0)
+
+        results_df = pd.DataFrame(dict(Driver=order['Driver'].values, Car=order['Car'].values), index=keys)
+        results_df.columns = pd.MultiIndex.from_product([['Details'], results_df.columns])
+        positions.columns = pd.MultiIndex.from_product([['Position'], race_names])
+        points.columns = pd.MultiIndex.from_product([['Points'], race_names])
+
+        results_df = pd.concat([results_df, positions, points], axis=1)
+        results_df.reset_index(inplace=True)
+        results_df["Details","Car"] = results_df["Details","Car"].astype(str).str[:3].str.upper() #retain last 3 digits and caps
+        return results_df
+
+    @staticmethod
+    def results_records(results_df, race_names=None):
+        """
+        Inverse of 'season_table': long-format records (Key | Race | Race No | Driver | Car | Pos | PTS)
+        for every driver and race of a season results table, so races can be added to it.
+        """
+        if race_names is None:
+            race_names = list(results_df['Position'].columns)
+        n_races, n_drivers = len(race_names), len(results_df.index)
+        return pd.DataFrame({'Key': np.tile(results_df['Driver'].values.ravel(), n_races),
+                             'Race': np.repeat(np.array(race_names, dtype=object), n_drivers),
+                             'Race No': np.repeat(np.arange(n_races), n_drivers),
+                             'Driver': np.tile(results_df['Details', 'Driver'].values, n_races),
+                             'Car': np.tile(results_df['Details', 'Car'].values, n_races),
+                             'Pos': results_df['Position'].to_numpy(dtype=object).ravel(order='F'),
+                             'PTS': results_df['Points'].to_numpy(dtype=float).ravel(order='F')})
 
-    def seasons_results(self, logging=False, return_results=False, print_dataframes=False):
+    def season_urls(self, YEARS=None):
+        """
+        Race urls of each season in YEARS (default: every season in 'year_urls'); race lists
+        not yet in 'year_urls' are downloaded.
+        Output: dict year -> race urls
+        """
+        if YEARS is None:
+            return dict(self.year_urls)
+        if type(YEARS) != list:
+            YEARS = [YEARS]
+        YEARS = [str(year) for year in YEARS]
+        missing = [year for year in YEARS if year not in self.year_urls]
+        if missing:
+            self.get_race_urls(missing)
+        return {year: self.year_urls[year] for year in YEARS}
+
+    def iter_race_results(self, YEARS=None, logging=False):
+        """
+        Stream race results season by season, one long-format batch per race, yielded as soon as
+        that race is parsed:
+        Year | Key | Race | Race No | Driver | Car | Pos | PTS
+        (see 'race_records'; Race No counts from 0 within the season).
+
+        Nothing is kept in 'year_results', so memory stays bounded however many seasons are read,
+        and batches already yielded are not lost if a later race fails. The batches of one season
+        can be rebuilt into its results table with 'season_table'.
+        """
+        for yr, urls in self.season_urls(YEARS).items():
+            logger.info(f"Streaming results for {yr} season")
+            names = [race.split('/')[6] for race in urls]
+            for n, (race, df) in enumerate(zip(names, self.iter_race_tables(urls, logging=logging))):
+                records = self.race_records(df, race, n)
+                records.insert(0, 'Year', yr)
+                yield records
+
+    def season_results(self, yr, urls, logging=False, results_df=None, race_names=None):
+        """
+        Results table for the races in 'urls'. If 'results_df' (holding the races in 'race_names')
+        is given, only 'urls' are fetched and their races are appended to it.
+        """
+        first = 0 if results_df is None else len(race_names)
+        new_names = [race.split('/')[6] for race in urls]
+        tables = self.race_tables(urls, logging=logging)
+        self._count(dict(year=yr), rows_merged=sum(len(df) for df in tables))
+        with self.stage('merge', year=yr):
+            records = [self.race_records(df, race, first + n) for n, (race, df) in enumerate(zip(new_names, tables))]
+            if results_df is not None:
+                records.insert(0, self.results_records(results_df, race_names))
+                new_names = list(race_names) + new_names
+
+            if records:
+                return self.season_table(records, new_names)
+            return multi_index_df([], dict(Details=["Driver","Car"], Position=new_names, Points=new_names))
+
+    def refresh_season(self, year, logging=False):
+        """
+        Bring a season already in 'year_results' up to date after new races have been run.
+
+        The season's race list is downloaded again and only races not yet extracted are fetched;
+        their Position and Points columns are appended to the season table. Costs one request
+        for the race list plus one per new race.
+        Output: list of the new race urls
+        """
+        yr = str(year)
+        done = self.extracted_urls.get(yr)
+        if done is None and yr in self.year_results:
+            done = self.year_urls.get(yr, [])[:len(self.year_results[yr]['Position'].columns)]
+
+        self.get_race_urls([yr], refresh=True)
+        new_urls = [url for url in self.year_urls[yr] if url not in (done or [])]
+        if not new_urls:
+            logger.info(f"No new races for {yr} season")
+            return []
+
+        logger.info(f"Adding {len(new_urls)} race(s) to {yr} season")
+        if yr in self.year_results:
+            race_names = list(self.year_results[yr]['Position'].columns)
+            self.year_results[yr] = self.season_results(yr, new_urls, logging, self.year_results[yr], race_names)
+        else:
+            self.year_results[yr] = self.season_results(yr, new_urls, logging)
+        self.extracted_urls[yr] = list(done or []) + new_urls
+        return new_urls
+
+    def seasons_results(self, logging=False, return_results=False, print_dataframes=False, processes=1):
         """
         Extract data from F1 webpage and insert into pd.DataFrame containing driver, car, race position and 
         race points for that season.
+        processes (int) - with more than 1 (or None for one per core), seasons are extracted in
+                          parallel worker processes; see 'map_years'.
         """
-        
-        if not bool(self.year_results):
-            self.pos_points_df()
+        if processes != 1:
+            jobs = {yr: (dict(HOMEPAGE=self.HOMEPAGE, year_urls={yr: urls}), dict(logging=logging))
+                    for yr, urls in self.year_urls.items()}
+            self.map_years('seasons_results', jobs, ['year_results', 'race_links', 'extracted_urls'], processes)
+            if print_dataframes:
+                for yr in self.year_urls:
+                    if yr in self.year_results:
+                        print(self.year_results[yr].head())
+            if return_results:
+                return self.year_results
+            return
 
         for yr, urls in self.year_urls.items():
 
-            #assert bool(self.year_results.get(yr)), f"Results dataframe for {yr} had not been instantiated!"
-            results_df = self.year_results[yr]
-            df1 = results_df.copy()
             logger.info(f"Extracting results for {yr} season")
-            placeholder = [0 for i in range(len(urls)*2)]
-            for n, race in enumerate(urls):
-                
-                race = f"{self.HOMEPAGE}{race}"
-                
-                df = self.data_to_table(race, logging=True)
-                df.index = df['Driver'].apply(lambda s : s[:-3]) #added
-
-                
-                if True in df.index.duplicated():#added
-                    new_idx = []
-                    for i, dup in zip(df.index, df.index.duplicated()):
-
-                        if not dup:
-                            new_idx.append(i)
-                        else:
-                            new_idx.append(i + str(random.randint(1, 100))) #workaround for duplicates
-                    df.set_index(pd.Index(new_idx), inplace=True)
-                
-                if n == 0:
-                    results_df["Details","Car"] = df["Car"]
-                    results_df["Details", "Driver"] = df["Driver"]
-                    results_df.index = df.index
-                
-                # add previously unseen drivers at each race
-                for ind in df.index.difference(results_df.index):
-
-                    results_df.loc[ind] = [df['Driver'].loc[ind],df['Car'].loc[ind],*placeholder]
-                
-                for ind in df.index:
-                    pos = df['Pos'].where(df.index == ind).dropna().values[0]
-                    pts = df['PTS'].where(df.index == ind).dropna().values[0]
-                    
-                    results_df.at[ind, ('Position', f"{race.split('/')[9]}")] = pos
-                    results_df.at[ind, ('Points', f"{race.split('/')[9]}")] = pts
-                df2=results_df.copy()
-            #####Format the dataframe with a few lines#####
-            results_df.reset_index(inplace=True)
-            
-            #results_df.drop(['Driver'], axis=1, inplace=True)
-            results_df.fillna(0, inplace=True) 
-            #return results_df
-            try:
-                results_df["Details","Car"] = results_df["Details","Car"].apply(lambda s : s[:3]).map(str.upper) #retain last 3 digits and caps
-            except:
-                pass
-            df3 = results_df.copy()
+            results_df = self.season_results(yr, urls, logging=True)
+
             self.year_results[yr] = results_df
+            self.extracted_urls[yr] = list(urls)
             if print_dataframes:
                 print(results_df.head())
-        # return df1, df2, df3
+
         if return_results:
             return self.year_results
 
@@ -0,0 +1,396 @@
+import base64
+import gzip
+import random
+import threading
+import time
+import urllib.parse
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from F1Archive.utils import LazyModule
+from F1Archive.data.cache import CacheMiss
+
+http_client = LazyModule('http.client')
+url_error = LazyModule('urllib.error')
+email_utils = LazyModule('email.utils')
+urllib_request = LazyModule('urllib.request')
+
+USER_AGENT = 'F1Archive (+https://github.com/cfcooney/F1Archive)'
+REDIRECT_CODES = (301, 302, 303, 307, 308)
+MAX_REDIRECTS = 5
+RETRY_CODES = (429, 500, 502, 503, 504)
+THROTTLE_CODES = (429, 503)
+# requests per second to hosts when PageFetcher is not given a 'rate'
+DEFAULT_RATES = {'www.formula1.com': 2.0, 'formula1.com': 2.0}
+
+_DEFAULT_FETCHER = None
+
+
+def urlopen_read(url):
+    """
+    Download a single page, used when no PageFetcher is supplied. Goes through one shared
+    PageFetcher, so these requests also get timeouts, retries and backoff.
+    """
+    global _DEFAULT_FETCHER
+    if _DEFAULT_FETCHER is None:
+        _DEFAULT_FETCHER = PageFetcher()
+    return _DEFAULT_FETCHER.get(url)
+
+
+def retry_after_seconds(value, now=None):
+    """
+    Seconds to wait from a Retry-After header, given either as seconds or as an HTTP date.
+    None if the header is missing or unreadable.
+    """
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        when = email_utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if when is None:
+        return None
+    return max(0.0, when.timestamp() - (time.time() if now is None else now))
+
+
+def proxy_for(scheme, netloc):
+    """
+    Proxy for a request, from the HTTP_PROXY / HTTPS_PROXY / NO_PROXY settings that urllib
+    also uses ('urllib.request.getproxies').
+    Output: (proxy host:port, headers for the proxy) or None to connect directly
+    """
+    proxy = urllib_request.getproxies().get(scheme)
+    if not proxy or urllib_request.proxy_bypass(netloc):
+        return None
+    parts = urllib.parse.urlsplit(proxy if '://' in proxy else f"http://{proxy}")
+    headers = dict()
+    if parts.username:
+        credentials = f"{urllib.parse.unquote(parts.username)}:{urllib.parse.unquote(parts.password or '')}"
+        headers['Proxy-Authorization'] = f"Basic {base64.b64encode(credentials.encode()).decode()}"
+    return parts.hostname + (f":{parts.port}" if parts.port else ''), headers
+
+
+class HostLimiter():
+    """
+    Spaces out the requests to one host, across all threads of a PageFetcher.
+
+    rate (float) - highest number of requests per second to send, None for no limit.
+    When the host throttles (429 / 503), 'throttled' pauses every request to it and doubles the
+    spacing, once for all the requests throttled together; each successful request then shortens
+    the spacing by 5% until it is back at 1 / rate.
+    The fetcher so settles just below the throughput the host accepts.
+    """
+    MIN_INTERVAL = 0.05 # spacing used after a throttle when there is no configured rate
+
+    def __init__(self, rate=None):
+        self.base_interval = 1.0 / rate if rate else 0.0
+        self.interval = self.base_interval
+        self.next_time = 0.0
+        self.throttled_at = None
+        self._lock = threading.Lock()
+
+    def wait(self):
+        with self._lock:
+            now = time.monotonic()
+            start = max(now, self.next_time)
+            self.next_time = start + self.interval
+        if start > now:
+            time.sleep(start - now)
+
+    def throttled(self, pause=0.0):
+        with self._lock:
+            now = time.monotonic()
+            # requests already in flight get throttled together: slow down once per throttle
+            if self.throttled_at is None or now - self.throttled_at > max(self.interval, pause):
+                self.interval = max(2 * self.interval, self.MIN_INTERVAL)
+                self.throttled_at = now
+            self.next_time = max(self.next_time, now + pause)
+
+    def succeeded(self):
+        with self._lock:
+            if self.interval > self.base_interval:
+                self.interval = self.interval * 0.95
+                if self.interval < max(self.base_interval, 0.001):
+                    self.interval = self.base_interval
+
+
+class PageFetcher():
+    """
+    Download pages over pooled keep-alive connections.
+
+    Each worker thread keeps one open connection per host, so consecutive requests
+    to formula1.com reuse the same socket instead of paying for a new TCP/TLS handshake.
+    With max_workers > 1, 'map' runs jobs on a bounded thread pool; results are always
+    returned in the order the jobs were given.
+    If a ResponseCache is given, pages are served from disk where possible and every
+    download is stored for the next run.
+    Fetch times, requests, bytes and cache hits are recorded in 'stats' (an ExtractionStats)
+    when one is set.
+
+    Requests to each host are spaced out by a HostLimiter ('rate' requests per second, per
+    process); without a 'rate', hosts in DEFAULT_RATES get their listed rate and others are not
+    limited, and rate=0 turns the limit off. Timeouts, dropped connections and 429 / 5xx responses are retried up to 'retries'
+    times, after the server's Retry-After or else a jittered exponential backoff: a random wait
+    of up to backoff * 2 ** attempt seconds, at most 'max_backoff'.
+    Proxies are taken from the environment as by urllib ('proxy_for'); https goes through a
+    CONNECT tunnel.
+    """
+    def __init__(self, max_workers=1, timeout=30, cache=None, rate=None, retries=3, backoff=0.5, max_backoff=60):
+        self.max_workers = max(1, int(max_workers or 1))
+        self.timeout = timeout
+        self.cache = cache
+        self.rate = rate
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.stats = None
+        self._local = threading.local()
+        self._executor = None
+        self._lock = threading.Lock()
+        self._limiters = dict() # host -> HostLimiter
+
+    def __getstate__(self):
+        # connections, threads, locks and rate limiters stay behind; a copy sent to a worker
+        # process opens its own
+        state = self.__dict__.copy()
+        for attr in ('_local', '_executor', '_lock', '_limiters'):
+            del state[attr]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._local = threading.local()
+        self._executor = None
+        self._lock = threading.Lock()
+        self._limiters = dict()
+
+    def limiter(self, host):
+        with self._lock:
+            if host not in self._limiters:
+                self._limiters[host] = HostLimiter(DEFAULT_RATES.get(host) if self.rate is None else self.rate)
+            return self._limiters[host]
+
+    def backoff_delay(self, attempt):
+        return random.uniform(0, min(self.max_backoff, self.backoff * 2 ** attempt))
+
+    def _send(self, url, headers=None):
+        """
+        '_request' under the host's rate limit, retrying timeouts, dropped connections
+        and 429 / 5xx responses. Returns (status, headers, body) of the last attempt.
+        """
+        limiter = self.limiter(urllib.parse.urlsplit(url).netloc)
+        for attempt in range(self.retries + 1):
+            limiter.wait()
+            try:
+                status, response_headers, body = self._request(url, headers)
+            except (OSError, http_client.HTTPException): # timeouts, refused / reset connections, bad responses
+                if attempt == self.retries:
+                    raise
+                self._count(url, retries=1)
+                time.sleep(self.backoff_delay(attempt))
+                continue
+
+            if status not in RETRY_CODES:
+                limiter.succeeded()
+                return status, response_headers, body
+            if attempt == self.retries:
+                return status, response_headers, body
+            retry_after = retry_after_seconds(response_headers.get('Retry-After'))
+            delay = self.backoff_delay(attempt) if retry_after is None else retry_after
+            self._count(url, retries=1)
+            if status in THROTTLE_CODES:
+                limiter.throttled(delay) # every request to the host waits, not just this one
+            else:
+                time.sleep(delay)
+
+    def _connection(self, scheme, netloc, fresh=False):
+        connections = getattr(self._local, 'connections', None)
+        if connections is None:
+            connections = self._local.connections = dict()
+
+        key = (scheme, netloc)
+        conn = connections.get(key)
+        if fresh and conn is not None:
+            conn.close()
+            conn = None
+        if conn is None:
+            proxy = proxy_for(scheme, netloc)
+            address = netloc if proxy is None else proxy[0]
+            if scheme == 'https':
+                conn = http_client.HTTPSConnection(address, timeout=self.timeout)
+                if proxy is not None:
+                    conn.set_tunnel(netloc, headers=proxy[1])
+            else:
+                conn = http_client.HTTPConnection(address, timeout=self.timeout)
+            connections[key] = conn
+        return conn
+
+    def _request(self, url, headers=None):
+        """
+        Single GET on a pooled connection. Returns (status, headers, body).
+        A connection dropped by the server between requests is reopened once.
+        """
+        parts = urllib.parse.urlsplit(url)
+        path = parts.path or '/'
+        if parts.query:
+            path = f"{path}?{parts.query}"
+
+        request_headers = {'User-Agent': USER_AGENT, 'Accept-Encoding': 'gzip'}
+        request_headers.update(headers or {})
+        proxy = proxy_for(parts.scheme, parts.netloc) if parts.scheme == 'http' else None
+        if proxy is not None: # plain http proxies take the full url
+            path = urllib.parse.urlunsplit(parts._replace(fragment=''))
+            request_headers.update(proxy[1])
+
+        for attempt in range(2):
+            conn = self._connection(parts.scheme, parts.netloc, fresh=attempt > 0)
+            try:
+                conn.request('GET', path, headers=request_headers)
+                response = conn.getresponse()
+                body = response.read()
+            except (http_client.RemoteDisconnected, ConnectionResetError, BrokenPipeError):
+                conn.close()
+                if attempt:
+                    raise
+                continue
+            except Exception:
+                conn.close() # e.g. after a timeout the connection is stuck mid-request
+                raise
+            self._count(url, requests=1, bytes_downloaded=len(body))
+            if response.getheader('Content-Encoding') == 'gzip':
+                body = gzip.decompress(body)
+            if response.will_close:
+                conn.close()
+            return response.status, response.headers, body
+
+    def _download(self, url, headers=None):
+        """
+        GET 'url', following redirects. Returns (status, headers, body).
+        """
+        for _ in range(MAX_REDIRECTS + 1):
+            status, response_headers, body = self._send(url, headers)
+            if status in REDIRECT_CODES and response_headers.get('Location'):
+                url = urllib.parse.urljoin(url, response_headers['Location'])
+                continue
+            if status >= 400:
+                raise url_error.HTTPError(url, status, http_client.responses.get(status, ''), response_headers, None)
+            return status, response_headers, body
+        raise url_error.URLError(f"Too many redirects for {url}")
+
+    def _count(self, url, **counts):
+        if self.stats is not None:
+            self.stats.count(dict(url=url), **counts)
+
+    def get(self, url, refresh=False):
+        """
+        Return the body of 'url' as bytes, from the cache when one is configured.
+        refresh (bool) - revalidate a cached page with the server even if it is still fresh
+        """
+        if self.stats is None:
+            return self._get(url, refresh)
+        with self.stats.timer('fetch', url=url):
+            page = self._get(url, refresh)
+        self._count(url, pages=1)
+        return page
+
+    def _get(self, url, refresh=False):
+        cache = self.cache
+        if cache is None:
+            return self._download(url)[2]
+
+        entry = cache.lookup(url)
+        if entry is not None and (cache.offline or (cache.is_fresh(entry) and not refresh)):
+            self._count(url, cache_hits=1)
+            return cache.read(entry)
+        if cache.offline:
+            raise CacheMiss(f"{url} is not in the cache and the cache is offline")
+
+        headers = cache.validators(entry) if entry is not None else None
+        status, response_headers, body = self._download(url, headers)
+        if status == 304:
+            self._count(url, cache_hits=1)
+            return cache.refresh(entry)
+        cache.store(url, body, response_headers)
+        return body
+
+    def _pool(self):
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers,
+                                                    thread_name_prefix='F1Archive-fetch')
+        return self._executor
+
+    def map(self, fcn, items):
+        """
+        Apply 'fcn' to every item, concurrently when max_workers > 1.
+        Results come back in the same order as 'items'.
+        """
+        items = list(items)
+        if self.max_workers == 1 or len(items) < 2:
+            return [fcn(item) for item in items]
+
+        return list(self._pool().map(fcn, items))
+
+    def imap(self, fcn, items):
+        """
+        Like 'map', but yield each result as soon as it and all earlier ones are done, with at
+        most max_workers jobs running ahead of the consumer, so that results can be used while
+        later items are still being fetched.
+        """
+        if self.max_workers == 1:
+            for item in items:
+                yield fcn(item)
+            return
+
+        pool = self._pool()
+        pending = deque()
+        try:
+            for item in items:
+                pending.append(pool.submit(fcn, item))
+                if len(pending) >= self.max_workers:
+                    yield pending.popleft().result()
+            while pending:
+                yield pending.popleft().result()
+        finally:
+            for future in pending: # consumer stopped early or a job failed
+                future.cancel()
+
+    def get_many(self, urls, refresh=False):
+        """
+        Return page bodies for all 'urls', in order.
+        """
+        return self.map(lambda url: self.get(url, refresh=refresh), urls)
+
+    def close(self):
+        """
+        Shut down the worker pool. Connections are dropped along with their threads.
+        """
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=True)
+                self._executor = None
+        for conn in getattr(self._local, 'connections', dict()).values():
+            conn.close()
+        self._local = threading.local()
+
+
+class ReplayFetcher(PageFetcher):
+    """
+    Serve pages from recorded copies instead of the network, e.g. a corpus of saved
+    formula1.com pages for offline tests and benchmarks. Pass it to an extractor as 'fetcher'.
+
+    pages (dict) - url -> page bytes
+    """
+    def __init__(self, pages, max_workers=1):
+        super(ReplayFetcher, self).__init__(max_workers=max_workers)
+        self.pages = pages
+
+    def _get(self, url, refresh=False):
+        try:
+            page = self.pages[url]
+        except KeyError:
+            raise CacheMiss(f"{url} is not among the recorded pages") from None
+        self._count(url, cache_hits=1)
+        return page
@@ -0,0 +1,77 @@
+import functools
+from F1Archive.utils import LazyModule
+
+np = LazyModule('numpy')
+pd = LazyModule('pandas')
+etree = LazyModule('lxml.etree')
+
+
+@functools.lru_cache(maxsize=None)
+def _parser():
+    return etree.HTMLParser()
+
+
+def _text(cell):
+    return " ".join("".join(cell.itertext()).split())
+
+
+# lap time columns stay text even where every lap is under a minute ('53.377')
+TEXT_COLUMNS = ('Time', 'Q1', 'Q2', 'Q3')
+
+
+def _typed_column(values, text=False):
+    """
+    Convert a column of cell strings to int or float where every non-empty cell is numeric,
+    otherwise (or with text=True) keep strings. Empty cells become NaN.
+    """
+    empty = [v == '' for v in values]
+    if text:
+        return pd.Series([np.nan if e else v for v, e in zip(values, empty)], dtype=object)
+    try:
+        numbers = np.array([np.nan if e else float(v) for v, e in zip(values, empty)], dtype=float)
+    except ValueError:
+        return pd.Series([np.nan if e else v for v, e in zip(values, empty)], dtype=object)
+    if not any(empty) and all(v.lstrip('-').isdigit() for v in values):
+        return pd.Series(numbers.astype(np.int64))
+    return pd.Series(numbers)
+
+
+def parse_page(page):
+    """
+    Parse raw page bytes once and return the lxml document.
+    """
+    return etree.fromstring(page, parser=_parser())
+
+
+def results_table(doc, table_number=0):
+    """
+    Build a typed pd.DataFrame from a results table in a parsed page.
+
+    Header names come from the first row of <th> cells. Spacer columns (the empty
+    'limiter' cells formula1.com puts either side of the table) are recognised by
+    structure - an empty header and no content in any row - and dropped.
+    """
+    tables = doc.xpath('//table')
+    if len(tables) <= table_number:
+        raise ValueError("No results table found on page")
+    table = tables[table_number]
+
+    header = table.xpath('.//tr[th][1]/th')
+    names = [_text(th) for th in header]
+    rows = [[_text(td) for td in tr.xpath('./td')] for tr in table.xpath('.//tr[td]')]
+    rows = [row for row in rows if len(row) == len(names)]
+
+    columns = list(zip(*rows)) if rows else [() for _ in names]
+    data = dict()
+    for name, values in zip(names, columns):
+        if name == '' and all(v == '' for v in values):
+            continue # spacer column
+        data[name] = _typed_column(values, text=name in TEXT_COLUMNS)
+    return pd.DataFrame(data)
+
+
+def parse_results_table(page, table_number=0):
+    """
+    Page bytes -> typed results pd.DataFrame, in a single parse.
+    """
+    return results_table(parse_page(page), table_number)
@@ -0,0 +1,51 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+
+def default_processes():
+    """
+    Number of worker processes to use when none is given: one per available core.
+    """
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+def run_year(cls, settings, state, method, kwargs, attrs):
+    """
+    Worker for multi-process extraction: build a fresh extractor of class 'cls' from its
+    constructor 'settings', set the attributes in 'state' (e.g. the urls of a single season),
+    call 'method' and return the dict attributes named in 'attrs'.
+    Module level so it can be pickled and sent to a process pool.
+    """
+    extractor = cls(**settings)
+    for attr, value in state.items():
+        setattr(extractor, attr, value)
+    getattr(extractor, method)(**kwargs)
+    return {attr: getattr(extractor, attr) for attr in attrs}
+
+
+def run_years(extractor, method, jobs, attrs, processes=None):
+    """
+    Run one job per season on a process pool.
+
+    Input: extractor - DataExtractor (or subclass) whose settings every worker copies
+           method (str) - extractor method each worker calls
+           jobs (dict) - year -> (state, kwargs) for that year's worker
+           attrs (list) - names of the dict attributes each worker returns
+           processes (int) - pool size, default one per core
+    Output: list of (year, result dict or None, exception or None), in the order of 'jobs'
+    """
+    processes = processes or default_processes()
+    settings = extractor.settings()
+    results = []
+    with ProcessPoolExecutor(max_workers=min(processes, max(1, len(jobs)))) as pool:
+        futures = [(year, pool.submit(run_year, type(extractor), settings, state, method, kwargs, attrs))
+                   for year, (state, kwargs) in jobs.items()]
+        for year, future in futures:
+            try:
+                results.append((year, future.result(), None))
+            except Exception as error:
+                results.append((year, None, error))
+    return results
@@ -1,58 +1,149 @@
-import pandas as pd 
-import numpy as np 
-import bs4 as bs 
-import urllib.request
 import logging
-from F1Archive.utils import get_col_list, multi_index_df
+from F1Archive.utils import LazyModule, get_col_list, multi_index_df
 from F1Archive.data.data_extraction import DataExtractor
+from F1Archive.data.html_tables import parse_page
+from F1Archive.data_transforms.transformations import times_to_seconds, stack_qualy_results
 
-logger = logging.getLogger()
-logger.setLevel(logging.INFO)
-console_handler_Q = logging.StreamHandler()
-log_format = '%(asctime)s | %(levelname)s: %(message)s'
-console_handler_Q.setFormatter(logging.Formatter(log_format))
-logger.addHandler(console_handler_Q)
+pd = LazyModule('pandas')
+np = LazyModule('numpy')
 
-def get_driver_team_list(df: pd.DataFrame):
-    driver_team_list = []
-    for n, row in df.iterrows():
-        driver_team_list.append(row['Details']['Driver'] + '_' + row['Details']['Car'])
-    return driver_team_list
+logger = logging.getLogger(__name__)
+
+class QualyRows():
+    """
+    Incrementally maintained row index for one season of qualifying results.
+
+    Rows are keyed by car number. A driver who later appears in a different car, or a
+    different driver under a number already in use, gets a new row labelled 1000 + number
+    (2000 + number if that is taken, and so on).
+    A number's first row is labelled by the number itself, so lookups from number and from
+    (driver, car) to row are dictionary hits and placing each qualifying result is O(1).
+    """
+    def __init__(self):
+        self.details = dict()  # row label -> [driver, car, number]
+        self.by_team = dict()  # (driver, car) -> row label
+        self.cells = dict()    # (row label, race) -> (position, time)
+        self.late = set()      # rows first seen after the opening race, filled with 0 elsewhere
+        self.races = 0
+
+    def _add(self, label, no, driver, car):
+        while label in self.details:
+            label += 1000
+        self.details[label] = [driver, car, no]
+        self.by_team.setdefault((driver, car), label)
+        if self.races:
+            self.late.add(label)
+        return label
+
+    def row(self, no, driver, car):
+        """
+        Return the row label for a result by 'driver' in 'car' under number 'no',
+        adding a new row for an unseen number or an unseen (driver, car).
+        """
+        if no not in self.details:
+            return self._add(no, no, driver, car)
+        if self.details[no][:2] == [driver, car]:
+            return no
+        label = self.by_team.get((driver, car))
+        if label is None:
+            label = self._add(1000 + no, no, driver, car)
+        return label
+
+    def place(self, race, df):
+        """
+        Add the results of one qualifying table (indexed by car number).
+        Returns the row label of each result.
+        """
+        labels = []
+        times = df['Time'].fillna(0)
+        for no, driver, car, pos, time in zip(df.index, df['Driver'], df['Car'], df['Pos'], times):
+            labels.append(self.row(no, driver, car))
+            self.cells[(labels[-1], race)] = (pos, time)
+        self.races += 1
+        return labels
+
+    def to_frame(self, races):
+        """
+        Build the season DataFrame, rows sorted by label.
+        """
+        labels = sorted(self.details)
+        data = dict()
+        data['Details', 'Driver'] = [self.details[l][0] for l in labels]
+        data['Details', 'Car'] = [self.details[l][1] for l in labels]
+        data['Details', 'Driver No'] = [self.details[l][2] for l in labels]
+        for race in races:
+            empty = [0 if l in self.late else np.nan for l in labels]
+            cells = [self.cells.get((l, race)) for l in labels]
+            data[race, 'Position'] = [c[0] if c else e for c, e in zip(cells, empty)]
+            data[race, 'Time'] = [c[1] if c else e for c, e in zip(cells, empty)]
+            data[race, 'Team-mate'] = empty
+        df = pd.DataFrame(data, index=pd.Index(labels, name='No'))
+        df.columns = pd.MultiIndex.from_tuples(df.columns)
+        # object, not string, columns: untimed cells are filled with 0 later on
+        return df.astype({(race, 'Time'): object for race in races})
 
 
 class QualyExtractor(DataExtractor):
     """
     Extract and format qualifying data with DataExtractor as a super class
+
+    With keep_sessions=True, the separate Q1/Q2/Q3 times of post-2005 seasons are also kept,
+    as float32 seconds, in 'self.qualy_sessions' (same rows as 'self.qualy_results').
     """
-    def __init__(self):
-        super(QualyExtractor, self).__init__()
+    def __init__(self, max_workers=1, cache=None, keep_sessions=False, fetcher=None):
+        super(QualyExtractor, self).__init__(max_workers=max_workers, cache=cache, fetcher=fetcher)
         self.qualy_urls = dict()
         self.qualy_results = dict()
+        self.keep_sessions = keep_sessions
+        self.qualy_sessions = dict()
+        self.qualy_rows = dict() # year -> QualyRows of 'qualy_results', kept for 'refresh_season'
+
+    def settings(self):
+        return dict(super(QualyExtractor, self).settings(), keep_sessions=self.keep_sessions)
+
+    # first season from which each results page can be derived from the race-result url
+    SESSION_PAGES = dict(qualifying=[(2006, 'qualifying.html')])
+
+    def derive_session_url(self, race_url, year, session='qualifying'):
+        """
+        Return the url of a session page derived from the race-result url structure,
+        or None if the page name is not known for that season.
+        """
+        page = None
+        for first_year, name in self.SESSION_PAGES.get(session, []):
+            if int(year) >= first_year:
+                page = name
+        if page is None:
+            return None
+        return self.session_url(race_url, page)
+
+    @staticmethod
+    def qualy_links(links, yr):
+        """
+        Select the qualifying results pages from the links of a race page.
+        """
+        qualy_urls = []
+        for href in links:
+            if 'qualifying-0' in str(href) and href not in qualy_urls:
+                qualy_urls.append(href)
+            elif int(yr) >= 2006 and 'qualifying' in str(href) and href not in qualy_urls:
+                qualy_urls.append(href)
+        return qualy_urls
 
     def get_qualy_urls(self, return_urls=False):
         """
         Input: YEAR: str OR int
         Output: qualy_urls: list of urls containing qualifing results for specific year
+
+        Qualifying urls are derived from the race-result urls where the page name is known
+        (see SESSION_PAGES), otherwise taken from race pages already fetched by 'seasons_results'.
+        Only race pages covered by neither are downloaded.
         """
         assert bool(self.year_urls), "get_race_urls() method must be called before get_qualy_urls()" 
 
         all_urls = []
         for yr, urls in self.year_urls.items():
-            qualy_urls = []
-            for url in urls:
-
-                source = urllib.request.urlopen(f"{self.HOMEPAGE}{url}").read()
-                soup = bs.BeautifulSoup(source,'lxml')
-        
-                for url in soup.find_all('a'):
-                    
-                    if 'qualifying-0' in str(url.get('href')) and url.get('href') not in qualy_urls:
-                        qualy_urls.append(url.get('href'))
-                        
-                    elif int(yr) >= 2006 and 'qualifying' in str(url.get('href')) and url.get('href') not in qualy_urls:
-                        qualy_urls.append(url.get('href'))
-                    # else if 'overallqualifying' in str(url.get('href')) and url.get('href') not in qualy_urls:
-                    #     qualy_urls.append(url.get('href')):
+            qualy_urls = self.season_qualy_urls(yr, urls)
             
             self.qualy_urls[yr] = qualy_urls
             all_urls.append(qualy_urls)
@@ -60,6 +151,43 @@ class QualyExtractor(DataExtractor):
         if return_urls:
             return all_urls
 
+    def season_qualy_urls(self, yr, urls):
+        """
+        Qualifying urls for the race-result 'urls' of season 'yr', in race order: the derived
+        qualifying page of each race, followed by any other qualifying pages linked from the race
+        page when its links are recorded.
+        """
+        derived = {url: self.derive_session_url(url, yr) for url in urls}
+        missing = [url for url in urls if derived[url] is None and url not in self.race_links]
+        sources = self.fetcher.get_many([f"{self.HOMEPAGE}{url}" for url in missing])
+        for url, source in zip(missing, sources):
+            with self.stage('parse', url=url):
+                self.record_links(url, parse_page(source))
+
+        qualy_urls = []
+        for url in urls:
+            links = [] if derived[url] is None else [derived[url]]
+            if url in self.race_links: # also picks up sprint and extra qualifying pages
+                links += self.qualy_links(self.race_links[url], yr)
+            qualy_urls.extend(link for link in links if link not in qualy_urls)
+        return qualy_urls
+
+    @staticmethod
+    def qualy_race_keys(urls):
+        """
+        Column names for the qualifying sessions in 'urls': the race name, with an 'A'/'B' suffix
+        for a second or third qualifying page of the same race.
+        """
+        keys = []
+        for race in urls:
+            if race.split('/')[6] not in keys:
+                keys.append(race.split('/')[6])
+            elif race.split('/')[6] + 'A' not in keys:
+                keys.append(race.split('/')[6] + 'A')
+            else:
+                keys.append(race.split('/')[6] + 'B')
+        return keys
+
     def qualy_df(self):
        """
        Method to generate empty dataframe for storing position and points for each race,
@@ -67,85 +195,152 @@ class QualyExtractor(DataExtractor):
        """
        for yr, urls in self.qualy_urls.items():
             qualy_dict = dict(Details=["Driver", "Car","Driver No"])
-            for race in urls:
-                if race.split('/')[6] not in qualy_dict.keys():
-                    qualy_dict[race.split('/')[6]] = ["Position", "Time", "Team-mate"]
-                elif race.split('/')[6]+'A' not in qualy_dict.keys():
-                    qualy_dict[race.split('/')[6] + 'A'] = ["Position", "Time", "Team-mate"]
-                else:
-                    qualy_dict[race.split('/')[6] + 'B'] = ["Position", "Time", "Team-mate"]
+            for key in self.qualy_race_keys(urls):
+                qualy_dict[key] = ["Position", "Time", "Team-mate"]
             self.qualy_results[yr] = multi_index_df([], qualy_dict)
 
-    def year_qualy_results(self, logging=False):
+    def qualy_season_table(self, yr, urls, tables):
         """
+        Merge the qualifying tables of one season into a single DataFrame indexed by car number,
+        with Details (Driver, Car, Driver No) and Position / Time / Team-mate for every session.
         """
-        if not bool(self.qualy_results):
-            self.qualy_df()
-        
-        for yr, urls in self.qualy_urls.items():
-            col_num = 3
+        self._count(dict(year=yr), rows_merged=sum(len(df) for df in tables))
+        with self.stage('merge', year=yr):
+            rows = QualyRows()
+            races = self.qualy_race_keys(urls)
+            sessions = self.place_qualy_tables(yr, rows, races, tables)
+
+            results_df = self.rows_to_frame(rows, races)
+            if sessions:
+                self.qualy_sessions[yr] = pd.concat(sessions, axis=1).reindex(results_df.index)
+        self.qualy_rows[yr] = rows
+        return results_df
+
+    def place_qualy_tables(self, yr, rows, races, tables):
+        """
+        Place the qualifying tables of 'races' into 'rows'. Returns the Q1/Q2/Q3 times of each
+        race (race -> DataFrame by row label) when 'keep_sessions' is set.
+        """
+        sessions = dict()
+        for race, df in zip(races, tables):
+            df = df.drop_duplicates(subset='Pos', keep='first') # remove duplicates from F1 site
+            if int(yr) >= 2006:
+                df = df.assign(Time=self.get_final_qualy(df))
+            labels = rows.place(race, df)
+            if self.keep_sessions and int(yr) >= 2006:
+                times = self.session_times(df).set_axis(labels)
+                sessions[race] = times[~times.index.duplicated(keep='last')]
+        return sessions
+
+    @staticmethod
+    def rows_to_frame(rows, races):
+        results_df = rows.to_frame(races)
+        results_df["Details","Car"] = results_df["Details","Car"].apply(lambda s : s[:3]).map(str.upper) #retain last 3 digits and caps
+        return results_df
+
+    def refresh_season(self, year, logging=False):
+        """
+        Bring a season up to date after new races: race results as in DataExtractor.refresh_season,
+        then the qualifying sessions of the new races are appended to 'qualy_results' (when that
+        season's qualifying has been extracted). Columns already in 'qualy_results', including
+        any added by transformations (e.g. 'to_mean'), are kept as they are.
+        Output: list of the new race urls
+        """
+        yr = str(year)
+        new_urls = super(QualyExtractor, self).refresh_season(yr, logging=logging)
+        if not new_urls or yr not in self.qualy_results:
+            return new_urls
+
+        old_urls = self.qualy_urls.get(yr, [])
+        new_qualy = [url for url in self.season_qualy_urls(yr, new_urls) if url not in old_urls]
+        if not new_qualy:
+            return new_urls
+        urls = old_urls + new_qualy
+        tables = self.race_tables(new_qualy, logging=logging)
+
+        rows = self.qualy_rows.get(yr)
+        if rows is None: # e.g. a season loaded from disk: rebuild it
+            logger.info(f"Rebuilding qualifying for {yr} season")
+            tables = self.race_tables(old_urls, logging=logging) + tables
+            self.qualy_urls[yr] = urls
+            self.qualy_results[yr] = self.qualy_season_table(yr, urls, tables)
+            return new_urls
+
+        self._count(dict(year=yr), rows_merged=sum(len(df) for df in tables))
+        with self.stage('merge', year=yr):
+            races = self.qualy_race_keys(urls)
+            sessions = self.place_qualy_tables(yr, rows, races[len(old_urls):], tables)
+            fresh = self.rows_to_frame(rows, races)
+
             results_df = self.qualy_results[yr]
-            
+            added = fresh.index.difference(results_df.index) # drivers first seen in the new races
+            shared = [col for col in fresh.columns if col in results_df.columns]
+            results_df = pd.concat([results_df, fresh.loc[added, shared]]).reindex(fresh.index)
+            new_cols = [col for col in fresh.columns if col not in results_df.columns]
+            self.qualy_results[yr] = pd.concat([results_df, fresh[new_cols]], axis=1)
+            self.qualy_urls[yr] = urls
+
+            if sessions:
+                kept = self.qualy_sessions.get(yr)
+                sessions = pd.concat(sessions, axis=1).reindex(fresh.index)
+                self.qualy_sessions[yr] = sessions if kept is None else pd.concat([kept.reindex(fresh.index), sessions], axis=1)
+        return new_urls
+
+    def year_qualy_results(self, logging=False, processes=1):
+        """
+        Extract qualifying results for every season in 'self.qualy_urls' into 'self.qualy_results'.
+        processes (int) - with more than 1 (or None for one per core), seasons are extracted in
+                          parallel worker processes; see 'map_years'.
+        """
+        if processes != 1:
+            jobs = {yr: (dict(HOMEPAGE=self.HOMEPAGE, qualy_urls={yr: urls}), dict(logging=logging))
+                    for yr, urls in self.qualy_urls.items()}
+            self.map_years('year_qualy_results', jobs, ['qualy_results', 'qualy_sessions', 'qualy_rows'], processes)
+            return
+
+        for yr, urls in self.qualy_urls.items():
             logger.info(f"Extracting qualifying results for {yr} season")
-            placeholder = [0 for i in range(len(urls)*3)]
-        
-            for n, race in enumerate(urls):
-                
-                race = f"{self.HOMEPAGE}{race}"
-                
-                df = self.data_to_table(race, logging=logging)
-                df.drop_duplicates(subset='Pos', keep='first', inplace=True) # remove duplicates from F1 site
-                
-                #display(df.No)
-                if n == 0:
-                    results_df["Details","Car"] = df["Car"]
-                    results_df["Details", "Driver"] = df["Driver"]
-                    results_df["Details", 'Driver No'] = df.index
-                    results_df.index = df.index
-                
-                #display(results_df)
-                # add previously unseen drivers at each race
-                for ind in df.index.difference(results_df.index):
-        
-                    results_df.loc[ind] = [df['Driver'].loc[ind],df['Car'].loc[ind],ind,*placeholder] #PROBLEM
-       
-                for n, row in df.iterrows():
-                    driver_team = row['Driver'] + '_' + row['Car']
-                    if driver_team not in get_driver_team_list(results_df):
-                        results_df.loc[1000+n] = [row['Driver'],row['Car'],n,*placeholder]
-                
-
-                if int(yr) >= 2006:
-                    df['Time'] = self.get_final_qualy(df)
-                df['Time'] = df['Time'].fillna(0)
-
-                for ind in df.index:
-                    pos = df['Pos'].where(df.index == ind).dropna().values[0]
-                    time = df['Time'].where(df.index == ind).dropna().values[0]
-
-                    if df['Car'].loc[ind] == results_df['Details']['Car'].loc[ind]:
-                        
-                        results_df.at[ind, (f"{results_df.columns[col_num][0]}",'Position')] = pos
-                        results_df.at[ind, (f"{results_df.columns[col_num][0]}", 'Time', )] = time
-                    else:
-                        for i in results_df.index:
-                            if results_df['Details']['Driver No'].loc[i] == ind and results_df['Details']['Driver No'].loc[i] != i:
-                               
-                                results_df.at[i, (f"{results_df.columns[col_num][0]}",'Position')] = pos
-                                results_df.at[i, (f"{results_df.columns[col_num][0]}", 'Time', )] = time
-        
+            tables = self.race_tables(urls, logging=logging)
+            self.qualy_results[yr] = self.qualy_season_table(yr, urls, tables)
+
+    def qualy_records(self, yr, df, race, race_no=0):
+        """
+        Long-format records for a single qualifying table from 'race_table':
+        Year | Race | Race No | No | Driver | Car | Position | Time
+
+        From 2006 'Time' is the best session time ('get_final_qualy'); with keep_sessions the
+        Q1/Q2/Q3 times are added as float32 seconds.
+        """
+        df = df.drop_duplicates(subset='Pos', keep='first') # remove duplicates from F1 site
+        times = self.get_final_qualy(df) if int(yr) >= 2006 else df['Time']
+        records = pd.DataFrame({'Year': yr, 'Race': race, 'Race No': race_no, 'No': df.index.values,
+                                'Driver': df['Driver'].values, 'Car': df['Car'].values,
+                                'Position': df['Pos'].values, 'Time': times.to_numpy(dtype=object)})
+        if self.keep_sessions and int(yr) >= 2006:
+            sessions = self.session_times(df)
+            for q in sessions.columns:
+                records[q] = sessions[q].values
+        return records
 
-                col_num += 3
-            display(results_df)
-            #####Format the dataframe with a few lines#####
-            results_df.sort_index(inplace=True)
-            #results_df.fillna(0, inplace=True)   
-            results_df["Details","Car"] = results_df["Details","Car"].apply(lambda s : s[:3]).map(str.upper) #retain last 3 digits and caps
+    def iter_qualy_results(self, YEARS=None, logging=False):
+        """
+        Stream qualifying results season by season, one long-format batch per session
+        (see 'qualy_records'), yielded as soon as that session is parsed. Race names are the
+        'qualy_race_keys' and Race No counts from 0 within the season.
 
-            self.qualy_results[yr] = results_df
+        Qualifying urls already in 'qualy_urls' are used, otherwise they are found as in
+        'get_qualy_urls'. Nothing is kept in 'qualy_results', so memory stays bounded and batches
+        already yielded are not lost if a later session fails.
+        """
+        for yr, urls in self.season_urls(YEARS).items():
+            logger.info(f"Streaming qualifying results for {yr} season")
+            qualy_urls = self.qualy_urls[yr] if yr in self.qualy_urls else self.season_qualy_urls(yr, urls)
+            races = self.qualy_race_keys(qualy_urls)
+            for n, (race, df) in enumerate(zip(races, self.iter_race_tables(qualy_urls, logging=logging))):
+                yield self.qualy_records(yr, df, race, n)
 
     @staticmethod
-    def stack_qualy_results(q_df, race_names=None):
+    def stack_qualy_results(q_df, race_names=None, generator=False):
         """
         Stack qualifying results for a single year under the following columns:
         No | Car | Driver | Position | Race | Race No | Team-mate | Time | to_mean
@@ -153,40 +348,41 @@ class QualyExtractor(DataExtractor):
         Useful for plotting Qualifying data spread per year.
         Input: q_df (pd.DataFrame) -  Qualifying results dataframe after applying 'qualy_relative_2_mean()'
                race_names (list) - list of race names for given year
+               generator (bool) - yield one stacked DataFrame per race instead
         """
-        # Establish empty dataframe for stacking race-by-race results
-        stacked_df = pd.DataFrame(columns=['No','Driver', 'Car', 'Race', 'Race No',
-                                       'Position', 'Time', 'Team-mate', 'to_mean'])
-        stacked_df.set_index('No', inplace=True)
-        
-        for rn, race in enumerate(race_names):
-            df_tmp = q_df[race].copy()
-            df_tmp["Driver"] = q_df["Details","Driver"]
-            df_tmp["Car"] = q_df["Details","Car"]
-            df_tmp['Race No'] = [rn+1 for n in range(len(df_tmp.index))]
-            r =  [race for n in range(len(df_tmp.index))]
-            df_tmp["Race"] = r
-            
-            stacked_df = pd.concat([stacked_df.copy(), df_tmp.copy()], ignore_index=False, sort=True)
-        
-        return stacked_df
+        return stack_qualy_results(q_df, race_names, generator=generator)
+
+    SESSIONS = ['Q3', 'Q2', 'Q1'] # best session first
 
     @staticmethod
-    def get_final_qualy(df):
+    def get_final_qualy(df, seconds=False):
         """
-        Get single qualifying time from three-tied qualifying post 2005
+        Get single qualifying time from three-tied qualifying post 2005:
+        the Q3 time where set, otherwise Q2, otherwise Q1.
+
+        Input: df (pd.DataFrame) - qualifying table with some of the columns Q1, Q2, Q3
+               seconds (bool) - return lap times as float seconds instead of the 'M:SS.fff' strings
+        Output: pd.Series of lap times aligned with df
         """
-        time = []
-        for _, row in df.iterrows():
-            
-            if not isinstance(row['Q3'], type(np.nan)):
-                time.append(row['Q3'])
-            elif not isinstance(row['Q2'], type(np.nan)):
-                time.append(row['Q2'])
-            else:
-                time.append(row['Q1'])
-        return time
-           
+        sessions = [q for q in QualyExtractor.SESSIONS if q in df.columns]
+        time = np.full(len(df.index), np.nan, dtype=object)
+        for q in reversed(sessions): # slower sessions are overwritten by faster ones
+            values = df[q].to_numpy(dtype=object)
+            is_set = pd.notna(values)
+            time[is_set] = values[is_set]
+        if seconds:
+            return pd.Series(times_to_seconds(time), index=df.index)
+        return pd.Series(time, index=df.index)
+
+    @staticmethod
+    def session_times(df):
+        """
+        Q1/Q2/Q3 lap times of a qualifying table as float32 seconds (NaN where not set).
+        """
+        sessions = [q for q in reversed(QualyExtractor.SESSIONS) if q in df.columns]
+        return pd.DataFrame({q: times_to_seconds(df[q].to_numpy(dtype=object)).astype(np.float32)
+                             for q in sessions}, index=df.index)
+
 
 if __name__ == '__main__':
     DX = QualyExtractor()
@@ -0,0 +1,278 @@
+import json
+import os
+import shutil
+from collections.abc import MutableMapping
+from F1Archive.utils import LazyModule
+
+np = LazyModule('numpy')
+pd = LazyModule('pandas')
+
+SEP = '|' # joins MultiIndex column levels into a single Parquet column name
+META_KEY = b'f1archive'
+
+# data type -> extractor attribute holding the per-year frames
+KINDS = dict(results='year_results', qualifying='qualy_results', constructors='champ_tables')
+
+
+def _pyarrow():
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError as error:
+        raise ImportError("SeasonStore requires pyarrow: pip install pyarrow") from error
+    return pa, pq
+
+
+# a column mixing numbers and codes is written as text plus a column of cell types,
+# '<name>' + TYPES_SUFFIX; type codes index CELL_TYPES, NAN and NONE mark missing cells
+TYPES_SUFFIX = SEP + '#types'
+CELL_TYPES = (str, int, float)
+NAN, NONE = 3, 4
+
+
+def _cell_type(v):
+    if v is None:
+        return NONE
+    if isinstance(v, str):
+        return 0
+    if isinstance(v, (int, np.integer)) and not isinstance(v, (bool, np.bool_)):
+        return 1
+    if pd.isna(v):
+        return NAN
+    if isinstance(v, (float, np.floating)):
+        return 2
+    return 0
+
+
+def _flatten_columns(df):
+    """
+    Return a copy of df with string column names plus the metadata needed to rebuild them.
+    """
+    columns = list(df.columns)
+    multi = isinstance(df.columns, pd.MultiIndex)
+    if multi:
+        names = [SEP.join(str(level) for level in col) for col in columns]
+    else:
+        names = [str(col) for col in columns]
+
+    flat = df.copy()
+    flat.columns = names
+
+    # object columns mixing numbers and codes ('NC', 'DQ', ...) are written as strings,
+    # with the type of every cell alongside so that each one is restored exactly
+    objects = [name for name in names if flat[name].dtype == object]
+    typed = []
+    for name in objects:
+        values = flat[name].to_numpy(dtype=object)
+        kinds = set(type(v) for v in values if v is None or not pd.isna(v))
+        if not kinds <= {str}:
+            types = np.array([_cell_type(v) for v in values], dtype=np.int8)
+            flat[name] = pd.Series([None if t >= NAN else str(v) for v, t in zip(values, types)],
+                                   index=flat.index, dtype=object)
+            flat[name + TYPES_SUFFIX] = types
+            typed.append(name)
+
+    meta = dict(columns=[list(col) if multi else [col] for col in columns],
+                names=names, multi=multi, typed=typed, objects=objects, column_names=list(df.columns.names))
+    return flat, meta
+
+
+def _restore_typed(values, types):
+    cells = np.empty(len(values), dtype=object)
+    for i, (v, t) in enumerate(zip(values, types)):
+        if t == NAN:
+            cells[i] = np.nan
+        elif t == NONE:
+            cells[i] = None
+        else:
+            cells[i] = CELL_TYPES[t](v)
+    return cells
+
+
+def _restore_columns(df, meta):
+    for name in meta.get('typed', []):
+        if name in df.columns:
+            types = df.pop(name + TYPES_SUFFIX).to_numpy()
+            df[name] = pd.Series(_restore_typed(df[name].to_numpy(dtype=object), types), index=df.index, dtype=object)
+    for name in meta.get('objects', []):
+        if name in df.columns and df[name].dtype != object:
+            df[name] = df[name].astype(object)
+
+    lookup = dict(zip(meta['names'], meta['columns']))
+    if meta['multi']:
+        df.columns = pd.MultiIndex.from_tuples([tuple(lookup[name]) for name in df.columns],
+                                               names=meta['column_names'])
+    else:
+        df.columns = [lookup[name][0] for name in df.columns]
+    return df
+
+
+class SeasonStore():
+    """
+    Columnar archive of extracted seasons: one zstd-compressed Parquet file per data type and year.
+
+        <root>/results/year=1998/part.parquet       - DataExtractor.year_results['1998']
+        <root>/qualifying/year=1998/part.parquet    - QualyExtractor.qualy_results['1998']
+        <root>/constructors/year=1998/part.parquet  - TeamsExtractor.champ_tables['1998']
+
+    MultiIndex columns are flattened on write and rebuilt on read, and columns mixing numbers
+    and codes get back the original type of every cell. Opening a store reads nothing;
+    a season is only loaded when it is asked for, and 'columns' reads just the selected columns.
+    """
+    def __init__(self, root, compression='zstd'):
+        self.root = os.path.expanduser(root)
+        self.compression = compression
+
+    def _path(self, kind, year):
+        assert kind in KINDS, f"kind must be one of {list(KINDS)}"
+        return os.path.join(self.root, kind, f"year={year}", 'part.parquet')
+
+    def write(self, kind, year, df):
+        """
+        Write a single season's DataFrame, replacing any earlier copy.
+        """
+        pa, pq = _pyarrow()
+        flat, meta = _flatten_columns(df)
+        table = pa.Table.from_pandas(flat, preserve_index=True)
+        schema_meta = dict(table.schema.metadata or {})
+        schema_meta[META_KEY] = json.dumps(meta).encode()
+        table = table.replace_schema_metadata(schema_meta)
+
+        path = self._path(kind, year)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        pq.write_table(table, path, compression=self.compression)
+
+    def save(self, extractor=None, year_results=None, qualy_results=None, champ_tables=None):
+        """
+        Write every season held by an extractor (or by the dicts passed explicitly).
+        """
+        frames = dict(results=year_results, qualifying=qualy_results, constructors=champ_tables)
+        for kind, attr in KINDS.items():
+            if frames[kind] is None and extractor is not None:
+                frames[kind] = getattr(extractor, attr, None)
+            for year, df in (frames[kind] or dict()).items():
+                if isinstance(df, pd.DataFrame) and not df.empty:
+                    self.write(kind, year, df)
+
+    def years(self, kind):
+        """
+        Seasons stored for a data type, in year order.
+        """
+        directory = os.path.join(self.root, kind)
+        if not os.path.isdir(directory):
+            return []
+        years = [name.split('=', 1)[1] for name in os.listdir(directory) if name.startswith('year=')]
+        return sorted(years, key=lambda y: (len(y), y))
+
+    def _meta(self, kind, year):
+        _, pq = _pyarrow()
+        schema = pq.read_schema(self._path(kind, year))
+        return json.loads(schema.metadata[META_KEY])
+
+    def columns(self, kind, year):
+        """
+        Columns of a stored season, read from the file footer only.
+        """
+        meta = self._meta(kind, year)
+        if meta['multi']:
+            return pd.MultiIndex.from_tuples([tuple(col) for col in meta['columns']], names=meta['column_names'])
+        return pd.Index([col[0] for col in meta['columns']])
+
+    def _select(self, meta, columns):
+        """
+        Map user column selections - full tuples or top-level names such as 'Details'
+        or a race name - to the flattened Parquet column names.
+        """
+        selected = []
+        for sel in columns:
+            for name, col in zip(meta['names'], meta['columns']):
+                if (tuple(col) == tuple(sel) if isinstance(sel, tuple) else col[0] == sel) and name not in selected:
+                    selected.append(name)
+        return selected
+
+    def load_year(self, kind, year, columns=None):
+        """
+        Read one season, optionally restricted to 'columns'.
+        """
+        _, pq = _pyarrow()
+        year = str(year)
+        meta = self._meta(kind, year)
+        names = None
+        if columns is not None:
+            names = self._select(meta, columns)
+            names += [name + TYPES_SUFFIX for name in names if name in meta.get('typed', [])]
+        table = pq.read_table(self._path(kind, year), columns=names, use_pandas_metadata=True)
+        return _restore_columns(table.to_pandas(), meta)
+
+    def load(self, kind, years=None, columns=None):
+        """
+        Return a dict year -> DataFrame for the selected seasons (all stored seasons by default).
+        """
+        years = self.years(kind) if years is None else [str(y) for y in years]
+        return {year: self.load_year(kind, year, columns) for year in years}
+
+    def open(self, kind):
+        """
+        Lazy dict-like view of a data type: seasons are read on first access.
+        """
+        return LazySeasons(self, kind)
+
+    def load_into(self, extractor):
+        """
+        Attach lazy views of every stored data type to an extractor, e.g. so that
+        DX.year_results['1998'] reads only that season from disk.
+        """
+        for kind, attr in KINDS.items():
+            if hasattr(extractor, attr) and self.years(kind):
+                setattr(extractor, attr, self.open(kind))
+        return extractor
+
+    def remove(self, kind, year):
+        shutil.rmtree(os.path.dirname(self._path(kind, year)), ignore_errors=True)
+
+
+class LazySeasons(MutableMapping):
+    """
+    year -> DataFrame mapping backed by a SeasonStore. Frames are loaded on first access
+    and kept; assignments stay in memory until 'flush' writes them back.
+    """
+    def __init__(self, store, kind):
+        self.store = store
+        self.kind = kind
+        self._loaded = dict()
+        self._years = list(store.years(kind))
+
+    def __getitem__(self, year):
+        year = str(year)
+        if year not in self._loaded:
+            if year not in self._years:
+                raise KeyError(year)
+            self._loaded[year] = self.store.load_year(self.kind, year)
+        return self._loaded[year]
+
+    def __setitem__(self, year, df):
+        year = str(year)
+        self._loaded[year] = df
+        if year not in self._years:
+            self._years.append(year)
+
+    def __delitem__(self, year):
+        year = str(year)
+        self._years.remove(year)
+        self._loaded.pop(year, None)
+
+    def __iter__(self):
+        return iter(self._years)
+
+    def __len__(self):
+        return len(self._years)
+
+    def __repr__(self):
+        return f"LazySeasons({self.kind!r}, years={self._years}, loaded={list(self._loaded)})"
+
+    def flush(self):
+        """
+        Write seasons assigned or loaded in this session back to the store.
+        """
+        for year, df in self._loaded.items():
+            self.store.write(self.kind, year, df)
@@ -0,0 +1,501 @@
+import sqlite3
+from F1Archive.utils import LazyModule
+from F1Archive.data.data_extraction import DataExtractor
+from F1Archive.data.constructors_champ import canonical_team
+from F1Archive.data_transforms.transformations import stack_long, times_to_seconds
+from F1Archive.data_transforms.championship import scoring_rule, dropped_scores_cumsum, standings_positions
+
+np = LazyModule('numpy')
+pd = LazyModule('pandas')
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS races (
+    race_id INTEGER PRIMARY KEY,
+    year INTEGER NOT NULL,
+    round INTEGER NOT NULL,
+    name TEXT NOT NULL,
+    UNIQUE (year, name)
+);
+CREATE TABLE IF NOT EXISTS drivers (
+    driver_id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL UNIQUE COLLATE NOCASE,
+    code TEXT COLLATE NOCASE
+);
+CREATE TABLE IF NOT EXISTS teams (
+    team_id INTEGER PRIMARY KEY,
+    year INTEGER NOT NULL,
+    name TEXT NOT NULL COLLATE NOCASE,
+    code TEXT NOT NULL COLLATE NOCASE,
+    generic TEXT NOT NULL COLLATE NOCASE,
+    UNIQUE (year, name)
+);
+CREATE TABLE IF NOT EXISTS results (
+    race_id INTEGER NOT NULL REFERENCES races,
+    driver_id INTEGER NOT NULL REFERENCES drivers,
+    team_id INTEGER REFERENCES teams,
+    position INTEGER,
+    status TEXT,
+    points REAL
+);
+CREATE TABLE IF NOT EXISTS qualifying (
+    race_id INTEGER NOT NULL REFERENCES races,
+    driver_id INTEGER NOT NULL REFERENCES drivers,
+    team_id INTEGER REFERENCES teams,
+    number INTEGER,
+    position INTEGER,
+    status TEXT,
+    time TEXT,
+    seconds REAL
+);
+CREATE TABLE IF NOT EXISTS driver_standings (
+    year INTEGER NOT NULL,
+    driver_id INTEGER NOT NULL REFERENCES drivers,
+    position INTEGER,
+    points REAL
+);
+CREATE TABLE IF NOT EXISTS constructor_standings (
+    year INTEGER NOT NULL,
+    team_id INTEGER NOT NULL REFERENCES teams,
+    position INTEGER,
+    points REAL
+);
+CREATE INDEX IF NOT EXISTS drivers_code ON drivers (code);
+CREATE INDEX IF NOT EXISTS teams_name ON teams (name);
+CREATE INDEX IF NOT EXISTS teams_generic ON teams (generic);
+CREATE INDEX IF NOT EXISTS teams_code ON teams (year, code);
+CREATE INDEX IF NOT EXISTS results_race ON results (race_id, position);
+CREATE INDEX IF NOT EXISTS results_driver ON results (driver_id);
+CREATE INDEX IF NOT EXISTS results_team ON results (team_id);
+CREATE INDEX IF NOT EXISTS qualifying_race ON qualifying (race_id, position);
+CREATE INDEX IF NOT EXISTS qualifying_driver ON qualifying (driver_id);
+CREATE INDEX IF NOT EXISTS qualifying_team ON qualifying (team_id);
+CREATE INDEX IF NOT EXISTS driver_standings_year ON driver_standings (year, position);
+CREATE INDEX IF NOT EXISTS driver_standings_driver ON driver_standings (driver_id);
+CREATE INDEX IF NOT EXISTS constructor_standings_year ON constructor_standings (year, position);
+CREATE INDEX IF NOT EXISTS constructor_standings_team ON constructor_standings (team_id);
+"""
+
+# result rows joined to their race, driver and team, as returned by the query methods
+_RESULT_COLUMNS = """
+    SELECT races.year, races.round, races.name AS race, drivers.name AS driver, drivers.code,
+           teams.name AS team, {table}.position, {table}.status, {extra}
+    FROM {table}
+    JOIN races USING (race_id)
+    JOIN drivers USING (driver_id)
+    LEFT JOIN teams USING (team_id)
+"""
+_ORDER = " ORDER BY races.year, races.round, {table}.position IS NULL, {table}.position"
+
+
+def split_driver(name):
+    """
+    'Lewis Hamilton HAM' -> ('Lewis Hamilton', 'HAM'); names without a trailing
+    3-letter abbreviation are returned with code None.
+    """
+    name = str(name).strip()
+    if len(name) > 3 and name[-3:].isupper():
+        return name[:-3].strip(), name[-3:]
+    return name, None
+
+
+def team_code(name):
+    """
+    3-letter car code that season tables use for a team, e.g. 'McLaren Mercedes' -> 'MCL'.
+    """
+    return str(name)[:3].upper()
+
+
+def split_positions(values):
+    """
+    Result cells -> (positions, statuses) lists: classified places as ints, codes such as 'NC'
+    or 'DQ' as statuses, and None for both where a driver did not take part (0 or NaN).
+    """
+    values = pd.Series(np.asarray(values, dtype=object))
+    numbers = pd.to_numeric(values, errors='coerce')
+    positions = [int(n) if n > 0 else None for n in numbers.fillna(0)]
+    statuses = [str(v) if pd.isna(n) and not pd.isna(v) else None for v, n in zip(values, numbers)]
+    return positions, statuses
+
+
+def _number(value):
+    return None if pd.isna(value) else float(value)
+
+
+class ResultsDB():
+    """
+    Normalized, indexed SQLite copy of extracted seasons, for lookups across seasons without
+    loading every season table into pandas.
+
+        races (race_id, year, round, name)
+        drivers (driver_id, name, code)
+        teams (team_id, year, name, code, generic) - one row per team and season
+        results (race_id, driver_id, team_id, position, status, points)
+        qualifying (race_id, driver_id, team_id, number, position, status, time, seconds)
+        driver_standings (year, driver_id, position, points)
+        constructor_standings (year, team_id, position, points)
+
+    'position' holds classified places only; 'status' holds codes such as 'NC', 'DQ' or 'DNS'.
+    Drivers who did not take part in a race have no row. Driver standings are computed from the
+    stored results under the season's dropped-scores rule.
+
+    Teams are keyed by season and full name ('McLaren Mercedes'), with 'generic' the lineage
+    name from 'canonical_team' ('McLaren'), so results, qualifying and standings of a season
+    share one team row. Race batches from 'iter_race_results' / 'iter_qualy_results' (see
+    'load_results', 'load_qualifying') carry the full names. The season tables in 'year_results'
+    and 'qualy_results' only keep 3-letter car codes: these are matched to the season's teams
+    already stored, and a code without a single match is stored as a team of its own until a
+    full name with that code is written for the season.
+
+    Writing a season (or a race batch) replaces what was stored for it. Driver and team arguments
+    of the query methods match a full name, a driver code or a team's generic name, ignoring case.
+    """
+    def __init__(self, path=':memory:'):
+        self.path = path
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.executescript(SCHEMA)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self.connection.close()
+
+    def _race_ids(self, year, names):
+        """
+        Race ids of a season's races, in order; races not yet stored are added.
+        """
+        year = int(year)
+        known = dict(self.connection.execute("SELECT name, race_id FROM races WHERE year = ?", (year,)))
+        next_round = 1 + (self.connection.execute("SELECT max(round) FROM races WHERE year = ?",
+                                                  (year,)).fetchone()[0] or 0)
+        for name in dict.fromkeys(names):
+            if name not in known:
+                known[name] = self.connection.execute("INSERT INTO races (year, round, name) VALUES (?, ?, ?)",
+                                                      (year, next_round, name)).lastrowid
+                next_round += 1
+        return [known[name] for name in names]
+
+    def _driver_ids(self, names):
+        split = [split_driver(name) for name in names]
+        self.connection.executemany("INSERT OR IGNORE INTO drivers (name, code) VALUES (?, ?)", set(split))
+        ids = dict()
+        for name, _ in set(split):
+            ids[name] = self.connection.execute("SELECT driver_id FROM drivers WHERE name = ?", (name,)).fetchone()[0]
+        return [ids[name] for name, _ in split]
+
+    def _team_ids(self, names, year):
+        """
+        Team ids for the full team names of one season; teams not yet stored are added.
+        """
+        names = [None if pd.isna(name) else str(name) for name in names]
+        year = int(year)
+        ids = {None: None}
+        for name in set(names) - {None}:
+            self.connection.execute("INSERT OR IGNORE INTO teams (year, name, code, generic) VALUES (?, ?, ?, ?)",
+                                    (year, name, team_code(name), canonical_team(name, year)))
+            ids[name] = self.connection.execute("SELECT team_id FROM teams WHERE year = ? AND name = ?",
+                                                (year, name)).fetchone()[0]
+        self._merge_codes(year)
+        return [ids[name] for name in names]
+
+    def _merge_codes(self, year):
+        """
+        Move the rows stored under a bare car code (see '_code_team_ids') to the season's team
+        with that code, once its full name is known.
+        """
+        for code, old in self.connection.execute("SELECT code, team_id FROM teams WHERE year = ? AND name = code",
+                                                 (year,)).fetchall():
+            matches = self.connection.execute("SELECT team_id FROM teams WHERE year = ? AND code = ? AND name != code",
+                                              (year, code)).fetchall()
+            if len(matches) == 1:
+                for table in ('results', 'qualifying', 'constructor_standings'):
+                    self.connection.execute(f"UPDATE {table} SET team_id = ? WHERE team_id = ?", (matches[0][0], old))
+                self.connection.execute("DELETE FROM teams WHERE team_id = ?", (old,))
+
+    def _code_team_ids(self, codes, year):
+        """
+        Team ids for the 3-letter car codes of a season table: the season's team with that code
+        if there is exactly one, otherwise a team named by the code.
+        """
+        codes = [None if pd.isna(code) else str(code) for code in codes]
+        year = int(year)
+        names = {None: None}
+        for code in set(codes) - {None}:
+            matches = self.connection.execute("SELECT name FROM teams WHERE year = ? AND code = ? AND name != code",
+                                              (year, code)).fetchall()
+            names[code] = matches[0][0] if len(matches) == 1 else code
+        return self._team_ids([names[code] for code in codes], year)
+
+    def _clear(self, table, year, races=None):
+        if table in ('results', 'qualifying'):
+            if races is None:
+                self.connection.execute(f"DELETE FROM {table} WHERE race_id IN (SELECT race_id FROM races WHERE year = ?)",
+                                        (int(year),))
+            else:
+                self.connection.executemany(f"DELETE FROM {table} WHERE race_id = ?", [(race,) for race in races])
+        else:
+            self.connection.execute(f"DELETE FROM {table} WHERE year = ?", (int(year),))
+
+    def _insert_results(self, year, races, drivers, team_ids, cells, points):
+        positions, statuses = split_positions(cells)
+        race_ids = self._race_ids(year, list(races))
+        rows = zip(race_ids, self._driver_ids(drivers), team_ids, positions, statuses,
+                   [_number(p) for p in points])
+        self.connection.executemany("INSERT INTO results VALUES (?, ?, ?, ?, ?, ?)",
+                                    [row for row in rows if row[3] is not None or row[4] is not None])
+
+    def _insert_qualifying(self, year, races, drivers, team_ids, numbers, cells, times):
+        positions, statuses = split_positions(cells)
+        times = np.asarray(times, dtype=object)
+        rows = zip(self._race_ids(year, list(races)), self._driver_ids(drivers), team_ids,
+                   [_number(no) for no in numbers], positions, statuses,
+                   [time if isinstance(time, str) else None for time in times],
+                   [_number(s) for s in times_to_seconds(times)])
+        self.connection.executemany("INSERT INTO qualifying VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                                    [row for row in rows if row[4] is not None or row[5] is not None])
+
+    def update_driver_standings(self, year):
+        """
+        Recompute a season's final drivers' standings from its stored results. A driver listed
+        twice in one race (shared drives) scores the sum of both entries.
+        """
+        rows = self.query("""SELECT results.driver_id, races.round, results.position, results.points
+                             FROM results JOIN races USING (race_id) WHERE races.year = ?""", (int(year),))
+        with self.connection:
+            self._clear('driver_standings', year)
+            if rows.empty:
+                return
+            points = rows.pivot_table(index='driver_id', columns='round', values='points', aggfunc='sum', fill_value=0)
+            positions = rows.pivot_table(index='driver_id', columns='round', values='position', aggfunc='min')
+            positions = positions.reindex(index=points.index, columns=points.columns)
+            totals = dropped_scores_cumsum(points.to_numpy(dtype=float), scoring_rule(year))
+            places = standings_positions(totals, positions.to_numpy(dtype=float))
+            self.connection.executemany("INSERT INTO driver_standings VALUES (?, ?, ?, ?)",
+                                        zip([int(year)] * len(points.index), points.index.tolist(),
+                                            places[:, -1].tolist(), totals[:, -1].tolist()))
+
+    def write_results(self, year, results_df):
+        """
+        Store a season results table (DataExtractor.year_results[yr]) and its driver standings.
+        """
+        races = list(results_df['Position'].columns)
+        records = DataExtractor.results_records(results_df, races)
+        with self.connection:
+            self._clear('results', year)
+            self._insert_results(year, records['Race'], records['Driver'],
+                                 self._code_team_ids(records['Car'], year), records['Pos'], records['PTS'])
+        self.update_driver_standings(year)
+
+    def write_qualifying(self, year, qualy_df):
+        """
+        Store a season qualifying table (QualyExtractor.qualy_results[yr]).
+        """
+        races = [race for race in dict.fromkeys(qualy_df.columns.get_level_values(0)) if race != 'Details']
+        details = {'Driver': qualy_df['Details', 'Driver'].values, 'Car': qualy_df['Details', 'Car'].values,
+                   'Number': qualy_df['Details', 'Driver No'].values}
+        long_df = stack_long(qualy_df.loc[:, [col for col in qualy_df.columns if col[1] in ('Position', 'Time')]],
+                             races, details=details)
+        with self.connection:
+            self._clear('qualifying', year)
+            self._insert_qualifying(year, long_df['Race'], long_df['Driver'], self._code_team_ids(long_df['Car'], year),
+                                    long_df['Number'], long_df['Position'], long_df['Time'])
+
+    def write_standings(self, year, champ_table):
+        """
+        Store a constructors' championship table (TeamsExtractor.champ_tables[yr]).
+        """
+        positions, _ = split_positions(champ_table.index)
+        with self.connection:
+            self._clear('constructor_standings', year)
+            self.connection.executemany("INSERT INTO constructor_standings VALUES (?, ?, ?, ?)",
+                                        zip([int(year)] * len(positions), self._team_ids(champ_table['Team'], year),
+                                            positions, [_number(points) for points in champ_table['PTS']]))
+
+    def write_race_records(self, records):
+        """
+        Store long-format race results (Year | Race | Driver | Car | Pos | PTS, as yielded by
+        DataExtractor.iter_race_results), replacing the stored results of those races.
+        Driver standings are not updated; see 'load_results'.
+        """
+        with self.connection:
+            for year, batch in records.groupby('Year', sort=False):
+                self._clear('results', year, races=self._race_ids(year, list(dict.fromkeys(batch['Race']))))
+                self._insert_results(year, batch['Race'], batch['Driver'], self._team_ids(batch['Car'], year),
+                                     batch['Pos'], batch['PTS'])
+
+    def write_qualy_records(self, records):
+        """
+        Store long-format qualifying results (Year | Race | No | Driver | Car | Position | Time, as
+        yielded by QualyExtractor.iter_qualy_results), replacing the stored results of those sessions.
+        """
+        with self.connection:
+            for year, batch in records.groupby('Year', sort=False):
+                self._clear('qualifying', year, races=self._race_ids(year, list(dict.fromkeys(batch['Race']))))
+                self._insert_qualifying(year, batch['Race'], batch['Driver'], self._team_ids(batch['Car'], year),
+                                        batch['No'], batch['Position'], batch['Time'])
+
+    def load_results(self, batches):
+        """
+        Store race result batches as they arrive, e.g. db.load_results(DX.iter_race_results(YEARS)),
+        then the driver standings of every season seen. Each batch is committed on its own, so the
+        races already stored are kept if the extraction fails part way.
+        Output: number of batches stored
+        """
+        years, n = [], 0
+        try:
+            for n, records in enumerate(batches, 1):
+                self.write_race_records(records)
+                years.extend(year for year in dict.fromkeys(records['Year']) if year not in years)
+        finally:
+            for year in years:
+                self.update_driver_standings(year)
+        return n
+
+    def load_qualifying(self, batches):
+        """
+        Store qualifying batches as they arrive, e.g. db.load_qualifying(QX.iter_qualy_results(YEARS)).
+        Output: number of batches stored
+        """
+        n = 0
+        for n, records in enumerate(batches, 1):
+            self.write_qualy_records(records)
+        return n
+
+    def save(self, extractor=None, year_results=None, qualy_results=None, champ_tables=None):
+        """
+        Store every season held by an extractor (or by the dicts passed explicitly); the dicts
+        may also be SeasonStore views, which load one season at a time. Constructors tables are
+        written first, so the car codes of the other tables resolve to their full team names.
+        """
+        writers = ((champ_tables, 'champ_tables', self.write_standings),
+                   (year_results, 'year_results', self.write_results),
+                   (qualy_results, 'qualy_results', self.write_qualifying))
+        for frames, attr, write in writers:
+            if frames is None and extractor is not None:
+                frames = getattr(extractor, attr, None)
+            for year in (frames or dict()):
+                df = frames[year]
+                if isinstance(df, pd.DataFrame) and not df.empty:
+                    write(year, df)
+
+    def query(self, sql, params=()):
+        """
+        Run any SQL query on the database and return the result as a DataFrame.
+        """
+        return pd.read_sql_query(sql, self.connection, params=params)
+
+    def years(self):
+        return [year for (year,) in self.connection.execute("SELECT DISTINCT year FROM races ORDER BY year")]
+
+    def races(self, year=None):
+        if year is None:
+            return self.query("SELECT * FROM races ORDER BY year, round")
+        return self.query("SELECT * FROM races WHERE year = ? ORDER BY round", (int(year),))
+
+    def teams(self, team=None):
+        """
+        Season teams: team_id | year | name | code | generic, optionally only those matching 'team'.
+        """
+        where, params = self._where(team=team)
+        return self.query(f"SELECT * FROM teams {where} ORDER BY year, name", params)
+
+    @staticmethod
+    def _where(driver=None, team=None, years=None, year_column='races.year'):
+        clauses, params = [], []
+        if driver is not None:
+            clauses.append("(drivers.name = ? OR drivers.code = ?)")
+            params += [driver, driver]
+        if team is not None:
+            clauses.append("(teams.name = ? OR teams.generic = ?)")
+            params += [team, team]
+        if years is not None:
+            years = [int(year) for year in years]
+            clauses.append(f"{year_column} IN ({', '.join('?' * len(years))})")
+            params += years
+        return (" WHERE " + " AND ".join(clauses)) if clauses else "", params
+
+    def results(self, driver=None, team=None, years=None):
+        """
+        Race results across seasons, e.g. every result of a driver:
+        year | round | race | driver | code | team | position | status | points
+        """
+        where, params = self._where(driver, team, years)
+        sql = _RESULT_COLUMNS.format(table='results', extra='results.points') + where + _ORDER.format(table='results')
+        return self.query(sql, params)
+
+    def qualifying(self, driver=None, team=None, years=None):
+        """
+        Qualifying results across seasons:
+        year | round | race | driver | code | team | position | status | number | time | seconds
+        """
+        where, params = self._where(driver, team, years)
+        sql = (_RESULT_COLUMNS.format(table='qualifying', extra='qualifying.number, qualifying.time, qualifying.seconds')
+               + where + _ORDER.format(table='qualifying'))
+        return self.query(sql, params)
+
+    def race(self, year, name):
+        """
+        Classification of a single race.
+        """
+        sql = (_RESULT_COLUMNS.format(table='results', extra='results.points')
+               + " WHERE races.year = ? AND races.name = ?" + _ORDER.format(table='results'))
+        return self.query(sql, (int(year), name))
+
+    def wins(self, driver=None, team=None, years=None):
+        where, params = self._where(driver, team, years)
+        where = (where + " AND" if where else " WHERE") + " results.position = 1"
+        sql = _RESULT_COLUMNS.format(table='results', extra='results.points') + where + _ORDER.format(table='results')
+        return self.query(sql, params)
+
+    def front_row_lockouts(self, team=None, years=None):
+        """
+        Races where one team took both front-row places in qualifying:
+        year | round | race | team | pole | second
+        """
+        where, params = self._where(team=team, years=years)
+        sql = f"""
+            SELECT races.year, races.round, races.name AS race, teams.name AS team,
+                   first.name AS pole, second.name AS second
+            FROM qualifying AS q1
+            JOIN qualifying AS q2 ON q2.race_id = q1.race_id AND q2.position = 2 AND q2.team_id = q1.team_id
+            JOIN races ON races.race_id = q1.race_id
+            JOIN teams ON teams.team_id = q1.team_id
+            JOIN drivers AS first ON first.driver_id = q1.driver_id
+            JOIN drivers AS second ON second.driver_id = q2.driver_id
+            {where + " AND" if where else " WHERE"} q1.position = 1
+            ORDER BY races.year, races.round
+        """
+        return self.query(sql, params)
+
+    def driver_standings(self, year=None, driver=None):
+        """
+        Final drivers' championship positions: year | position | driver | code | points
+        """
+        where, params = self._where(driver=driver, years=None if year is None else [year],
+                                    year_column='driver_standings.year')
+        sql = f"""
+            SELECT driver_standings.year, driver_standings.position, drivers.name AS driver, drivers.code,
+                   driver_standings.points
+            FROM driver_standings JOIN drivers USING (driver_id)
+            {where}
+            ORDER BY driver_standings.year, driver_standings.position
+        """
+        return self.query(sql, params)
+
+    def constructor_standings(self, year=None, team=None):
+        """
+        Constructors' championship tables: year | position | team | generic | points
+        """
+        where, params = self._where(team=team, years=None if year is None else [year],
+                                    year_column='constructor_standings.year')
+        sql = f"""
+            SELECT constructor_standings.year, constructor_standings.position, teams.name AS team, teams.generic,
+                   constructor_standings.points
+            FROM constructor_standings JOIN teams USING (team_id)
+            {where}
+            ORDER BY constructor_standings.year, constructor_standings.position
+        """
+        return self.query(sql, params)
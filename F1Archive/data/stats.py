@@ -0,0 +1,103 @@
+import contextlib
+import threading
+import time
+
+NULL_TIMER = contextlib.nullcontext() # stands in for a stage timer when no stats are collected
+
+
+class ExtractionStats():
+    """
+    Timers and counters for an extraction run.
+
+    seconds, calls - stage -> total time spent and number of timed calls, for the stages
+                     'fetch' (download or cache read of a page), 'parse' (html -> table)
+                     and 'merge' (race tables -> season table)
+    requests, bytes_downloaded - HTTP requests sent and response bytes received
+    retries - requests repeated after a timeout, dropped connection or 429 / 5xx response
+    cache_hits - pages served without a download (from the cache or recorded pages)
+    pages - pages fetched; rows_merged - race table rows merged into season tables
+
+    Stage times are summed over threads, so with concurrent fetching they can add up to
+    more than the wall time.
+
+    callbacks - functions called as callback(name, value, info) for every stage timing
+                (name = stage, value = seconds) and every count (name = counter, value = increment);
+                'info' holds details such as the url or season
+    """
+    STAGES = ('fetch', 'parse', 'merge')
+    COUNTERS = ('requests', 'bytes_downloaded', 'retries', 'cache_hits', 'pages', 'rows_merged')
+
+    def __init__(self, callbacks=()):
+        self.seconds = dict.fromkeys(self.STAGES, 0.0)
+        self.calls = dict.fromkeys(self.STAGES, 0)
+        self.counts = dict.fromkeys(self.COUNTERS, 0)
+        self.callbacks = list(callbacks)
+        self._lock = threading.Lock()
+
+    def __getstate__(self):
+        # a copy sent to a worker process records on its own; callbacks stay with the original
+        state = self.__dict__.copy()
+        del state['_lock']
+        state['callbacks'] = []
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    def __getattr__(self, name):
+        counts = self.__dict__.get('counts', dict())
+        if name in counts:
+            return counts[name]
+        raise AttributeError(name)
+
+    @contextlib.contextmanager
+    def timer(self, stage, **info):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_time(stage, time.perf_counter() - start, **info)
+
+    def add_time(self, stage, seconds, **info):
+        with self._lock:
+            self.seconds[stage] = self.seconds.get(stage, 0.0) + seconds
+            self.calls[stage] = self.calls.get(stage, 0) + 1
+        for callback in self.callbacks:
+            callback(stage, seconds, info)
+
+    def count(self, info=None, **counts):
+        with self._lock:
+            for name, value in counts.items():
+                self.counts[name] = self.counts.get(name, 0) + value
+        for callback in self.callbacks:
+            for name, value in counts.items():
+                callback(name, value, info or dict())
+
+    def update(self, other):
+        """
+        Add the timings and counts of another ExtractionStats, e.g. from a worker process.
+        """
+        with self._lock:
+            for stage, seconds in other.seconds.items():
+                self.seconds[stage] = self.seconds.get(stage, 0.0) + seconds
+                self.calls[stage] = self.calls.get(stage, 0) + other.calls.get(stage, 0)
+            for name, value in other.counts.items():
+                self.counts[name] = self.counts.get(name, 0) + value
+
+    def as_dict(self):
+        """
+        Flat name -> number dict, e.g. for a metrics dashboard: '<stage>_seconds', '<stage>_calls'
+        and the counters.
+        """
+        stats = dict()
+        for stage in self.seconds:
+            stats[f"{stage}_seconds"] = self.seconds[stage]
+            stats[f"{stage}_calls"] = self.calls[stage]
+        stats.update(self.counts)
+        return stats
+
+    def __repr__(self):
+        stages = ", ".join(f"{stage} {self.seconds[stage]:.3f}s/{self.calls[stage]}" for stage in self.seconds)
+        counts = ", ".join(f"{name} {value}" for name, value in self.counts.items())
+        return f"ExtractionStats({stages}; {counts})"
@@ -0,0 +1,168 @@
+from F1Archive.utils import LazyModule
+from F1Archive.data_transforms.points_map import MapPoints
+
+np = LazyModule('numpy')
+pd = LazyModule('pandas')
+
+# Drivers' championship dropped-scores rules, from the same list of points systems as MapPoints:
+# https://en.wikipedia.org/wiki/List_of_Formula_One_World_Championship_points_scoring_systems
+# Each rule is a tuple of season segments (number of races, results counted); None as the
+# number of races means the rest of the season. Seasons not listed count every result.
+DROPPED_SCORES = {
+    1950: ((None, 4),), 1951: ((None, 4),), 1952: ((None, 4),), 1953: ((None, 4),),
+    1954: ((None, 5),), 1955: ((None, 5),), 1956: ((None, 5),), 1957: ((None, 5),),
+    1958: ((None, 6),), 1959: ((None, 5),), 1960: ((None, 6),),
+    1961: ((None, 5),), 1962: ((None, 5),),
+    1963: ((None, 6),), 1964: ((None, 6),), 1965: ((None, 6),),
+    1966: ((None, 5),),
+    1967: ((6, 5), (None, 4)),
+    1968: ((6, 5), (None, 5)),
+    1969: ((6, 5), (None, 4)),
+    1970: ((7, 6), (None, 5)),
+    1971: ((6, 5), (None, 4)),
+    1972: ((6, 5), (None, 5)),
+    1973: ((8, 7), (None, 6)),
+    1974: ((8, 7), (None, 6)),
+    1975: ((7, 6), (None, 6)),
+    1976: ((8, 7), (None, 7)),
+    1977: ((9, 8), (None, 7)),
+    1978: ((8, 7), (None, 7)),
+    1979: ((7, 4), (None, 4)),
+    1980: ((7, 5), (None, 5)),
+}
+DROPPED_SCORES.update({year: ((None, 11),) for year in range(1981, 1991)})
+
+
+def scoring_rule(year):
+    """
+    Dropped-scores rule for a season, or None if every result counts.
+    """
+    return DROPPED_SCORES.get(int(year))
+
+
+def best_n_cumsum(points, n):
+    """
+    Running 'best n results' totals for every driver at once.
+
+    Input: points (array) - drivers x races points
+           n (int) - number of results that count
+    Output: drivers x races float array; entry [d, k] is the sum of driver d's best n
+            scores from races 0..k
+    """
+    points = np.asarray(points, dtype=float)
+    n_races = points.shape[1]
+    if n >= n_races:
+        return np.cumsum(points, axis=1)
+    # drivers x (after race k) x (race j): scores of races run so far, 0 for races still to come
+    so_far = np.where(np.tri(n_races, dtype=bool), points[:, None, :], 0)
+    best = -np.partition(-so_far, n - 1, axis=2)[:, :, :n]
+    return best.sum(axis=2)
+
+
+def dropped_scores_cumsum(points, rule=None):
+    """
+    Running championship totals under a dropped-scores 'rule' (see DROPPED_SCORES),
+    e.g. ((6, 5), (None, 4)) for the best 5 of the first 6 races plus the best 4 of the rest.
+
+    Input: points (array) - drivers x races points
+           rule (tuple or None) - season segments; None counts every result
+    Output: drivers x races float array of running totals
+    """
+    points = np.asarray(points, dtype=float)
+    if not rule:
+        return np.cumsum(points, axis=1)
+
+    totals = np.zeros_like(points)
+    start = 0
+    for n_races, best in rule:
+        stop = points.shape[1] if n_races is None else min(start + n_races, points.shape[1])
+        if stop > start:
+            segment = best_n_cumsum(points[:, start:stop], best)
+            totals[:, start:stop] += segment
+            totals[:, stop:] += segment[:, -1:]
+        start = stop
+    return totals
+
+
+def dropped_scores_table(results_df, year=None, rule=None):
+    """
+    Race-by-race championship totals for a season results table (DataExtractor.year_results),
+    counting only the results allowed by the season's rule.
+
+    Input: results_df (pd.DataFrame) - season results with 'Details' and 'Points' columns
+           year (int or str) - season, used to look up its rule in DROPPED_SCORES
+           rule (tuple) - explicit rule, overrides 'year'
+    Output: pd.DataFrame Driver | race 1 ... race N, in order of the final total
+    """
+    if rule is None and year is not None:
+        rule = scoring_rule(year)
+    totals = dropped_scores_cumsum(results_df['Points'].to_numpy(dtype=float), rule)
+
+    table = pd.DataFrame(totals, columns=results_df['Points'].columns,
+                         index=pd.Index(results_df['Details']['Driver'].values, name='Driver'))
+    return table.sort_values(by=table.columns[-1], ascending=False, kind='stable')
+
+
+def place_counts(positions, n_places=None):
+    """
+    Running count of every finishing place: entry [d, k, p] is the number of times driver d
+    finished in place p + 1 in races 0..k. Non-classified results are not counted.
+    """
+    codes = MapPoints.position_codes(positions)
+    if n_places is None:
+        n_places = max(int(codes.max(initial=0)), 1)
+    finishes = codes[:, :, None] == np.arange(1, n_places + 1)
+    return np.cumsum(finishes, axis=1, dtype=np.int32)
+
+
+def standings_positions(totals, positions):
+    """
+    Championship position of every driver after every race, with countback tie-breaks:
+    points, then most wins, then most second places, and so on.
+
+    Input: totals (array) - drivers x races running points totals
+           positions (array) - drivers x races finishing positions (year_results[yr]['Position'])
+    Output: drivers x races int array of championship positions (1 = leader). Drivers still
+            level after the countback share a position.
+    """
+    totals = np.asarray(totals, dtype=float)
+    counts = place_counts(positions)
+    n_drivers, n_races = totals.shape
+    standings = np.zeros((n_drivers, n_races), dtype=np.int64)
+
+    for k in range(n_races):
+        # np.lexsort sorts by the last key first: total, then wins, seconds, ...
+        keys = np.vstack([-counts[:, k, ::-1].T, -totals[:, k]])
+        order = np.lexsort(keys)
+        ranked = keys[:, order]
+        level = np.r_[False, (ranked[:, 1:] == ranked[:, :-1]).all(axis=0)]
+        places = np.arange(1, n_drivers + 1)
+        places[level] = 0
+        standings[order, k] = np.maximum.accumulate(places)
+    return standings
+
+
+def standings_table(results_df, year=None, rule=None):
+    """
+    Race-by-race championship positions for a season results table (DataExtractor.year_results).
+    Points are counted under the season's dropped-scores rule (see 'dropped_scores_table').
+
+    Output: pd.DataFrame Driver | race 1 ... race N of positions, in final championship order
+    """
+    if rule is None and year is not None:
+        rule = scoring_rule(year)
+    totals = dropped_scores_cumsum(results_df['Points'].to_numpy(dtype=float), rule)
+    positions = standings_positions(totals, results_df['Position'].to_numpy(dtype=object))
+
+    table = pd.DataFrame(positions, columns=results_df['Points'].columns,
+                         index=pd.Index(results_df['Details']['Driver'].values, name='Driver'))
+    return table.sort_values(by=table.columns[-1], kind='stable')
+
+
+def season_standings(year_results, years=None):
+    """
+    'standings_table' for every season in 'year_results' (year -> results table),
+    each with its own dropped-scores rule.
+    """
+    years = list(year_results) if years is None else [str(year) for year in years]
+    return {year: standings_table(year_results[year], year) for year in years}
@@ -1,4 +1,7 @@
-import numpy as np
+from F1Archive.utils import LazyModule
+
+np = LazyModule('numpy')
+pd = LazyModule('pandas')
 
 class MapPoints():
     """
@@ -17,12 +20,98 @@ class MapPoints():
         self.initial_system = self.get_points(initial_system)
 
 
-    def to_1990(self):
-        
-        pass
+    def to_1990(self, positions, scale=None):
+        """
+        Points for 'positions' under the 1960-1990 system (9-6-4-3-2-1).
+        """
+        return self.rescore(positions, self._1960, scale)
+
+    def to_2003(self, positions, scale=None):
+        """
+        Points for 'positions' under the 2003-2009 system (10-8-6-5-4-3-2-1).
+        """
+        return self.rescore(positions, self._2003, scale)
+
+    @staticmethod
+    def position_codes(positions):
+        """
+        Finishing positions as an int array of the same shape. Non-classified codes
+        ('NC', 'DQ', 'DNF', 'EX', ...), empty cells and 0 (race not entered) all become 0.
+        """
+        values = np.asarray(positions)
+        if values.dtype.kind not in 'iuf':
+            values = pd.to_numeric(pd.Series(values.ravel()), errors='coerce').to_numpy(dtype=float).reshape(values.shape)
+        codes = np.nan_to_num(values.astype(float), nan=0)
+        return np.where((codes < 0) | (codes != np.floor(codes)), 0, codes).astype(np.int64)
+
+    def points_table(self, system):
+        """
+        Lookup table position -> points for 'system' (a season or a points array):
+        index 0 (not classified) and every position past the last points place score 0.
+        """
+        points = self.get_points(str(system)) if np.ndim(system) == 0 else np.asarray(system)
+        table = np.zeros(len(points) + 2, dtype=float)
+        table[1:len(points) + 1] = points
+        return table
 
-    def to_2003(self):
-        pass
+    def rescore(self, positions, system=None, scale=None):
+        """
+        Points scored with 'positions' under 'system', in a single table lookup.
+
+        Input: positions - any shape, e.g. year_results[yr]['Position'] (drivers x races) or
+                           a drivers x races x seasons array from 'position_matrix'
+               system - season (int/str) or points array; a list of these rescores under every
+                        system at once, adding a leading axis. Defaults to 'initial_system'.
+               scale - points multiplier broadcast against positions, e.g. 0.5 for half-points races
+        Output: float points array (a pd.DataFrame like 'positions' for a single system)
+        """
+        if system is None:
+            system = self.initial_system
+        codes = self.position_codes(positions)
+
+        if isinstance(system, list):
+            tables = [self.points_table(s) for s in system]
+            width = max(len(t) for t in tables)
+            tables = np.stack([np.pad(t, (0, width - len(t))) for t in tables])
+            points = tables[:, np.minimum(codes, width - 1)]
+        else:
+            table = self.points_table(system)
+            points = table[np.minimum(codes, len(table) - 1)]
+
+        if scale is not None:
+            points = points * scale
+        if isinstance(positions, pd.DataFrame) and points.ndim == 2:
+            return pd.DataFrame(points, index=positions.index, columns=positions.columns)
+        return points
+
+    def remap_points(self, points, system, scale=None):
+        """
+        Convert points scored under 'initial_system' to 'system'. Positions are recovered from
+        the points of each place, so only points places are kept (the rest score 0).
+        scale - points multiplier the race was scored with, e.g. 0.5 for half-points races,
+                applied again to the converted points
+        """
+        values = np.asarray(points, dtype=float)
+        if scale is not None:
+            values = values / scale
+        places = self.points_table(self.initial_system)[1:-1]
+        positions = np.zeros(values.shape, dtype=np.int64)
+        for place in range(len(places), 0, -1):
+            positions[values == places[place - 1]] = place
+        return self.rescore(positions, system, scale)
+
+    @staticmethod
+    def position_matrix(frames):
+        """
+        Stack the Position blocks of several seasons (e.g. DataExtractor.year_results values)
+        into one drivers x races x seasons object array, padded with 0 (not entered).
+        """
+        blocks = [df['Position'].to_numpy(dtype=object) for df in frames]
+        shape = (max(b.shape[0] for b in blocks), max(b.shape[1] for b in blocks), len(blocks))
+        matrix = np.zeros(shape, dtype=object)
+        for n, block in enumerate(blocks):
+            matrix[:block.shape[0], :block.shape[1], n] = block
+        return matrix
 
     
     def get_points(self, year):
@@ -41,31 +130,3 @@ class MapPoints():
             points = self._2010
             
         return points
-
-
-if __name__ == '__main__':
-    a = np.array([0,0,0,0,0,0,0,0,1,0,0,2,0,0,0,3,0,0,0,4,0,6,0,0,9])
-    b = np.array([0,0,0,0,0,0,0,0,1,0,0,2,0,0,0,3,0,0,0,4,0,6,0,0,10])
-
-    c = np.array([0,0,0,0,0,0,0,0,1,0,0,2,0,5,0,3,0,0,0,4,0,6,8,0,10])
-
-    print(sum(set(a)))
-    print(sum(set(b)))
-    print(sum(set(c)))
-
-    print(np.where(a == 9))
-
-    if sum(set(a)) == 25:
-        a[np.where(a == 9)] = 10
-        print(a)
-
-    if sum(set(c)) == 39:
-        c[np.where(c == 1)] = 0
-        c[np.where(c == 2)] = 0
-        c[np.where(c == 3)] = 1
-        c[np.where(c == 4)] = 2
-        c[np.where(c == 5)] = 3
-        c[np.where(c == 6)] = 4
-        c[np.where(c == 8)] = 6
-        print(a)
-        print(c)
\ No newline at end of file
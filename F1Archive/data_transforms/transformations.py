@@ -1,204 +1,168 @@
-import pandas as pd 
-import numpy as np 
-from datetime import datetime, date
-import functools
-import operator
-import itertools
-pd.options.mode.chained_assignment = None  # default='warn'
+from datetime import datetime, date, time
+import logging
+import re
+from F1Archive.utils import LazyModule, quiet_chained_assignment
 
-fcn = lambda x: round(x-60.0,3) if not  -15 < x < 15 else x # datetime conversion
+pd = LazyModule('pandas')
+np = LazyModule('numpy')
+
+logger = logging.getLogger(__name__)
 
-def datetime_2_time(series, format='%M:%S.%f'):
-    """
-    covert 'pandas._libs.tslibs.timestamps.Timestamp' to 'datetime.time'
-    """
-    time = series.to_pydatetime()
-    time = time.strftime(format)
-    dt = datetime.strptime(time, format)
-    tme = dt.time() # convert to datetime.time
-    return tme
-
-def try_get_diff(comb, df, race):
-    difference = []
-    df_tmp1 = df.copy()
-    df_tmp1.loc[:, (race, 'Time')] = pd.to_datetime(df.loc[:,
-                                                    (race, 'Time')].copy(),
-                                                    format='%M:%S.%f').dt.time
-    t1 = datetime.combine(date.min, df_tmp1[race, 'Time'].values[comb[0]])
-
-    t2 = datetime.combine(date.min, df_tmp1[race, 'Time'].values[comb[1]])
-    a = t1 - t2
-    b = t2 - t1
-
-    a = fcn(divmod(a.total_seconds(), 60)[1])
-    b = fcn(divmod(b.total_seconds(), 60)[1])
-
-
-    difference.append(a)
-    difference.append(b)
-    return difference
-
-def avg_datetime(series):
-    """
-    Calculates average time from a pd.Series of datetime objects
-    """
-    #print(series)
-    dt_min = series.min()
- 
-    deltas = [x-dt_min for x in series]
-    avg = dt_min + functools.reduce(operator.add, deltas) / len(deltas)
-    
-    tme = datetime_2_time(avg)
-    
-    return tme
-
-
-# def time_diff(df_tmp, race):
-#     """
-#     Function for extracting differences between team-mates' qualifying times.
-#     Input: df_tmp (pd.DataFrame) - Temporary dataframe containing team-mates results
-#            race (str) - name of race for which times are being compared
-#     Output: df_tmp (pd.DataFrame) - Temporary dataframe with differences added
-#             differences (list) - + and - times for each driver
-#     """
-    
-    
-#     difference = []
-    
-#     try:
-#         df_tmp.loc[:, (race, 'Time')] = pd.to_datetime(df_tmp.loc[:, (race, 'Time')].copy(), format='%M:%S.%f').dt.time
-#         t1 = datetime.combine(date.min, df_tmp[race, 'Time'].values[0])
-#         t2 = datetime.combine(date.min, df_tmp[race, 'Time'].values[1])
-#         a = t1 - t2
-#         b = t2 - t1
-        
-#         a = fcn(divmod(a.total_seconds(), 60)[1])
-#         b = fcn(divmod(b.total_seconds(), 60)[1])
-        
-    
-#         difference.append(a)
-#         difference.append(b)
-#     except:
-#         difference.append(0)
-#         difference.append(0)
-    
-#     for i, n in enumerate(df_tmp.index):
-#         df_tmp.at[n, (race, 'Team-mate')] =  difference[i]
-    
-#     return df_tmp, difference
-
-def time_diff(df_tmp, race):
-    """
-    Function for extracting differences between team-mates' qualifying times.
-    Input: df_tmp (pd.DataFrame) - Temporary dataframe containing team-mates results
-           race (str) - name of race for which times are being compared
-    Output: df_tmp (pd.DataFrame) - Temporary dataframe with differences added
-            differences (list) - + and - times for each driver
-    """
-    
-    
-    difference = []
-    i_list = [i for i in range(len(df_tmp[race, 'Time'].values))]
-    combinations=list(itertools.combinations(i_list, r=2)) 
- 
-    for c in combinations:
-        try:
-            difference = try_get_diff(c, df_tmp.copy(), race)
-        except Exception as error:
-            #print(error)
-            pass
-
-    if not difference:
-        difference = [0.0, 0.0]
-
-    flag = 0
-    for i, n in enumerate(df_tmp.index):
-
-        if not pd.isna(df_tmp.at[n, (race, 'Time')]):
-            
-            df_tmp.at[n, (race, 'Team-mate')] = difference[i-flag]
-        else:
-            flag += 1
-            
-    return df_tmp, difference
+fcn = lambda x: round(x-60.0,3) if not  -15 < x < 15 else x # datetime conversion
 
+def teammate_gaps(times, cars):
+    """
+    Gap of every driver to their team-mate at every race, for a whole season at once.
+    Input: times (np.ndarray) - (drivers x races) lap times in seconds, NaN where untimed
+           cars (array-like) - team of each driver (row)
+    Output: gaps (np.ndarray) - (drivers x races) time minus the fastest team-mate's time at that race,
+            wrapped like 'fcn'. 0.0 where a driver had no timed team-mate, NaN where untimed.
+
+    Cells are grouped by (race, car), so teams of one, two or three drivers and mid-season
+    swaps need no special handling. For two-driver teams this is the plain team-mate gap.
+    """
+    times = np.asarray(times, dtype=float)
+    car_codes = pd.factorize(np.asarray(cars, dtype=object))[0]
+    n_races = times.shape[1]
+    gaps = np.full(times.shape, np.nan)
+
+    d_idx, r_idx = np.nonzero(~np.isnan(times))
+    if not len(d_idx):
+        return gaps
+    micro = np.round(times[d_idx, r_idx] * 1e6).astype(np.int64) # exact differences, as with datetimes
+    group = car_codes[d_idx] * n_races + r_idx
+
+    order = np.lexsort((micro, group))
+    group, micro = group[order], micro[order]
+    starts = np.flatnonzero(np.r_[True, group[1:] != group[:-1]])
+    sizes = np.diff(np.r_[starts, len(group)])
+    group_no = np.repeat(np.arange(len(starts)), sizes)
+    rank = np.arange(len(group)) - starts[group_no]
+
+    fastest = micro[starts]
+    second = micro[np.minimum(starts + 1, len(group) - 1)]
+    other = np.where(rank == 0, second[group_no], fastest[group_no])
+
+    gap = np.where(sizes[group_no] > 1, wrap_gap((micro - other) / 1e6), 0.0)
+    gaps[d_idx[order], r_idx[order]] = gap
+    return gaps
+
+@quiet_chained_assignment
 def qualy_differences(qualy_df, race_names):
     """
     Function for adding qualifying differences between team-mates to DataFrame
     Input: df (pd.DataFrame) - Extracted from QualyExtractor
          : race_names (list) list of race names for given year
     Output: df (pd.DataFrame) - QualyExtractor DataFrame with relative times added. 
+
+    Lap times are converted once to seconds and gaps for every team at every race are
+    computed together by 'teammate_gaps'.
     """
-    
-    for make in qualy_df['Details','Car'].unique():
-        df_tmp = qualy_df.loc[qualy_df['Details','Car'] == make]
-        
+    race_names = list(race_names)
+    times = times_to_seconds(qualy_df.loc[:, [(race, 'Time') for race in race_names]].values)
+    cars = qualy_df['Details', 'Car'].values
+    gaps = teammate_gaps(times, cars)
+
+    timed = pd.DataFrame(~np.isnan(times)).groupby(pd.factorize(cars)[0]).sum()
+    for c, make in enumerate(pd.unique(cars)):
         for n, race in enumerate(race_names):
-            
-#             if 0 in df_tmp[race, 'Time'].values or 'DNF' in df_tmp[race, 'Time'].values:
-#                 continue
-
-            df_tmp, diff = time_diff(df_tmp, race)
-           
-            if diff == [0, 0]:
-                print(f"No comparison available for Team: {make} at Race: {race}")
-            
-            for n, ind in enumerate(df_tmp.index):
-            
-                gap = df_tmp[race, 'Team-mate'].where(df_tmp.index == ind).values[n]
-
-                qualy_df.at[ind, (race, 'Team-mate')] = float(gap)            
-                
+            if timed.at[c, n] < 2:
+                logger.info(f"No comparison available for Team: {make} at Race: {race}")
+
+    for n, race in enumerate(race_names):
+        col = (race, 'Team-mate')
+        current = pd.to_numeric(qualy_df[col], errors='coerce').values if col in qualy_df.columns else np.nan
+        qualy_df[col] = np.where(np.isnan(gaps[:, n]), current, gaps[:, n])
+
     qualy_df.fillna(0, inplace=True)   
     return qualy_df
 
+_LAP_TIME = re.compile(r'^\s*(?:(\d+):)?(\d+(?:\.\d+)?)\s*$')
+
+def _lap_seconds(value):
+    if isinstance(value, str):
+        match = _LAP_TIME.match(value)
+        if match is None:
+            return np.nan
+        minutes, seconds = match.groups()
+        value = int(minutes or 0) * 60 + float(seconds)
+    try:
+        value = float(value)
+    except (TypeError, ValueError):
+        return np.nan
+    return value if value > 0 else np.nan
+
+def times_to_seconds(values):
+    """
+    Convert lap times ('1:30.919', '59.123') to float seconds. Works on any array-like
+    (a column or a whole drivers x races block) and returns a float array of the same shape.
+    Numbers are taken to be seconds already; zeros, untimed codes ('DNF', 'DNS', 'DNC', ...)
+    and anything unparseable become NaN.
+    """
+    values = np.asarray(values, dtype=object)
+    seconds = np.array([_lap_seconds(v) for v in values.ravel()], dtype=float)
+    return seconds.reshape(values.shape)
+
+def wrap_gap(seconds):
+    """
+    Vectorized form of 'fcn(divmod(x, 60)[1])' used for time differences throughout this module.
+    """
+    r = np.mod(seconds, 60)
+    return np.where((-15 < r) & (r < 15), r, np.round(r - 60, 3))
+
+@quiet_chained_assignment
 def qualy_relative_2_mean(q_df, race_names=None, threshold=-10):
     """
     Add each drivers qualifying performance relative to the mean for that race.
+
+    The whole season is converted once into a (drivers x races) matrix of lap times in seconds;
+    race means and each driver's gap to the mean are computed from it with NumPy.
+    Gaps below 'threshold' are set to NaN. Races without any timed laps are skipped.
     """
-    q_df_copy = q_df.copy()
-    if race_names == None:
-        race_names = q_df_copy.columns.levels[0].values[1:]
+    if race_names is None:
+        race_names = q_df.columns.levels[0].values[1:]
+    race_names = list(race_names)
 
-    qualy_means = dict()
+    times = times_to_seconds(q_df.loc[:, [(race, 'Time') for race in race_names]].values)
+    valid = ~np.isnan(times)
+    counts = valid.sum(axis=0)
 
-    for race in race_names:
-        results = []
-        for i, t in enumerate(q_df_copy[race, 'Time'].values):
-            
-            # convert untimed types for further processing 
-            if type(t) !=str or t == 'DNC' or t == 'DNF' or t == 'DNS':
-                t = '00:00.0'
-            try:
-                time = datetime.strptime(t, '%M:%S.%f')
-                results.append(time)
-            except:
-                results.append(t)
-
-        q_df_copy[race, 'Time'] = results # times converted to datetime format
-        q_datetime_df = q_df_copy[race, 'Time'] # times in a separate dataframe
-
-        for ind in q_datetime_df.index:
-            if str(q_datetime_df[ind]) == '1900-01-01 00:00:00' or q_datetime_df[ind] == 'DNF':
-                q_datetime_df.drop(axis=0, index=ind, inplace=True) # datetimes with zeros removed
-
-        # calculate the mean qualifying time for race
-        race_mean = avg_datetime(q_datetime_df) 
-        mean = datetime.combine(date.min, race_mean)
-        qualy_means[race] = mean
-
-        relative_to_mean = []
-        for ind in q_datetime_df.index:
-
-            t_ind = datetime_2_time(q_datetime_df.loc[ind])
-            t_ind = datetime.combine(date.min, t_ind)
-            to_mean = t_ind - mean
-            race_mean = fcn(divmod(to_mean.total_seconds(), 60)[1])
-            relative_to_mean.append(race_mean)
-
-            q_df.at[ind, (race,'to_mean')] = race_mean
-            q_df[race, 'to_mean'] = q_df[race, 'to_mean'].apply(lambda x: np.nan if x < threshold else x)
-    return q_df, qualy_means#
+    # race means in integer microseconds, truncated like the Timestamp -> datetime conversion
+    micro = np.where(valid, np.round(np.nan_to_num(times) * 1e6), 0).astype(np.int64)
+    t_min = np.where(valid, micro, np.iinfo(np.int64).max).min(axis=0)
+    deltas = np.where(valid, micro - t_min, 0).sum(axis=0)
+    mean_micro = np.where(counts > 0, t_min + deltas // np.maximum(counts, 1), 0) % 3600000000 # as a '%M:%S.%f' time
+
+    gaps = wrap_gap((micro - mean_micro) / 1e6)
+    gaps[~valid] = np.nan
+
+    timed = [r for r, race in enumerate(race_names) if counts[r]]
+    qualy_means = dict()
+    for r in timed:
+        seconds, microseconds = divmod(int(mean_micro[r]), 1000000)
+        qualy_means[race_names[r]] = datetime.combine(date.min, time(minute=seconds // 60, second=seconds % 60,
+                                                                     microsecond=microseconds))
+
+    # keep existing 'to_mean' values for untimed rows, as the per-cell update used to
+    cols = [(race_names[r], 'to_mean') for r in timed]
+    existing = [col in q_df.columns for col in cols]
+    to_mean = np.full((len(q_df.index), len(cols)), np.nan)
+    for c, col in enumerate(cols):
+        if existing[c]:
+            to_mean[:, c] = pd.to_numeric(q_df[col], errors='coerce')
+    to_mean = np.where(valid[:, timed], gaps[:, timed], to_mean)
+    to_mean[to_mean < threshold] = np.nan
+
+    for c, col in enumerate(cols):
+        if existing[c]:
+            q_df[col] = to_mean[:, c]
+    new_cols = [col for col, e in zip(cols, existing) if not e]
+    if new_cols:
+        new = pd.DataFrame(to_mean[:, [not e for e in existing]], index=q_df.index,
+                           columns=pd.MultiIndex.from_tuples(new_cols))
+        q_df[new_cols] = new
+
+    return q_df, qualy_means
 
 
 def qualy_season_mean_df(df, race_names=None):
@@ -220,3 +184,74 @@ def qualy_season_mean_df(df, race_names=None):
     new_df['Mean'] = new_df.drop(['Driver','Car'], axis=1).mean(axis=1)
 
     return new_df
+
+
+# fixed dtypes of long-format columns; anything else (names, positions, lap times) stays object
+LONG_DTYPES = {'Race No': 'int64', 'Team-mate': 'float64', 'to_mean': 'float64', 'Points': 'float64'}
+
+def _long_block(df, keys, first, fields, details, key_name, number_name, value_name, index):
+    n = len(df.index)
+    columns = dict()
+    for name, values in details.items():
+        columns[name] = np.tile(np.asarray(values, dtype=object), len(keys))
+    if fields is None:
+        columns[value_name] = df[keys].to_numpy(dtype=object).ravel(order='F')
+    else:
+        for field in fields:
+            block = df.reindex(columns=pd.MultiIndex.from_tuples([(key, field) for key in keys]))
+            columns[field] = block.to_numpy(dtype=object).ravel(order='F')
+    columns[key_name] = np.repeat(np.array(keys, dtype=object), n)
+    if number_name is not None:
+        columns[number_name] = np.repeat(np.arange(first, first + len(keys)) + 1, n)
+
+    labels = df.index if index is None else index
+    long_df = pd.DataFrame(columns, index=pd.Index(np.tile(np.asarray(labels), len(keys)), name=labels.name))
+    long_df = long_df[sorted(columns)]
+    for name, dtype in LONG_DTYPES.items():
+        if name in long_df.columns:
+            long_df[name] = pd.to_numeric(long_df[name], errors='coerce').astype(dtype)
+    return long_df
+
+def stack_long(df, keys=None, details=None, key_name='Race', number_name='Race No', value_name='Value',
+               index=None, generator=False):
+    """
+    Reshape a wide results frame (one block of columns per race or season) to long format,
+    one row per driver/team and key, without growing a frame inside a loop.
+
+    Input: df (pd.DataFrame) - with MultiIndex columns every field under a key (e.g. Position,
+                               Time, to_mean under a race name) becomes a column; with single-level
+                               columns each key column is stacked into 'value_name'
+           keys (list) - top-level columns to stack, in order (default: all except 'Details')
+           details (dict) - column name -> per-row values repeated for every key, e.g. Driver, Car
+           key_name / number_name - columns holding the key and its 1-based number (None to skip)
+           index (pd.Index) - row labels to repeat, default df.index
+           generator (bool) - yield one long DataFrame per key instead of a single DataFrame
+    Output: pd.DataFrame, rows ordered key by key, columns sorted by name and typed by LONG_DTYPES
+    """
+    multi = isinstance(df.columns, pd.MultiIndex)
+    if keys is None:
+        keys = [key for key in dict.fromkeys(df.columns.get_level_values(0)) if key != 'Details']
+    keys = list(keys)
+    fields = None
+    if multi:
+        fields = list(dict.fromkeys(field for key in keys for field in df[key].columns))
+    details = details or dict()
+    index = None if index is None else pd.Index(index)
+
+    if generator:
+        return (_long_block(df, [key], n, fields, details, key_name, number_name, value_name, index)
+                for n, key in enumerate(keys))
+    return _long_block(df, keys, 0, fields, details, key_name, number_name, value_name, index)
+
+def stack_qualy_results(q_df, race_names=None, generator=False):
+    """
+    Stack qualifying results for a single year under the following columns:
+    No | Car | Driver | Position | Race | Race No | Team-mate | Time | to_mean
+
+    Useful for plotting Qualifying data spread per year.
+    Input: q_df (pd.DataFrame) -  Qualifying results dataframe after applying 'qualy_relative_2_mean()'
+           race_names (list) - list of race names for given year (default: every race in q_df)
+           generator (bool) - yield one stacked DataFrame per race instead
+    """
+    details = {'Driver': q_df['Details', 'Driver'].values, 'Car': q_df['Details', 'Car'].values}
+    return stack_long(q_df, race_names, details=details, generator=generator)
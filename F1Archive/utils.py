@@ -1,4 +1,54 @@
-import pandas as pd
+import functools
+import importlib
+import logging
+import types
+
+
+class LazyModule(types.ModuleType):
+    """
+    Stand-in for a module that is only imported the first time one of its attributes is used,
+    e.g. pd = LazyModule('pandas'). Keeps heavy dependencies out of package import time.
+    """
+    def __init__(self, name):
+        super().__init__(name)
+
+    def __getattr__(self, attr):
+        module = importlib.import_module(self.__name__)
+        self.__dict__.update(module.__dict__) # later lookups no longer reach __getattr__
+        return getattr(module, attr)
+
+    def __repr__(self):
+        return f"<lazy module '{self.__name__}'>"
+
+
+pd = LazyModule('pandas')
+
+
+def quiet_chained_assignment(func):
+    """
+    Run 'func' with pandas' SettingWithCopyWarning switched off. Used on the functions that
+    update frames handed to them, instead of changing the option for the whole process.
+    """
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        with pd.option_context('mode.chained_assignment', None):
+            return func(*args, **kwargs)
+    return wrapper
+
+
+def log_to_console(level=logging.INFO, format='%(asctime)s | %(levelname)s: %(message)s'):
+    """
+    Print the package's progress messages to the console. Importing F1Archive leaves
+    logging untouched, so scripts call this to see extraction progress.
+    Output: the handler added to the 'F1Archive' logger
+    """
+    logger = logging.getLogger('F1Archive')
+    handler = logging.StreamHandler()
+    handler.setFormatter(logging.Formatter(format))
+    logger.addHandler(handler)
+    logger.setLevel(level)
+    return handler
+
 
 def get_col_list(hyp_params):
     """
@@ -0,0 +1,114 @@
+import os
+from itertools import repeat
+from concurrent.futures import ProcessPoolExecutor
+from F1Archive.utils import LazyModule
+from F1Archive.visualization import viz
+from F1Archive.visualization.viz_utils import stack_qualy_results, get_cum_results
+from F1Archive.data_transforms.transformations import qualy_season_mean_df
+
+sns = LazyModule('seaborn')
+matplotlib = LazyModule('matplotlib')
+mpl_style = LazyModule('matplotlib.style')
+figure = LazyModule('matplotlib.figure')
+backend_agg = LazyModule('matplotlib.backends.backend_agg')
+
+
+def season_data(qualy_df=None, race_names=None, champ_table=None, results_df=None):
+    """
+    Collect the frames the charts of one season are drawn from:
+        qualy - stacked qualifying results ('stack_qualy_results'), after 'qualy_relative_2_mean'
+                and 'qualy_differences' have been applied to 'qualy_df'
+        team_mates - per-team mean qualifying gaps ('qualy_season_mean_df')
+        constructors - constructors table ('TeamsExtractor.champ_tables[yr]') with a Team column
+        cum_results - cumulative points ('get_cum_results')
+    """
+    data = dict(race_names=race_names)
+    if qualy_df is not None:
+        data['qualy'] = stack_qualy_results(qualy_df, race_names).reset_index() # seaborn needs unique labels
+        data['team_mates'] = qualy_season_mean_df(qualy_df, race_names)
+    if champ_table is not None:
+        data['constructors'] = champ_table
+    if results_df is not None:
+        data['cum_results'] = get_cum_results(results_df)
+    return data
+
+
+# chart type -> (function drawing it on an axes, figure size, seaborn style, font size)
+CHARTS = {
+    'field_spread': (lambda d, season, team, ax: viz.plot_field_spread(d['qualy'], d['race_names'], year=season, ax=ax), (12, 7), 'darkgrid', 14),
+    'teammate': (lambda d, season, team, ax: viz.plot_teammate_comparison(d['qualy'], team, d['race_names'], year=season, ax=ax), (12, 7), 'darkgrid', 14),
+    'seasons_comparison': (lambda d, season, team, ax: viz.plot_seasons_comparisons(d['team_mates'], d['race_names'], year=season, ax=ax), (14, 7), 'darkgrid', 10),
+    'per_max': (lambda d, season, team, ax: viz.plot_per_max(d['constructors'], year=season, ax=ax), (9, 5), 'white', 12),
+    'per_total': (lambda d, season, team, ax: viz.plot_per_total(d['constructors'], year=season, ax=ax), (9, 5), 'white', 12),
+    'constructors': (lambda d, season, team, ax: viz.plot_constructors(d['constructors'], year=season, ax=ax), (9, 5), 'white', 12),
+    'cum_results': (lambda d, season, team, ax: viz.plot_cum_results(d['cum_results'], ax=ax), (14, 8), 'whitegrid', 12),
+}
+
+_DATA = dict() # season -> season_data, set once in every worker process
+
+
+def _init_worker(data):
+    global _DATA
+    _DATA = data
+
+
+def chart_path(out_dir, season, team, chart, fmt):
+    return os.path.join(out_dir, f"{season}_{team or 'all'}_{chart}.{fmt}")
+
+
+def render(job, data, out_dir, formats=('png',), dpi=150):
+    """
+    Draw one (season, team, chart type) job on its own Agg figure and save it in every format.
+    The chart's style and font are applied on top of matplotlib's defaults for the duration of
+    the render only, and no pyplot figure is created, so renders never share state or accumulate:
+    the same job always gives the same image, whatever was drawn before it.
+    Output: list of file paths written
+    """
+    season, team, chart = job
+    draw, figsize, style, font_size = CHARTS[chart]
+    rc = {'font.family': 'Arial', 'font.weight': 'normal', 'font.size': font_size,
+          'axes.prop_cycle': matplotlib.cycler(color=sns.color_palette('deep'))}
+    with mpl_style.context('default'), sns.axes_style(style), matplotlib.rc_context(rc):
+        fig = figure.Figure(figsize=figsize)
+        backend_agg.FigureCanvasAgg(fig)
+        ax = fig.add_subplot(1, 1, 1)
+        draw(data[season], season, team, ax)
+
+        paths = []
+        for fmt in formats:
+            path = chart_path(out_dir, season, team, chart, fmt)
+            fig.savefig(path, format=fmt, dpi=dpi, bbox_inches='tight')
+            paths.append(path)
+    return paths
+
+
+def _render_job(job, out_dir, formats, dpi):
+    try:
+        return render(job, _DATA, out_dir, formats, dpi), None
+    except Exception as error:
+        return [], f"{type(error).__name__}: {error}"
+
+
+def render_batch(jobs, data, out_dir, formats=('png',), processes=None, dpi=150):
+    """
+    Render many charts to image files in a pool of worker processes.
+
+    Input: jobs (list) - (season, team, chart type) tuples; chart types are the keys of CHARTS,
+                         team is only used by 'teammate' (None otherwise)
+           data (dict) - season -> 'season_data(...)'; sent once to every worker
+           out_dir (str) - output directory, files are named <season>_<team>_<chart>.<format>
+           formats (tuple) - any of 'png', 'svg', 'pdf'
+           processes (int) - pool size, default one per core; 1 renders in this process
+    Output: list of (job, paths, error) in the order of 'jobs'; error is None or a message,
+            and a failed job does not stop the others
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    jobs = [tuple(job) for job in jobs]
+    if processes == 1:
+        _init_worker(data)
+        results = [_render_job(job, out_dir, formats, dpi) for job in jobs]
+    else:
+        with ProcessPoolExecutor(max_workers=processes, initializer=_init_worker, initargs=(data,)) as pool:
+            results = list(pool.map(_render_job, jobs, repeat(out_dir), repeat(formats), repeat(dpi),
+                                    chunksize=max(1, len(jobs) // (4 * (processes or os.cpu_count() or 1)))))
+    return [(job, paths, error) for job, (paths, error) in zip(jobs, results)]
@@ -1,61 +1,56 @@
-import pandas as pd
-import numpy as np
-import seaborn as sns
-import matplotlib.pyplot as plt
-import matplotlib
+from F1Archive.utils import LazyModule
 from F1Archive.visualization.viz_utils import abbreviations, team_colors
-import logging
 
-logger = logging.getLogger()
-logger.setLevel(logging.CRITICAL)
+np = LazyModule('numpy')
+sns = LazyModule('seaborn')
+plt = LazyModule('matplotlib.pyplot')
+matplotlib = LazyModule('matplotlib')
 
-def plot_field_spread(df, race_names, figsize=(12,7), colors=None, ylim=None, year='X', save=False, savefile='', style="darkgrid"):
+def plot_field_spread(df, race_names, figsize=(12,7), colors=None, ylim=None, year='X', save=False, savefile='', style="darkgrid",
+                      ax=None):
     """
     Plotting function for qualifying field spread across all races for a given season.
     Requires stacked pd.DataFrame from 'stack_qualy_results()'
+    ax (matplotlib Axes) - draw on this axes instead of pyplot figure 1; font and style are then
+                           left to the caller (see 'batch.render')
     """
-    font = {'family' : 'Arial',
-        'weight' : 'normal',
-        'size'   : 14}
-    matplotlib.rc('font', **font)
-
-    sns.set_style(style)
-
     if ylim == None:
         ylim = max(df['to_mean'].max(), abs(df['to_mean'].min()))
     if colors == None:
         palette = team_colors(year)
     if palette == None:
         palette = sns.husl_palette(len(df['Car'].unique()))
-    fig = plt.figure(1, figsize=figsize)
-
-    ax = sns.scatterplot(x="Race No", y="to_mean", data=df, hue="Car", palette=palette) 
+    if ax is None:
+        font = {'family' : 'Arial',
+            'weight' : 'normal',
+            'size'   : 14}
+        matplotlib.rc('font', **font)
+        sns.set_style(style)
+        fig = plt.figure(1, figsize=figsize)
+
+    ax = sns.scatterplot(x="Race No", y="to_mean", data=df, hue="Car", palette=palette, ax=ax) 
     ax.set_xticks(list(set(df['Race No'])))
     lgd = ax.legend(bbox_to_anchor=(1.005, 1.0), loc=2, borderaxespad=0.)
     
     #sns.despine()
 
     # Format title, ticks and labels
-    plt.ylim(np.floor(-ylim), np.ceil(ylim))
+    ax.set_ylim(np.floor(-ylim), np.ceil(ylim))
     ax.set_xticklabels([abbreviations()[key] for key in race_names])
 
     ax.set(xlabel='Race', ylabel='Time, relative to mean')
     ax.set_title(f'Qualifying field spread for {year} season')
 
     if save and savefile != None:
-        plt.savefig(savefile, bbox_extra_artists=(lgd,), dpi=300)
+        ax.figure.savefig(savefile, bbox_extra_artists=(lgd,), dpi=300)
 
     return ax
 
 
-def plot_teammate_comparison(df, team, race_names, figsize=(12,7), ylim=None, year='X', save=False,
-                             savefile='', style="light"):
+def set_teammate_style(style):
     """
-    Plotting function for team-mate qualifying comparison race-by-race for a given season.
-    Requires stacked pd.DataFrame from 'stack_qualy_results()'
+    Set the global font and style used by the team-mate comparison plots.
     """
-    assert team in df['Car'].values, f"'{team}' not in df['Car']"
-    
     font = {'family' : 'Arial',
         'weight' : 'normal',
         'size'   : 14}
@@ -64,14 +59,26 @@ def plot_teammate_comparison(df, team, race_names, figsize=(12,7), ylim=None, ye
         sns.set_style("darkgrid")
     else:
         plt.style.use('dark_background')
+
+def plot_teammate_comparison(df, team, race_names, figsize=(12,7), ylim=None, year='X', save=False,
+                             savefile='', style="light", ax=None):
+    """
+    Plotting function for team-mate qualifying comparison race-by-race for a given season.
+    Requires stacked pd.DataFrame from 'stack_qualy_results()'
+    ax (matplotlib Axes) - draw on this axes instead of pyplot figure 1; font and style are then
+                           left to the caller (see 'batch.render')
+    """
+    assert team in df['Car'].values, f"'{team}' not in df['Car']"
     
-    fig = plt.figure(1, figsize=figsize)
+    if ax is None:
+        set_teammate_style(style)
+        fig = plt.figure(1, figsize=figsize)
 
     ax = sns.barplot(x="Race No", y="Team-mate", data=df.where(df['Car'] == team), hue="Driver", palette=['#ff6666','#4dff4d'],
-                     saturation=0.5) 
+                     saturation=0.5, ax=ax) 
 
     if ylim:
-        plt.ylim(ylim[0], ylim[1])
+        ax.set_ylim(ylim[0], ylim[1])
     ax.set_xticklabels([abbreviations()[key] for key in race_names])
     ax.set(xlabel='Race', ylabel='Time, relative to team-mate')
     ax.set_title(f'Team-mate qualifying comparison for {year} season')
@@ -79,43 +86,47 @@ def plot_teammate_comparison(df, team, race_names, figsize=(12,7), ylim=None, ye
     lgd = ax.legend(bbox_to_anchor=(1.005, 1.0), loc=2, borderaxespad=0.)
 
     if save and savefile != None:
-        plt.savefig(savefile, bbox_extra_artists=(lgd,), dpi=300)
+        ax.figure.savefig(savefile, bbox_extra_artists=(lgd,), dpi=300)
 
     return ax
 
 def get_teammate_comparisons(df, race_names, figsize=(12,7), ylim=None, year='X', save=False,
                              savefile='', style="light"):
     """
-    Get sns.barplots() for all team-mate comparisions for a given year.
+    Get sns.barplots() for all team-mate comparisions for a given year, each on its own figure.
     Outputs: (dict) - key: Car make e.g. 'MCL', value: plot of qualifying comparison
     """
+    set_teammate_style(style)
     comparisons = dict()
     for team in df['Car'].unique():
-        
-        comparisons[team] = plot_teammate_comparison(df, team, race_names, figsize=(12,7), ylim=None,
-                                                     year='X', save=False, savefile='', style="light")
+        fig, ax = plt.subplots(figsize=figsize)
+        comparisons[team] = plot_teammate_comparison(df, team, race_names, figsize=figsize, ylim=ylim,
+                                                     year=year, save=False, savefile='', style=style, ax=ax)
     return comparisons
 
-def plot_seasons_comparisons(df, race_names, figsize=(14,7), colors=None, ylim=None, year='X', save=False, savefile='', style="darkgrid"):
+def plot_seasons_comparisons(df, race_names, figsize=(14,7), colors=None, ylim=None, year='X', save=False, savefile='', style="darkgrid",
+                             ax=None):
     """
     Plotting the average qualifying difference between all team-mates for a season
+    ax (matplotlib Axes) - draw on this axes instead of pyplot figure 1; font and style are then
+                           left to the caller (see 'batch.render')
     """
 
-    font = {'family' : 'Arial',
-        'weight' : 'normal',
-        'size'   : 10}
-    matplotlib.rc('font', **font)
-
-    sns.set_style(style)
-
     if colors == None:
         palette = team_colors(year)
     if palette == None:
         palette = sns.husl_palette(len(df['Car'].unique()))
-    fig = plt.figure(1, figsize=figsize)
-
-    ax = sns.barplot(x="Car", y="Mean", data=df, hue="Car", palette=palette, saturation=0.5) 
-    ax.get_legend().remove()
+    if ax is None:
+        font = {'family' : 'Arial',
+            'weight' : 'normal',
+            'size'   : 10}
+        matplotlib.rc('font', **font)
+        sns.set_style(style)
+        fig = plt.figure(1, figsize=figsize)
+
+    ax = sns.barplot(x="Car", y="Mean", data=df, hue="Car", palette=palette, saturation=0.5, ax=ax) 
+    if ax.get_legend() is not None: # newer seaborn adds no legend when hue repeats x
+        ax.get_legend().remove()
 
     ax.set_xticklabels([name for name in df['Car'].unique()])
 
@@ -123,28 +134,31 @@ def plot_seasons_comparisons(df, race_names, figsize=(14,7), colors=None, ylim=N
     ax.set_title(f'Average qualifying difference between team-mates for {year} season')
 
     if save and savefile != None:
-        plt.savefig(savefile, bbox_extra_artists=(lgd,), dpi=300)
+        ax.figure.savefig(savefile, dpi=300)
 
     return ax
 
 def plot_per_max(df, figsize=(9,5), colors=None, year='X', save=False, savefile='', style="white", 
-                 font = {'family' : 'Arial','weight' : 'normal','size'   : 12}, palette=None):
+                 font = {'family' : 'Arial','weight' : 'normal','size'   : 12}, palette=None, ax=None):
     
     """
     Plotting function for constructors championship points as a percentage of maximum possible
+    ax (matplotlib Axes) - draw on this axes instead of a new figure; font and style are then
+                           left to the caller (see 'batch.render')
     """
     
-    matplotlib.rc('font', **font)
-    sns.set_style(style)
+    if ax is None:
+        matplotlib.rc('font', **font)
+        sns.set_style(style)
     if palette == None:
         palette = sns.husl_palette(len(df['Team'].unique()))
     
     #fig = plt.figure(1, figsize=figsize)
  
     #ax = sns.barplot(x='Team', y='% of max', data=standings, hue="Team", palette=palette, saturation=0.5)
-    ax = df.plot.bar(x='Team', y='% of max', figsize=figsize)
+    ax = df.plot.bar(x='Team', y='% of max', figsize=figsize if ax is None else None, ax=ax)
     
-    plt.ylim(0, 100)
+    ax.set_ylim(0, 100)
     ax.set_xticklabels([name[:3] for name in df['Team'].unique()])
 
     ax.set(xlabel='Team', ylabel='Points as percentage of maximum')
@@ -159,19 +173,22 @@ def plot_per_max(df, figsize=(9,5), colors=None, year='X', save=False, savefile=
     return ax
 
 def plot_per_total(df, figsize=(9,5), colors=None, year='X', save=False, savefile='', style="white", 
-                 font = {'family' : 'Arial','weight' : 'normal','size'   : 12}, palette=None):
+                 font = {'family' : 'Arial','weight' : 'normal','size'   : 12}, palette=None, ax=None):
     """
     Plotting function for constructors championship points as a percentage of total points scored
+    ax (matplotlib Axes) - draw on this axes instead of a new figure; font and style are then
+                           left to the caller (see 'batch.render')
     """
     
-    matplotlib.rc('font', **font)
-    sns.set_style(style)
+    if ax is None:
+        matplotlib.rc('font', **font)
+        sns.set_style(style)
     if palette == None:
         palette = sns.husl_palette(len(df['Team'].unique()))
     
-    ax = df.plot.bar(x='Team', y='% of total', figsize=figsize)
+    ax = df.plot.bar(x='Team', y='% of total', figsize=figsize if ax is None else None, ax=ax)
     
-    plt.ylim(0, 100)
+    ax.set_ylim(0, 100)
     ax.set_xticklabels([name[:3] for name in df['Team'].unique()])
 
     ax.set(xlabel='Team', ylabel='Points as percentage of total')
@@ -186,17 +203,20 @@ def plot_per_total(df, figsize=(9,5), colors=None, year='X', save=False, savefil
     return ax
 
 def plot_constructors(df, figsize=(9,5), colors=None, year='X', save=False, savefile='', style="white", 
-                 font = {'family' : 'Arial','weight' : 'normal','size'   : 12}, palette=None):
+                 font = {'family' : 'Arial','weight' : 'normal','size'   : 12}, palette=None, ax=None):
     """
     Plotting function for constructors championship points as a percentage of total points scored
+    ax (matplotlib Axes) - draw on this axes instead of a new figure; font and style are then
+                           left to the caller (see 'batch.render')
     """
 
-    matplotlib.rc('font', **font)
-    sns.set_style(style)
+    if ax is None:
+        matplotlib.rc('font', **font)
+        sns.set_style(style)
     if palette == None:
         palette = sns.husl_palette(len(df['Team'].unique()))
     
-    ax = df.plot.bar(x='Team', y='PTS', figsize=figsize)
+    ax = df.plot.bar(x='Team', y='PTS', figsize=figsize if ax is None else None, ax=ax)
     
   
     ax.set_xticklabels([name[:3] for name in df['Team'].unique()])
@@ -247,10 +267,20 @@ def plot_constructors_trend(df, figsize=(10,6), colors=None, first_year='', seco
     
     return plt
 
-def plot_cum_results(cum_df):
+def plot_cum_results(cum_df, ax=None):
+    """
+    Line plot of cumulative points race-by-race (from 'get_cum_results()').
+    ax (matplotlib Axes) - draw on this axes and return it, instead of a new pyplot figure
+    """
+    if ax is not None:
+        ax = cum_df.transpose().plot.line(ax=ax, use_index=False, xlim=(0,cum_df.shape[1]-1))
+        ax.legend(loc='center left',bbox_to_anchor=(1.0, 0.5))
+        ax.set(xlabel="Races", ylabel="Points")
+        return ax
+
+    sns.set(style='whitegrid')
     fig = plt.figure(figsize=(14,8))
     #ax = fig.add_subplot(1, 1, 1) 
-    sns.set(style='whitegrid')
 
     cum_df.transpose().plot.line(figsize=(14,8),use_index=False, xlim=(0,cum_df.shape[1]-1)).legend(loc='center left',bbox_to_anchor=(1.0, 0.5))
     plt.xlabel("Races")
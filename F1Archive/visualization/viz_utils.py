@@ -1,6 +1,8 @@
-import pandas as pd
-import seaborn as sns
-import numpy as np
+from F1Archive.utils import LazyModule, quiet_chained_assignment
+from F1Archive.data_transforms import championship, transformations
+
+pd = LazyModule('pandas')
+np = LazyModule('numpy')
 
 def abbreviations():
     abbrevs = {'south-africa':"SA", 'mexico':"MEX", "brazil":"BRA", "spain":"SPA", "san-marino":"SMA",
@@ -19,7 +21,7 @@ def team_colors(season):
 
     return palette
 
-def stack_qualy_results(q_df, race_names=None):
+def stack_qualy_results(q_df, race_names=None, generator=False):
     """
     Stack qualifying results for a single year under the following columns:
     No | Car | Driver | Position | Race | Race No | Team-mate | Time | to_mean
@@ -27,25 +29,11 @@ def stack_qualy_results(q_df, race_names=None):
     Useful for plotting Qualifying data spread per year.
     Input: q_df (pd.DataFrame) -  Qualifying results dataframe after applying 'qualy_relative_2_mean()'
            race_names (list) - list of race names for given year
+           generator (bool) - yield one stacked DataFrame per race instead
     """
-    # Establish empty dataframe for stacking race-by-race results
-    stacked_df = pd.DataFrame(columns=['No','Driver', 'Car', 'Race', 'Race No',
-                                   'Position', 'Time', 'Team-mate', 'to_mean'])
-    stacked_df.set_index('No', inplace=True)
-    
-    for rn, race in enumerate(race_names):
-        df_tmp = q_df[race].copy()
-        df_tmp["Driver"] = q_df["Details","Driver"]
-        df_tmp["Car"] = q_df["Details","Car"]
-        df_tmp['Race No'] = [rn+1 for n in range(len(df_tmp.index))]
-        r =  [race for n in range(len(df_tmp.index))]
-        df_tmp["Race"] = r
-        
-        stacked_df = pd.concat([stacked_df.copy(), df_tmp.copy()], ignore_index=False, sort=True)
-        
-    return stacked_df
+    return transformations.stack_qualy_results(q_df, race_names, generator=generator)
 
-def stack_constructor_trends(seasons_df):
+def stack_constructor_trends(seasons_df, generator=False):
     """
     Stack constructors results over multiple years to visualize trends.
 
@@ -54,56 +42,43 @@ def stack_constructor_trends(seasons_df):
 
     Returns a DataFrame with columns:
     Points | Team | Year
+    (or a generator of one such DataFrame per year if generator=True)
     """
-    stacked_df = pd.DataFrame(columns=['Team', 'Points', 'Year'])
-    stacked_df_filled = stacked_df.copy()
-    print(stacked_df_filled)
-    for _, s in enumerate(seasons_df.columns):
-        df_tmp = stacked_df.copy()
-        df_tmp['Team'] = seasons_df.index
-        df_tmp['Points'] = seasons_df[s].values
-        df_tmp['Year'] = [s for i in range(len(seasons_df.index))]
-        stacked_df_filled = pd.concat([stacked_df_filled.copy(), df_tmp.copy()], ignore_index=False, sort=True)
-        del df_tmp
-    return stacked_df_filled.fillna(0)
+    stacked = transformations.stack_long(seasons_df, list(seasons_df.columns), details={'Team': seasons_df.index.values},
+                                         key_name='Year', number_name=None, value_name='Points',
+                                         index=pd.RangeIndex(len(seasons_df.index)), generator=generator)
+    if generator:
+        return (df.fillna(0) for df in stacked)
+    return stacked.fillna(0)
     
 
+@quiet_chained_assignment
 def get_cum_results(seasons_results_df):
     """
     Sums points scored on a race-by-race basis.
+    Drivers are listed in final championship order (ties broken on countback).
     """
     
     cum_results = seasons_results_df['Points'].cumsum(axis=1)
+    standings = championship.standings_positions(cum_results.to_numpy(dtype=float),
+                                                 seasons_results_df['Position'].to_numpy(dtype=object))
     
     cum_results['Driver'] = seasons_results_df['Details']['Driver']#.apply(lambda s : s[-3:]).map(str.upper)
-    cum_results.sort_values(by='australia',ascending=False, inplace=True)
+    cum_results = cum_results.iloc[np.argsort(standings[:, -1], kind='stable')]
     cum_results.set_index('Driver', inplace=True)
     
     return cum_results
 
-def best_11_cumsum(season_results_df):
+def best_11_cumsum(season_results_df, n=11):
     """
     compute cumulative scores based on best 11 results
+    Input: season_results_df (pd.Series) - one driver's row of a season results table
+    Output: np.array of running totals, counting the best 'n' results so far
     """
-    
-    series = season_results_df.drop(['Details', 'Position'])#.drop(['Driver', 'Car'], axis=1).iloc[0]
-   
-    best_11_cum = np.array(series[:11].cumsum())
-    best_11_S = series[:11].sort_values()
-    best_11 = np.array(series[:11].sort_values())
-    
-    for pts in series[11:]:
-        if pts > best_11_S.any():
-            best_11 = np.delete(best_11,0)
-            best_11 = np.insert(best_11, -1, pts)
-            
-            best_11_cum = np.insert(best_11_cum, len(best_11_cum), np.array(best_11).cumsum()[-1])
-            
-        else:
-            best_11_cum = np.insert(best_11_cum, len(best_11_cum), best_11_cum[-1])
-            
-    return best_11_cum
+    points = season_results_df['Points'].to_numpy(dtype=float)
+    return championship.best_n_cumsum(points[None, :], n)[0]
 
+@quiet_chained_assignment
 def clean_best_11(cum_11_df, seasons_results_df):
     
     best_11_df = pd.DataFrame(pd.DataFrame(cum_11_df)[0].tolist(), columns=seasons_results_df['Points'].columns)
@@ -111,7 +86,7 @@ def clean_best_11(cum_11_df, seasons_results_df):
     best_11_df['Driver'] = best_11_df['Driver']#.apply(lambda s : s[-3:]).map(str.upper)
     cols_new = list(best_11_df.columns[-1:]) + list(best_11_df.columns[:-1])
     best_11_df = best_11_df[cols_new]
-    best_11_df.sort_values(by='australia',ascending=False, inplace=True)
+    best_11_df.sort_values(by=best_11_df.columns[-1], ascending=False, kind='stable', inplace=True)
     best_11_df.set_index('Driver', inplace=True)
     
     return best_11_df
\ No newline at end of file
@@ -0,0 +1,110 @@
+"""
+Benchmark the season merge step of DataExtractor.seasons_results on synthetic data.
+
+Each synthetic season has 30 drivers and 22 races, with a few retirements, non-classified
+results and mid-season substitutes, mimicking the tables returned by 'data_to_table'.
+No network access is needed.
+
+Usage: python benchmarks/bench_seasons_results.py [n_seasons]
+"""
+import os
+import sys
+import time
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from F1Archive.data.data_extraction import DataExtractor
+from F1Archive.utils import multi_index_df
+
+N_DRIVERS = 30
+N_RACES = 22
+POINTS = [25, 18, 15, 12, 10, 8, 6, 4, 2, 1]
+
+
+def synthetic_season(seed=0, n_drivers=N_DRIVERS, n_races=N_RACES):
+    """
+    Return (race_names, tables) for one synthetic season.
+    """
+    rng = np.random.default_rng(seed)
+    names = [f"Driver{i:02d} Surname{i:02d} D{i:02d}" for i in range(n_drivers + 4)]
+    cars = [f"Team{i // 2:02d} Engine" for i in range(n_drivers + 4)]
+    race_names = [f"race-{r:02d}" for r in range(n_races)]
+
+    tables = []
+    for r in range(n_races):
+        entrants = list(range(n_drivers))
+        if r >= n_races // 2: # substitutes for the second half of the season
+            entrants[rng.integers(n_drivers)] = n_drivers + rng.integers(4)
+        entrants = [entrants[i] for i in rng.permutation(len(entrants))]
+        pos = [str(p + 1) for p in range(len(entrants))]
+        for p in rng.choice(len(entrants), 3, replace=False):
+            pos[p] = 'NC'
+        df = pd.DataFrame({'No': entrants,
+                           'Pos': pos,
+                           'Driver': [names[e] for e in entrants],
+                           'Car': [cars[e] for e in entrants],
+                           'Laps': 57,
+                           'Time/Retired': '+1 lap',
+                           'PTS': [float(POINTS[p]) if p < len(POINTS) else 0.0 for p in range(len(entrants))]})
+        df.set_index('No', inplace=True)
+        tables.append(df)
+    return race_names, tables
+
+
+def legacy_season_table(tables, race_names):
+    """
+    The row-by-row merge that seasons_results used before the pivot rewrite, kept for comparison.
+    """
+    results_df = multi_index_df([], dict(Details=["Driver","Car"], Position=race_names, Points=race_names))
+    placeholder = [0 for i in range(len(race_names)*2)]
+    for n, (race, df) in enumerate(zip(race_names, tables)):
+        df = df.copy()
+        df.index = df['Driver'].apply(lambda s : s[:-3])
+        if n == 0:
+            results_df["Details","Car"] = df["Car"]
+            results_df["Details", "Driver"] = df["Driver"]
+            results_df.index = df.index
+        for ind in df.index.difference(results_df.index):
+            results_df.loc[ind] = [df['Driver'].loc[ind],df['Car'].loc[ind],*placeholder]
+        for ind in df.index:
+            pos = df['Pos'].where(df.index == ind).dropna().values[0]
+            pts = df['PTS'].where(df.index == ind).dropna().values[0]
+            results_df.at[ind, ('Position', race)] = pos
+            results_df.at[ind, ('Points', race)] = pts
+        df2 = results_df.copy()
+    results_df.reset_index(inplace=True)
+    results_df.fillna(0, inplace=True)
+    results_df["Details","Car"] = results_df["Details","Car"].apply(lambda s : s[:3]).map(str.upper)
+    return results_df
+
+
+def vectorized_season_table(tables, race_names):
+    records = [DataExtractor.race_records(df, race, n) for n, (race, df) in enumerate(zip(race_names, tables))]
+    return DataExtractor.season_table(records, race_names)
+
+
+def timeit(fcn, seasons):
+    start = time.perf_counter()
+    for race_names, tables in seasons:
+        fcn(tables, race_names)
+    return time.perf_counter() - start
+
+
+if __name__ == '__main__':
+    n_seasons = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    seasons = [synthetic_season(seed) for seed in range(n_seasons)]
+
+    new = vectorized_season_table(*seasons[0][::-1])
+    old = legacy_season_table(*seasons[0][::-1])
+    assert new.shape == old.shape, (new.shape, old.shape)
+    other = new.columns.get_level_values(0) != 'Points'
+    assert (new.loc[:, other].astype(str).values == old.loc[:, other].astype(str).values).all()
+    assert (new['Points'].values == old['Points'].astype(float).values).all()
+
+    legacy = timeit(legacy_season_table, seasons)
+    vectorized = timeit(vectorized_season_table, seasons)
+    print(f"{n_seasons} seasons of {N_DRIVERS} drivers x {N_RACES} races")
+    print(f"legacy row-by-row merge: {legacy / n_seasons * 1000:8.1f} ms/season")
+    print(f"pivot merge:             {vectorized / n_seasons * 1000:8.1f} ms/season  ({legacy / vectorized:.0f}x)")
@@ -0,0 +1,212 @@
+"""
+Offline benchmark suite for the extraction and transformation steps.
+
+Pages come from the corpus in benchmarks/fixtures, synthesized from a fixed seed in the
+formula1.com results archive markup (see corpus.py), through a ReplayFetcher, so no network
+access is needed. Every case is run '--repeat' times on fresh inputs; the suite reports the best
+and median wall time, and the peak memory allocated (tracemalloc) during one more run.
+
+With '--baseline' the results are compared with a stored baseline: a case regresses when its best
+time is more than '--time-threshold' times the baseline (and at least 1 ms slower), or its peak
+memory more than '--memory-threshold' times the baseline. The exit status is 1 if any case regresses.
+Baselines only compare like with like; record one per machine with '--save'.
+
+Usage: python benchmarks/bench_suite.py [--repeat N] [--cases REGEX] [--baseline FILE] [--save FILE]
+       python benchmarks/bench_suite.py --baseline benchmarks/baseline.json
+"""
+import argparse
+import functools
+import gc
+import json
+import os
+import platform
+import re
+import statistics
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import numpy as np
+import pandas as pd
+from corpus import SEASONS, replay_fetcher
+from F1Archive.data.data_extraction import DataExtractor
+from F1Archive.data.qualy_extractor import QualyExtractor
+from F1Archive.data.constructors_champ import TeamsExtractor
+from F1Archive.data_transforms.transformations import qualy_differences, qualy_relative_2_mean
+
+BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baseline.json')
+TIME_SLACK = 0.001 # seconds; smaller slowdowns are timer noise
+
+
+class Cases():
+    """
+    Benchmark cases over the corpus. Each case is a function returning a fresh zero-argument
+    callable, so that setup work (and inputs modified in place) stay outside the timed call.
+    """
+    def __init__(self, fetcher):
+        self.fetcher = fetcher
+
+    @functools.lru_cache(maxsize=None)
+    def qualy_season(self, year):
+        """
+        Qualifying table and session names of one season, extracted once.
+        """
+        extractor = QualyExtractor(fetcher=self.fetcher)
+        extractor.get_race_urls([year])
+        extractor.get_qualy_urls()
+        extractor.year_qualy_results()
+        return extractor.qualy_results[year], extractor.qualy_race_keys(extractor.qualy_urls[year])
+
+    @functools.lru_cache(maxsize=None)
+    def qualy_gaps(self, year):
+        df, races = self.qualy_season(year)
+        return qualy_differences(df.copy(), races), races
+
+    @functools.lru_cache(maxsize=None)
+    def champ_tables(self, years):
+        extractor = TeamsExtractor(fetcher=self.fetcher)
+        extractor.champ_standings(list(years))
+        return extractor.champ_tables
+
+    def data_to_table(self, year):
+        extractor = DataExtractor(fetcher=self.fetcher)
+        extractor.get_race_urls([year])
+        urls = [f"{extractor.HOMEPAGE}{url}" for url in extractor.year_urls[year]]
+        return lambda: [extractor.data_to_table(url, fetch=self.fetcher.get) for url in urls]
+
+    def seasons_results(self, year):
+        extractor = DataExtractor(fetcher=self.fetcher)
+        extractor.get_race_urls([year])
+        return extractor.seasons_results
+
+    def year_qualy_results(self, year):
+        extractor = QualyExtractor(fetcher=self.fetcher)
+        extractor.get_race_urls([year])
+        extractor.get_qualy_urls()
+        return extractor.year_qualy_results
+
+    def qualy_differences(self, year):
+        df, races = self.qualy_season(year)
+        df = df.copy()
+        return lambda: qualy_differences(df, races)
+
+    def qualy_relative_2_mean(self, year):
+        df, races = self.qualy_gaps(year)
+        df = df.copy()
+        return lambda: qualy_relative_2_mean(df, races)
+
+    def get_seasons_df(self, years):
+        extractor = TeamsExtractor(fetcher=self.fetcher)
+        extractor.champ_tables = {year: df.copy() for year, df in self.champ_tables(years).items()}
+        return extractor.get_seasons_df
+
+    def all(self):
+        """
+        name -> case, in run order.
+        """
+        cases = dict()
+        for method in ('data_to_table', 'seasons_results', 'year_qualy_results', 'qualy_differences',
+                       'qualy_relative_2_mean'):
+            for year in SEASONS:
+                cases[f"{method}[{year}]"] = functools.partial(getattr(self, method), year)
+        teams_years = tuple(year for year in SEASONS if int(year) >= 1958)
+        cases[f"get_seasons_df[{','.join(teams_years)}]"] = functools.partial(self.get_seasons_df, teams_years)
+        return cases
+
+
+def measure(case, repeat=5):
+    """
+    Best and median wall time (seconds) over 'repeat' runs, and peak traced memory (bytes) of one run.
+    """
+    times = []
+    for _ in range(repeat):
+        run = case()
+        gc.collect()
+        start = time.perf_counter()
+        run()
+        times.append(time.perf_counter() - start)
+
+    run = case()
+    gc.collect()
+    tracemalloc.start()
+    run()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return dict(best=min(times), median=statistics.median(times), peak=peak)
+
+
+def environment():
+    return dict(python=platform.python_version(), numpy=np.__version__, pandas=pd.__version__,
+                machine=platform.machine(), system=platform.system(), cpus=os.cpu_count())
+
+
+def compare(results, baseline, time_threshold=1.5, memory_threshold=1.25):
+    """
+    name -> (time ratio, memory ratio, regressed) for every case that is in the baseline.
+    """
+    comparison = dict()
+    for name, now in results.items():
+        base = baseline['cases'].get(name)
+        if base is None:
+            continue
+        time_ratio = now['best'] / base['best'] if base['best'] else 1.0
+        memory_ratio = now['peak'] / base['peak'] if base['peak'] else 1.0
+        slower = time_ratio > time_threshold and now['best'] - base['best'] > TIME_SLACK
+        comparison[name] = (time_ratio, memory_ratio, slower or memory_ratio > memory_threshold)
+    return comparison
+
+
+def report(results, comparison=None):
+    comparison = comparison or dict()
+    width = max(len(name) for name in results)
+    print(f"{'case':<{width}}  {'best ms':>9}  {'median ms':>9}  {'peak MiB':>8}  {'time':>6}  {'memory':>6}")
+    for name, r in results.items():
+        line = f"{name:<{width}}  {r['best'] * 1e3:9.1f}  {r['median'] * 1e3:9.1f}  {r['peak'] / 2**20:8.2f}"
+        if name in comparison:
+            time_ratio, memory_ratio, regressed = comparison[name]
+            line += f"  {time_ratio:5.2f}x  {memory_ratio:5.2f}x" + ("  REGRESSION" if regressed else "")
+        print(line)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Offline F1Archive benchmarks")
+    parser.add_argument('--repeat', type=int, default=5, help="timed runs per case")
+    parser.add_argument('--cases', default=None, help="only run cases whose name matches this regex")
+    parser.add_argument('--baseline', nargs='?', const=BASELINE, default=None, help="baseline file to compare with")
+    parser.add_argument('--save', nargs='?', const=BASELINE, default=None, help="write the results as a baseline")
+    parser.add_argument('--time-threshold', type=float, default=1.5)
+    parser.add_argument('--memory-threshold', type=float, default=1.25)
+    args = parser.parse_args(argv)
+
+    cases = Cases(replay_fetcher()).all()
+    if args.cases:
+        cases = {name: case for name, case in cases.items() if re.search(args.cases, name)}
+
+    results = {name: measure(case, args.repeat) for name, case in cases.items()}
+
+    comparison = None
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if baseline.get('environment') != environment():
+            print(f"warning: baseline recorded on {baseline.get('environment')}, running on {environment()}")
+        comparison = compare(results, baseline, args.time_threshold, args.memory_threshold)
+    report(results, comparison)
+
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump(dict(environment=environment(), cases=results), f, indent=1)
+            f.write('\n')
+        print(f"baseline written to {args.save}")
+
+    regressions = [name for name, (_, _, regressed) in (comparison or dict()).items() if regressed]
+    if regressions:
+        print(f"{len(regressions)} regression(s): {', '.join(regressions)}")
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,253 @@
+"""
+Corpus of formula1.com results pages for the offline benchmarks (see bench_suite.py).
+
+The corpus is a single gzipped JSON file, url -> page html, covering seasons from different eras:
+    1953 - few races, large fields with shared drives and half points
+    1989 - many entrants (39 cars entered for qualifying)
+    1995 - single-session qualifying, 26 cars
+    2010 - three-part qualifying (Q1 / Q2 / Q3)
+Each season has its race list page, a results and a qualifying page for every race and,
+from 1958, the constructors' standings page.
+
+'synthesize' generates pages with the formula1.com results archive markup from a fixed seed,
+so the checked-in corpus can be rebuilt exactly without network access. 'record' downloads
+the same pages from formula1.com instead, by running the benchmarked extraction steps through
+a fetcher that keeps every page it is asked for.
+
+Usage: python benchmarks/corpus.py [synthesize|record] [output file]
+"""
+import gzip
+import json
+import os
+import sys
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from F1Archive.data.fetch import PageFetcher, ReplayFetcher
+from F1Archive.data.qualy_extractor import QualyExtractor
+from F1Archive.data.constructors_champ import TeamsExtractor
+
+CORPUS = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures', 'corpus.json.gz')
+HOMEPAGE = 'https://www.formula1.com/'
+
+# year -> (races, teams with their number of cars, cars started per race, points for 1st, 2nd, ...)
+SEASONS = {
+    '1953': (['argentina', 'indianapolis', 'netherlands', 'belgium', 'france', 'great-britain', 'germany',
+              'switzerland', 'italy'],
+             [('Ferrari', 5), ('Maserati', 5), ('Gordini', 4), ('HWM Alta', 3), ('Cooper Bristol', 3),
+              ('Connaught Lea Francis', 3), ('Kurtis Kraft Offenhauser', 5), ('Veritas', 2), ('OSCA', 2)],
+             30, [8, 6, 4, 3, 2]),
+    '1989': (['brazil', 'san-marino', 'monaco', 'mexico', 'united-states', 'canada', 'france', 'great-britain',
+              'germany', 'hungary', 'belgium', 'italy', 'portugal', 'spain', 'japan', 'australia'],
+             [('McLaren Honda', 2), ('Williams Renault', 2), ('Ferrari', 2), ('Benetton Ford', 2),
+              ('Tyrrell Ford', 2), ('Lotus Judd', 2), ('Arrows Ford', 2), ('Brabham Judd', 2), ('Minardi Ford', 2),
+              ('Dallara Ford', 2), ('March Judd', 2), ('Ligier Ford', 2), ('Lola Lamborghini', 2), ('Osella Ford', 2),
+              ('Onyx Ford', 2), ('Rial Ford', 2), ('Zakspeed Yamaha', 2), ('AGS Ford', 2), ('Coloni Ford', 2),
+              ('EuroBrun Judd', 1)],
+             26, [9, 6, 4, 3, 2, 1]),
+    '1995': (['brazil', 'argentina', 'san-marino', 'spain', 'monaco', 'canada', 'france', 'great-britain',
+              'germany', 'hungary', 'belgium', 'italy', 'portugal', 'europe', 'pacific', 'japan', 'australia'],
+             [('Benetton Renault', 2), ('Williams Renault', 2), ('Ferrari', 2), ('McLaren Mercedes', 2),
+              ('Ligier Mugen Honda', 2), ('Jordan Peugeot', 2), ('Sauber Ford', 2), ('Footwork Hart', 2),
+              ('Tyrrell Yamaha', 2), ('Minardi Ford', 2), ('Forti Ford', 2), ('Simtek Ford', 2), ('Pacific Ford', 2)],
+             26, [10, 6, 4, 3, 2, 1]),
+    '2010': (['bahrain', 'australia', 'malaysia', 'china', 'spain', 'monaco', 'turkey', 'canada', 'europe',
+              'great-britain', 'germany', 'hungary', 'belgium', 'italy', 'singapore', 'japan', 'korea', 'brazil',
+              'abu-dhabi'],
+             [('Red Bull Racing Renault', 2), ('McLaren Mercedes', 2), ('Ferrari', 2), ('Mercedes', 2),
+              ('Renault', 2), ('Williams Cosworth', 2), ('Force India Mercedes', 2), ('Sauber Ferrari', 2),
+              ('STR Ferrari', 2), ('Lotus Cosworth', 2), ('HRT Cosworth', 2), ('Virgin Cosworth', 2)],
+             24, [25, 18, 15, 12, 10, 8, 6, 4, 2, 1]),
+}
+
+
+def race_url(year, race_no, race, page='race-result.html'):
+    return f"/en/results.html/{year}/races/{700 + race_no}/{race}/{page}"
+
+
+def season_urls(year):
+    """
+    Absolute urls of the pages the benchmarks request for one season.
+    """
+    races = SEASONS[year][0]
+    urls = [f"{HOMEPAGE}en/results.html/{year}/races.html"]
+    for n, race in enumerate(races):
+        urls.append(HOMEPAGE + race_url(year, n, race))
+        urls.append(HOMEPAGE + race_url(year, n, race, qualy_page(year)))
+    if int(year) >= 1958:
+        urls.append(f"{HOMEPAGE}en/results.html/{year}/team.html")
+    return urls
+
+
+def qualy_page(year):
+    return 'qualifying.html' if int(year) >= 2006 else 'qualifying-0.html'
+
+
+def _driver_cell(first, last, code):
+    return (f'<a href="/en/drivers/{first.lower()}-{last.lower()}.html" class="dark bold">'
+            f'<span class="hide-for-tablet">{first}</span>\n <span class="hide-for-mobile">{last}</span>\n '
+            f'<span class="uppercase hide-for-desktop">{code}</span></a>')
+
+
+def _table(head, rows, links=()):
+    out = ['<!DOCTYPE html><html lang="en"><head><title>Results archive</title></head><body>',
+           '<div class="resultsarchive-filter-container"><ul class="resultsarchive-filter">']
+    out += [f'<li class="resultsarchive-filter-item"><a href="{href}" class="side-nav-item-link">'
+            f'<span>{text}</span></a></li>' for href, text in links]
+    out.append('</ul></div><div class="resultsarchive-col-right"><table class="resultsarchive-table"><thead><tr>'
+               '<th class="limiter"></th>')
+    out += [f'<th><abbr title="{h}">{h}</abbr></th>' for h in head]
+    out.append('<th class="limiter"></th></tr></thead><tbody>')
+    for row in rows:
+        out.append('<tr><td class="limiter"></td>' + ''.join(f'<td class="dark">{c}</td>' for c in row)
+                   + '<td class="limiter"></td></tr>')
+    out.append('</tbody></table></div></body></html>')
+    return '\n'.join(out)
+
+
+def _lap_time(seconds):
+    minutes, seconds = divmod(seconds, 60)
+    return f"{int(minutes)}:{seconds:06.3f}"
+
+
+def synthesize_season(year, seed=0):
+    """
+    url -> html for the pages of one season in SEASONS, generated from a fixed seed.
+    """
+    races, teams, starters, points = SEASONS[year]
+    rng = np.random.default_rng(int(year) * 100 + seed)
+    cars = [(team, n) for team, n_cars in teams for n in range(n_cars)]
+    drivers = [(f"Driver{year[2:]}{i:02d}", f"Surname{year[2:]}{i:02d}", f"D{i:02d}") for i in range(len(cars) + 6)]
+    numbers = [i + 1 for i in range(len(cars))]
+    seat = list(range(len(cars))) # car -> driver
+    team_points = {team: 0.0 for team, _ in teams}
+
+    pages = dict()
+    links = [race_url(year, n, race) for n, race in enumerate(races)]
+    pages[f"{HOMEPAGE}en/results.html/{year}/races.html"] = _table(
+        ['Grand Prix', 'Date', 'Winner', 'Car', 'Laps', 'Time'],
+        [[f'<a href="{link}" class="dark bold">{race.replace("-", " ").title()}</a>', '', '', '', '', '']
+         for link, race in zip(links, races)])
+
+    for n, race in enumerate(races):
+        if n and rng.random() < 0.3: # a substitute takes over a seat
+            seat[rng.integers(len(cars))] = len(cars) + rng.integers(6)
+        pace = np.sort(rng.normal(0, 0.6, len(cars))) + rng.permutation(len(cars)) * 0.08
+        order = np.argsort(pace)
+        base = 70 + 30 * rng.random()
+
+        # qualifying, every entered car
+        if int(year) >= 2006:
+            head = ['Pos', 'No', 'Driver', 'Car', 'Q1', 'Q2', 'Q3', 'Laps']
+        else:
+            head = ['Pos', 'No', 'Driver', 'Car', 'Time', 'Laps']
+        rows = []
+        for p, car in enumerate(order):
+            driver = drivers[seat[car]]
+            time = _lap_time(base + pace[car] - pace[order[0]])
+            if int(year) >= 2006:
+                q1 = _lap_time(base + 0.8 + pace[car] - pace[order[0]])
+                q2 = _lap_time(base + 0.4 + pace[car] - pace[order[0]]) if p < 17 else ''
+                times = [q1, q2, time if p < 10 else '']
+            else:
+                times = ['' if rng.random() < 0.02 else time]
+            rows.append([str(p + 1), str(numbers[car]), _driver_cell(*driver), cars[car][0], *times,
+                         str(rng.integers(8, 30))])
+        pages[HOMEPAGE + race_url(year, n, race, qualy_page(year))] = _table(head, rows)
+
+        # race, the fastest 'starters' cars in a shuffled finishing order
+        finish = list(order[:starters])
+        finish = [finish[i] for i in np.argsort(np.arange(len(finish)) + rng.normal(0, 4, len(finish)))]
+        rows = []
+        for p, car in enumerate(finish):
+            team = cars[car][0]
+            pos = str(p + 1) # the last six are not classified, the very last one also DQ or EX
+            if p >= starters - 6:
+                pos = str(rng.choice(['NC', 'DQ', 'EX'])) if p == starters - 1 else 'NC'
+            pts = float(points[p]) if p < len(points) and pos.isdigit() else 0.0
+            row = [pos, str(numbers[car]), _driver_cell(*drivers[seat[car]]), team, str(60 - p // 4),
+                   '+1 lap' if p else '1:31:45.996', pts]
+            rows.append(row)
+            if int(year) < 1958 and p < 6 and rng.random() < 0.15: # shared drive, points split
+                row[-1] = pts / 2
+                rows.append(row[:2] + [_driver_cell(*drivers[len(cars) + rng.integers(6)])] + row[3:])
+        for row in rows:
+            team_points[row[3]] += row[-1]
+            row[-1] = f"{row[-1]:g}"
+        session_links = [(race_url(year, n, race), 'Race result'),
+                         (race_url(year, n, race, qualy_page(year)), 'Qualifying')]
+        pages[HOMEPAGE + race_url(year, n, race)] = _table(
+            ['Pos', 'No', 'Driver', 'Car', 'Laps', 'Time/Retired', 'PTS'], rows, session_links)
+
+    if int(year) >= 1958:
+        standings = sorted(team_points.items(), key=lambda t: -t[1])
+        pages[f"{HOMEPAGE}en/results.html/{year}/team.html"] = _table(
+            ['Pos', 'Team', 'PTS'], [[str(p + 1), team, f"{pts:g}"] for p, (team, pts) in enumerate(standings)])
+    return pages
+
+
+class RecordingFetcher(PageFetcher):
+    """
+    PageFetcher that keeps a copy of every page it returns, in 'self.pages'.
+    """
+    def __init__(self, **kwargs):
+        super(RecordingFetcher, self).__init__(**kwargs)
+        self.pages = dict()
+
+    def get(self, url, refresh=False):
+        page = super(RecordingFetcher, self).get(url, refresh)
+        self.pages[url] = page
+        return page
+
+
+def record(years=None):
+    """
+    Download the pages the benchmarks request for 'years' from formula1.com.
+    """
+    years = list(SEASONS) if years is None else years
+    fetcher = RecordingFetcher(max_workers=4)
+    for year in years:
+        qualy = QualyExtractor(fetcher=fetcher)
+        qualy.get_race_urls([year])
+        qualy.seasons_results()
+        qualy.get_qualy_urls()
+        qualy.year_qualy_results()
+        if int(year) >= 1958:
+            TeamsExtractor(fetcher=fetcher).champ_standings([year])
+    fetcher.close()
+    return {url: page.decode('utf-8') for url, page in fetcher.pages.items()}
+
+
+def synthesize(years=None):
+    pages = dict()
+    for year in (list(SEASONS) if years is None else years):
+        pages.update(synthesize_season(year))
+    return pages
+
+
+def save_corpus(pages, path=CORPUS):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with gzip.GzipFile(path, 'wb', mtime=0) as f:
+        f.write(json.dumps(pages, sort_keys=True).encode('utf-8'))
+
+
+def load_corpus(path=CORPUS):
+    """
+    url -> page bytes, as served by a ReplayFetcher.
+    """
+    with gzip.open(path, 'rb') as f:
+        pages = json.loads(f.read().decode('utf-8'))
+    return {url: page.encode('utf-8') for url, page in pages.items()}
+
+
+def replay_fetcher(path=CORPUS):
+    return ReplayFetcher(load_corpus(path))
+
+
+if __name__ == '__main__':
+    mode = sys.argv[1] if len(sys.argv) > 1 else 'synthesize'
+    path = sys.argv[2] if len(sys.argv) > 2 else CORPUS
+    pages = record() if mode == 'record' else synthesize()
+    save_corpus(pages, path)
+    print(f"{len(pages)} pages written to {path} ({os.path.getsize(path) / 1024:.0f} KiB)")
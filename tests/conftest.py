@@ -0,0 +1,29 @@
+import os
+import sys
+
+import pytest
+
+BENCHMARKS = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'benchmarks')
+sys.path.insert(0, os.path.join(BENCHMARKS, '..'))
+sys.path.insert(0, BENCHMARKS)
+
+from corpus import SEASONS, load_corpus  # noqa: E402
+from F1Archive.data.fetch import ReplayFetcher  # noqa: E402
+
+
+@pytest.fixture(scope='session')
+def corpus():
+    """
+    url -> page bytes of the saved formula1.com corpus in benchmarks/fixtures.
+    """
+    return load_corpus()
+
+
+@pytest.fixture
+def fetcher(corpus):
+    return ReplayFetcher(corpus)
+
+
+@pytest.fixture(scope='session')
+def seasons():
+    return list(SEASONS)
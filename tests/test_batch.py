@@ -0,0 +1,36 @@
+import hashlib
+
+import pandas as pd
+import pytest
+
+pytest.importorskip('seaborn')
+import matplotlib
+
+from F1Archive.visualization.batch import render
+
+
+@pytest.fixture
+def data():
+    constructors = pd.DataFrame({'Team': ['McLaren Mercedes', 'Red Bull Racing Renault', 'Ferrari'],
+                                 'PTS': [454.0, 498.0, 396.0], '% of max': [52.0, 57.2, 45.5],
+                                 '% of total': [33.6, 36.9, 29.3]})
+    cum_results = pd.DataFrame([[25, 43, 60], [18, 33, 58], [15, 40, 52]],
+                               index=['Sebastian Vettel', 'Fernando Alonso', 'Mark Webber'])
+    return {'2010': dict(race_names=['bahrain', 'australia', 'malaysia'], constructors=constructors,
+                         cum_results=cum_results)}
+
+
+def digest(path):
+    with open(path, 'rb') as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+def test_renders_do_not_share_state(data, tmp_path):
+    before = dict(matplotlib.rcParams)
+    digests = []
+    for chart in ['per_max', 'cum_results', 'per_max', 'constructors', 'per_max']:
+        paths = render(('2010', None, chart), data, str(tmp_path))
+        if chart == 'per_max':
+            digests.append(digest(paths[0]))
+    assert len(set(digests)) == 1
+    assert dict(matplotlib.rcParams) == before
@@ -0,0 +1,80 @@
+import os
+import time
+
+import pytest
+
+from F1Archive.data.cache import CacheMiss, ResponseCache
+from F1Archive.data.fetch import PageFetcher
+
+URL = 'https://www.formula1.com/en/results.html/1989/races.html'
+
+
+def body(n, size=4096):
+    return os.urandom(size) + str(n).encode() # incompressible, so sizes are predictable
+
+
+def test_store_and_read(tmp_path):
+    cache = ResponseCache(tmp_path)
+    cache.store(URL, b'<html>1989</html>', {'ETag': '"abc"'})
+    entry = cache.lookup(URL)
+    assert cache.read(entry) == b'<html>1989</html>'
+    assert cache.validators(entry) == {'If-None-Match': '"abc"'}
+    assert ResponseCache(tmp_path).lookup(URL) is not None # persists across instances
+    assert cache.lookup(URL + '?other') is None
+
+
+def test_identical_bodies_are_stored_once(tmp_path):
+    cache = ResponseCache(tmp_path)
+    cache.store(URL, b'same page')
+    cache.store(URL + '?copy', b'same page')
+    objects = [f for _, _, files in os.walk(tmp_path / 'objects') for f in files]
+    assert len(objects) == 1
+
+
+def test_ttl(tmp_path):
+    entry = ResponseCache(tmp_path).store(URL, b'page')
+    assert ResponseCache(tmp_path).is_fresh(entry) # no ttl: never stale
+    cache = ResponseCache(tmp_path, ttl=60)
+    assert cache.is_fresh(entry)
+    entry['fetched'] = time.time() - 61
+    assert not cache.is_fresh(entry)
+    cache.refresh(entry)
+    assert cache.is_fresh(entry)
+
+
+def test_eviction_removes_least_recently_used(tmp_path):
+    cache = ResponseCache(tmp_path)
+    urls = [f"{URL}?{n}" for n in range(3)]
+    for n, url in enumerate(urls):
+        cache.store(url, body(n))
+    # entries are ordered by access time
+    for url in urls:
+        cache.read(cache.lookup(url))
+        time.sleep(0.01)
+    cache.read(cache.lookup(urls[0])) # urls[1] is now the least recently used
+
+    cache.evict(max_bytes=cache.size() - 1)
+    assert cache.lookup(urls[1]) is None
+    assert cache.lookup(urls[0]) is not None and cache.lookup(urls[2]) is not None
+
+    cache.clear()
+    assert cache.size() == 0 and all(cache.lookup(url) is None for url in urls)
+
+
+def test_max_bytes_is_enforced_on_store(tmp_path):
+    cache = ResponseCache(tmp_path, max_bytes=10000)
+    for n in range(5):
+        cache.store(f"{URL}?{n}", body(n))
+    assert cache.size() <= 10000
+    assert cache.lookup(f"{URL}?4") is not None
+
+
+def test_offline(tmp_path):
+    cache = ResponseCache(tmp_path, ttl=0.001, offline=True)
+    cache.store(URL, b'page')
+    time.sleep(0.01)
+    assert not cache.is_fresh(cache.lookup(URL)) # stale pages are still served offline
+    fetcher = PageFetcher(cache=cache)
+    assert fetcher.get(URL) == b'page'
+    with pytest.raises(CacheMiss):
+        fetcher.get('http://127.0.0.1:9/never-cached') # would fail on any network access too
@@ -0,0 +1,53 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from F1Archive.data.html_tables import parse_results_table
+
+
+def page(head, rows):
+    """
+    Results page with formula1.com's empty 'limiter' spacer cells either side of every row.
+    """
+    cells = lambda tag, values: ''.join(f'<{tag}>{v}</{tag}>' for v in values)
+    body = ''.join(f'<tr><td class="limiter"></td>{cells("td", row)}<td class="limiter"></td></tr>' for row in rows)
+    return (f'<html><body><table><thead><tr><th class="limiter"></th>{cells("th", head)}<th class="limiter"></th>'
+            f'</tr></thead><tbody>{body}</tbody></table></body></html>').encode()
+
+
+def test_spacer_columns_are_dropped():
+    df = parse_results_table(page(['Pos', 'Driver'], [['1', 'Ayrton Senna SEN'], ['2', 'Alain Prost PRO']]))
+    assert list(df.columns) == ['Pos', 'Driver']
+
+
+def test_column_types():
+    df = parse_results_table(page(['Pos', 'No', 'PTS', 'Time'],
+                                  [['1', '12', '9', '1:31.5'], ['NC', '2', '4.5', ''], ['DQ', '27', '0', '1:32.0']]))
+    assert df['Pos'].tolist() == ['1', 'NC', 'DQ'] # any code keeps the whole column as text
+    assert df['No'].dtype == np.int64
+    assert df['PTS'].dtype == np.float64 and df['PTS'].tolist() == [9.0, 4.5, 0.0]
+    assert df['Time'].iloc[0] == '1:31.5' and pd.isna(df['Time'].iloc[1])
+
+
+def test_empty_cells_make_numbers_float():
+    df = parse_results_table(page(['Pos', 'Laps'], [['1', '60'], ['2', '']]))
+    assert df['Pos'].dtype == np.int64
+    assert df['Laps'].dtype == np.float64 and np.isnan(df['Laps'].iloc[1])
+
+
+def test_cell_text_is_joined_and_whitespace_collapsed():
+    driver = '<a><span>Ayrton</span>\n <span>Senna</span>\n <span>SEN</span></a>'
+    df = parse_results_table(page(['Pos', 'Driver'], [['1', driver]]))
+    assert df['Driver'].tolist() == ['Ayrton Senna SEN']
+
+
+def test_page_without_a_table():
+    with pytest.raises(ValueError):
+        parse_results_table(b'<html><body><p>No results</p></body></html>')
+
+
+def test_corpus_race_page(corpus):
+    url = next(url for url in corpus if url.endswith('/race-result.html'))
+    df = parse_results_table(corpus[url])
+    assert list(df.columns) == ['Pos', 'No', 'Driver', 'Car', 'Laps', 'Time/Retired', 'PTS']
+    assert df['No'].dtype == np.int64 and pd.api.types.is_numeric_dtype(df['PTS'])
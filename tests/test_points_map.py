@@ -0,0 +1,34 @@
+import numpy as np
+import pandas as pd
+
+from F1Archive.data_transforms.points_map import MapPoints
+
+
+def test_rescore_positions():
+    positions = pd.DataFrame({'monaco': [1, 2, 'NC', 0], 'canada': [7, 'DQ', 3, 6]})
+    points = MapPoints(initial_system=1990).rescore(positions)
+    assert points.to_numpy().tolist() == [[9, 0], [6, 0], [0, 4], [0, 1]]
+    assert points.columns.tolist() == ['monaco', 'canada']
+    np.testing.assert_array_equal(MapPoints(initial_system=[]).rescore([1, 2, 11], 2010, scale=0.5), [12.5, 9, 0])
+
+
+def test_rescore_under_several_systems():
+    points = MapPoints(initial_system=2010).rescore(np.array([[1, 4], [8, 0]]), [1955, 2003, 2010])
+    assert points.shape == (3, 2, 2)
+    assert points[:, 0, 0].tolist() == [8, 10, 25] and points[:, 1, 0].tolist() == [0, 1, 4]
+
+
+def test_remap_points():
+    a = np.array([0, 0, 1, 0, 2, 3, 0, 4, 6, 9])
+    assert MapPoints(initial_system=1990).remap_points(a, 1991).tolist() == [0, 0, 1, 0, 2, 3, 0, 4, 6, 10]
+    c = np.array([0, 1, 2, 5, 3, 4, 6, 8, 10])
+    assert MapPoints(initial_system=2003).remap_points(c, 1991).tolist() == [0, 0, 0, 3, 1, 2, 4, 6, 10]
+
+
+def test_remap_half_points():
+    # half-points race under the 1960-1990 system: 4.5 is half of a win, not 4 points (5th place)
+    mp = MapPoints(initial_system=1985)
+    half = np.array([4.5, 3.0, 2.0, 1.5, 1.0, 0.5])
+    assert mp.remap_points(half, 2010, scale=0.5).tolist() == [12.5, 9.0, 7.5, 6.0, 5.0, 4.0]
+    assert mp.remap_points(half * 2, 2010).tolist() == [25, 18, 15, 12, 10, 8]
+    assert mp.remap_points([4.5], 2010).tolist() == [0] # not the points of any place
@@ -0,0 +1,52 @@
+import numpy as np
+import pandas as pd
+
+from F1Archive.data.fetch import ReplayFetcher
+from F1Archive.data.html_tables import parse_page, parse_results_table
+from F1Archive.data.qualy_extractor import QualyExtractor
+from tests.test_html_tables import page
+
+# a short lap, as at the 2020 Sakhir Grand Prix: every session time is under a minute
+SAKHIR = page(['Pos', 'No', 'Driver', 'Car', 'Q1', 'Q2', 'Q3', 'Laps'],
+              [['1', '77', 'Valtteri Bottas BOT', 'Mercedes', '53.713', '53.438', '53.377', '12'],
+               ['2', '63', 'George Russell RUS', 'Mercedes', '53.819', '53.766', '53.403', '12'],
+               ['11', '10', 'Pierre Gasly GAS', 'AlphaTauri Honda', '54.117', '53.995', '', '9'],
+               ['20', '51', 'Pietro Fittipaldi FIT', 'Haas Ferrari', '55.426', '', '', '5']])
+
+
+def test_sub_minute_session_times_stay_text():
+    df = parse_results_table(SAKHIR)
+    assert df['Q3'].tolist()[:2] == ['53.377', '53.403']
+    assert df['Q1'].dtype == object and df['Laps'].dtype == np.int64
+
+
+def test_final_qualy_with_sub_minute_sessions():
+    df = parse_results_table(SAKHIR)
+    assert QualyExtractor.get_final_qualy(df).tolist() == ['53.377', '53.403', '53.995', '55.426']
+    seconds = QualyExtractor.get_final_qualy(df, seconds=True)
+    np.testing.assert_allclose(seconds, [53.377, 53.403, 53.995, 55.426])
+
+
+def test_final_qualy_with_numeric_columns():
+    # tables parsed as numbers (e.g. stored before the parser kept lap times as text)
+    df = pd.DataFrame({'Q1': [53.713, 55.426], 'Q2': [53.438, np.nan], 'Q3': [np.nan, np.nan]})
+    np.testing.assert_allclose(QualyExtractor.get_final_qualy(df, seconds=True), [53.438, 55.426])
+
+
+def test_final_qualy_mixes_sessions():
+    df = pd.DataFrame({'Q1': ['1:31.2', '1:32.0', '1:33.1'], 'Q2': ['1:30.9', '1:31.7', np.nan],
+                       'Q3': ['1:30.1', np.nan, np.nan]})
+    assert QualyExtractor.get_final_qualy(df).tolist() == ['1:30.1', '1:31.7', '1:33.1']
+
+
+def test_recorded_sprint_qualifying_links_are_kept():
+    race = '/en/results.html/2021/races/1078/great-britain/race-result.html'
+    race_dir = race.rsplit('/', 1)[0]
+    html = ''.join(f'<a href="{race_dir}/{name}">{name}</a>'
+                   for name in ('qualifying.html', 'sprint-qualifying.html', 'fastest-laps.html'))
+    qx = QualyExtractor(fetcher=ReplayFetcher({}))
+    qx.record_links(race, parse_page(f'<html><body>{html}</body></html>'.encode()))
+    assert qx.season_qualy_urls('2021', [race]) == [f'{race_dir}/qualifying.html', f'{race_dir}/sprint-qualifying.html']
+    # links not recorded: the derived page alone, without fetching the race page
+    assert qx.season_qualy_urls('2021', [race.replace('great-britain', 'italy')]) == [
+        f"{race_dir.replace('great-britain', 'italy')}/qualifying.html"]
@@ -0,0 +1,74 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from F1Archive.data.constructors_champ import TeamsExtractor
+from F1Archive.data.fetch import ReplayFetcher
+from F1Archive.data.qualy_extractor import QualyExtractor
+from F1Archive.data.season_store import SeasonStore
+
+pytest.importorskip('pyarrow')
+
+
+@pytest.fixture(scope='module')
+def frames(corpus, seasons):
+    fetcher = ReplayFetcher(corpus)
+    qualy = QualyExtractor(fetcher=fetcher)
+    qualy.get_race_urls(seasons)
+    qualy.seasons_results()
+    qualy.get_qualy_urls()
+    qualy.year_qualy_results()
+    teams = TeamsExtractor(fetcher=fetcher)
+    teams.champ_standings([year for year in seasons if int(year) >= 1958])
+    return dict(results=qualy.year_results, qualifying=qualy.qualy_results, constructors=teams.champ_tables)
+
+
+@pytest.fixture(scope='module')
+def store(frames, tmp_path_factory):
+    store = SeasonStore(tmp_path_factory.mktemp('seasons'))
+    store.save(year_results=frames['results'], qualy_results=frames['qualifying'], champ_tables=frames['constructors'])
+    return store
+
+
+def assert_same_cells(left, right):
+    """
+    Same values and the same Python type in every cell, e.g. '1' stays a string next to 0 and 'NC'.
+    """
+    for a, b in zip(left.to_numpy(dtype=object).ravel(), right.to_numpy(dtype=object).ravel()):
+        if pd.isna(b):
+            assert pd.isna(a)
+        else:
+            assert a == b and type(a) == type(b), (a, b)
+
+
+@pytest.mark.parametrize('kind', ['results', 'qualifying', 'constructors'])
+def test_round_trip(frames, store, kind):
+    assert store.years(kind) == sorted(frames[kind])
+    for year, df in frames[kind].items():
+        loaded = store.load_year(kind, year)
+        pd.testing.assert_frame_equal(loaded, df)
+        assert_same_cells(loaded, df)
+
+
+def test_column_selection(frames, store):
+    df = frames['results']['2010']
+    loaded = store.load_year('results', '2010', columns=['Position'])
+    assert list(loaded.columns) == list(df['Position'].columns.map(lambda race: ('Position', race)))
+    assert_same_cells(loaded, df[['Position']])
+
+
+def test_lazy_view(frames, store):
+    seasons = store.open('qualifying')
+    assert list(seasons) == sorted(frames['qualifying'])
+    pd.testing.assert_frame_equal(seasons['1989'], frames['qualifying']['1989'])
+
+
+def test_mixed_cells(tmp_path):
+    df = pd.DataFrame({'Pos': pd.Series(['1', 2, 'NC', 0, np.nan, None, 3.5], dtype=object),
+                       'Time': pd.Series(['1:31.2', np.nan, '53.377', None, '', 'DNS', 'DNF'], dtype=object)})
+    store = SeasonStore(tmp_path)
+    store.write('qualifying', 2020, df)
+    loaded = store.load_year('qualifying', 2020)
+    pd.testing.assert_frame_equal(loaded, df)
+    assert_same_cells(loaded, df)
+    assert loaded['Pos'][5] is None and np.isnan(loaded['Pos'][4])
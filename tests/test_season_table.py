@@ -0,0 +1,64 @@
+import pandas as pd
+import pytest
+
+from F1Archive.data.data_extraction import DataExtractor
+from F1Archive.data.fetch import ReplayFetcher
+
+
+@pytest.fixture(scope='module')
+def extracted(corpus, seasons):
+    extractor = DataExtractor(fetcher=ReplayFetcher(corpus))
+    extractor.get_race_urls(seasons)
+    extractor.seasons_results()
+    return extractor
+
+
+def reference_table(extractor, year):
+    """
+    Season table filled cell by cell from the race tables, as the per-race loop did.
+    """
+    urls = extractor.year_urls[year]
+    names = [url.split('/')[6] for url in urls]
+    rows = dict() # key -> [driver, car, {race: (pos, pts)}]
+    for n, (race, df) in enumerate(zip(names, extractor.race_tables(urls))):
+        for record in extractor.race_records(df, race, n).itertuples(index=False):
+            row = rows.setdefault(record.Key, [record.Driver, record.Car, dict()])
+            row[2][race] = (record.Pos, record.PTS)
+
+    order = list(rows)
+    first = [key for key in order if names[0] in rows[key][2]]
+    later = sorted((key for key in order if key not in first),
+                   key=lambda key: (min(names.index(r) for r in rows[key][2]), key))
+    data = []
+    for key in first + later:
+        driver, car, cells = rows[key]
+        data.append([key, driver, str(car)[:3].upper()]
+                    + [cells.get(race, (0, 0))[0] for race in names]
+                    + [float(cells.get(race, (0, 0))[1]) for race in names])
+    columns = pd.MultiIndex.from_tuples([('Driver', ''), ('Details', 'Driver'), ('Details', 'Car')]
+                                        + [('Position', race) for race in names] + [('Points', race) for race in names])
+    return pd.DataFrame(data, columns=columns)
+
+
+@pytest.mark.parametrize('year', ['1953', '1989', '1995', '2010'])
+def test_pivot_matches_cell_by_cell_fill(extracted, year):
+    expected = reference_table(extracted, year)
+    results_df = extracted.year_results[year]
+    pd.testing.assert_frame_equal(results_df, expected, check_dtype=False, check_column_type=False)
+    assert results_df['Position'].to_numpy(dtype=object).tolist() == expected['Position'].to_numpy(dtype=object).tolist()
+
+
+@pytest.mark.parametrize('year', ['1953', '2010'])
+def test_results_records_round_trip(extracted, year):
+    results_df = extracted.year_results[year]
+    races = list(results_df['Position'].columns)
+    rebuilt = DataExtractor.season_table(DataExtractor.results_records(results_df, races), races)
+    pd.testing.assert_frame_equal(rebuilt, results_df)
+
+
+def test_appending_races_matches_full_season(extracted):
+    urls = extracted.year_urls['1989']
+    names = [url.split('/')[6] for url in urls]
+    partial = extracted.season_results('1989', urls[:10])
+    appended = extracted.season_results('1989', urls[10:], results_df=partial, race_names=names[:10])
+    pd.testing.assert_frame_equal(appended, extracted.year_results['1989'])
@@ -0,0 +1,95 @@
+import pandas as pd
+import pytest
+
+from F1Archive.data.data_extraction import DataExtractor
+from F1Archive.data.fetch import ReplayFetcher
+from F1Archive.data.qualy_extractor import QualyExtractor
+from F1Archive.data.sql_store import ResultsDB
+
+
+@pytest.fixture(scope='module')
+def batches(corpus, seasons):
+    results = list(DataExtractor(fetcher=ReplayFetcher(corpus)).iter_race_results(seasons))
+    qualifying = list(QualyExtractor(fetcher=ReplayFetcher(corpus)).iter_qualy_results(seasons))
+    return results, qualifying
+
+
+@pytest.fixture
+def db(batches):
+    results, qualifying = batches
+    with ResultsDB() as db:
+        db.load_results(results)
+        db.load_qualifying(qualifying)
+        yield db
+
+
+def test_front_row_lockouts_across_seasons(db, batches):
+    # reference: sessions whose first two places went to the same McLaren car
+    expected = []
+    for records in batches[1]:
+        front = records.set_index('Position').reindex([1, 2])['Car']
+        if front.iloc[0] == front.iloc[1] and str(front.iloc[0]).startswith('McLaren'):
+            expected.append((int(records['Year'].iloc[0]), records['Race'].iloc[0]))
+    lockouts = db.front_row_lockouts(team='McLaren')
+    assert expected and list(zip(lockouts['year'], lockouts['race'])) == expected
+    assert lockouts['team'].str.startswith('McLaren').all()
+    assert len(db.front_row_lockouts(team='mclaren', years=[1995, 2010])) == len(
+        [key for key in expected if key[0] in (1995, 2010)])
+
+
+def test_team_matches_name_or_generic(db):
+    results = db.results(team='McLaren')
+    assert set(results['year']) == {1989, 1995, 2010}
+    assert set(results['team']) == {'McLaren Honda', 'McLaren Mercedes'}
+    assert len(db.results(team='McLaren Mercedes')) < len(results)
+    teams = db.teams('McLaren')
+    assert teams['year'].tolist() == [1989, 1995, 2010] and set(teams['generic']) == {'McLaren'}
+
+
+def test_teams_are_keyed_by_season(db):
+    db.write_race_records(pd.DataFrame({'Year': '2012', 'Race': 'australia', 'Driver': 'Timo Glock GLO',
+                                        'Car': 'Marussia Cosworth', 'Pos': [14], 'PTS': [0.0]}))
+    march, marussia = db.teams('March'), db.teams('Marussia')
+    assert march['year'].tolist() == [1989] and marussia['year'].tolist() == [2012]
+    assert march['code'].tolist() == marussia['code'].tolist() == ['MAR']
+    assert set(db.results(team='Marussia')['year']) == {2012}
+
+
+def test_season_tables_share_team_identity(db, extracted_tables):
+    year_results, qualy_results = extracted_tables
+    champ = pd.DataFrame({'Team': ['McLaren Honda', 'March Judd'], 'PTS': [141.0, 4.0]}, index=['1', '12'])
+    with ResultsDB() as wide:
+        wide.save(year_results=year_results, qualy_results=qualy_results, champ_tables={'1989': champ})
+        assert wide.teams('McLaren')['name'].tolist() == ['McLaren Honda']
+        assert wide.teams('MCL')['year'].tolist() == [1995, 2010] # no full names known for these seasons
+        standings = wide.constructor_standings(1989, team='McLaren')
+        assert standings['team'].tolist() == ['McLaren Honda']
+        assert set(wide.results(team='McLaren Honda')['year']) == {1989}
+        pd.testing.assert_frame_equal(wide.front_row_lockouts(team='McLaren Honda'),
+                                      db.front_row_lockouts(team='McLaren', years=[1989]))
+
+        # a code stored before its full name is known moves to that team
+        wide.write_standings('1995', pd.DataFrame({'Team': ['McLaren Mercedes'], 'PTS': [30.0]}, index=['4']))
+        assert wide.teams('MCL')['year'].tolist() == [2010]
+        assert len(wide.results(team='McLaren', years=[1995])) == len(db.results(team='McLaren', years=[1995]))
+
+
+def test_driver_standings_from_stored_results(db, extracted_tables):
+    year_results, _ = extracted_tables
+    with ResultsDB() as wide:
+        wide.save(year_results=year_results)
+        for year in year_results:
+            pd.testing.assert_frame_equal(wide.driver_standings(year), db.driver_standings(year))
+
+
+@pytest.fixture(scope='module')
+def extracted_tables(corpus, seasons):
+    results = DataExtractor(fetcher=ReplayFetcher(corpus))
+    results.get_race_urls(seasons)
+    results.seasons_results()
+    qualy = QualyExtractor(fetcher=ReplayFetcher(corpus))
+    qualy.get_race_urls(seasons)
+    qualy.seasons_results()
+    qualy.get_qualy_urls()
+    qualy.year_qualy_results()
+    return results.year_results, qualy.qualy_results